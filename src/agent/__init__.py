@@ -3,8 +3,25 @@
 This module defines a custom graph.
 """
 
-from agent import utils
-from agent.graph import graph
+import importlib
+
 from agent.names import *
 
-__all__ = ["graph"]
\ No newline at end of file
+__all__ = ["graph"]
+
+
+# DOC: graph (langgraph, checkpointer, artifact store, LLM cache) and utils are loaded on first access → importing a light subpackage (i.e.: agent.spi, agent.cds in the notebook workers) does not build the graph
+_LAZY = {
+    "graph": ("agent.graph", "graph"),
+    "utils": ("agent.utils", None),
+}
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module, attribute = _LAZY[name]
+    value = importlib.import_module(module)
+    value = getattr(value, attribute) if attribute is not None else value
+    globals()[name] = value
+    return value
@@ -0,0 +1,193 @@
+"""Content-addressed store of the artifacts built by tools (notebooks, data outputs). Artifacts are keyed by the sha256 of the tool name and its normalized arguments, so an identical request gets back the paths built the first time instead of a new notebook and a new data ingestion."""
+# DOC: Records are kept in a SQLite file shared by every worker process, together with their metadata and a reference count (how many requests are using them).
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from enum import Enum
+
+
+class ArtifactStore:
+    """ArtifactStore - tool artifacts keyed by request, with their reference count."""
+
+    # DOC: Float args (i.e.: bbox coordinates) are compared up to this number of decimals
+    FLOAT_DECIMALS = 6
+
+    def __init__(self, db_path=None, enabled=True):
+        """__init__ - records go to the SQLite file db_path (None → nothing is stored), enabled=False turns every lookup into a miss."""
+        self.db_path = db_path
+        self.enabled = enabled
+
+        self._lock = threading.RLock()
+        self._conn = None
+        self._stats = { 'hits': 0, 'misses': 0, 'stale': 0, 'writes': 0 }
+
+
+    @classmethod
+    def normalize(cls, value):
+        """Normalize - canonical form of tool args → enums by value, tuples as lists, rounded floats, sorted keys."""
+        if isinstance(value, Enum):
+            return cls.normalize(value.value)
+        if isinstance(value, bool) or value is None:
+            return value
+        if isinstance(value, float):
+            rounded = round(value, cls.FLOAT_DECIMALS)
+            return int(rounded) if rounded.is_integer() else rounded
+        if isinstance(value, (list, tuple)):
+            return [cls.normalize(v) for v in value]
+        if isinstance(value, dict):
+            return { str(k): cls.normalize(v) for k, v in sorted(value.items(), key=lambda kv: str(kv[0])) }
+        if isinstance(value, str):
+            return value.strip()
+        return value
+
+    @classmethod
+    def canonical_args(cls, args):
+        """canonical_args - normalized args as a compact JSON string."""
+        return json.dumps(cls.normalize(args), sort_keys=True, separators=(',', ':'), default=str, ensure_ascii=False)
+
+    @classmethod
+    def make_key(cls, tool_name, args):
+        """make_key - sha256 of the tool name and its canonical args."""
+        payload = json.dumps([tool_name, cls.canonical_args(args)], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+    # DOC: Opened lazily, so importing the module never touches the filesystem
+    def _connection(self):
+        if self._conn is None and self.db_path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS artifacts (
+                key TEXT PRIMARY KEY,
+                tool TEXT NOT NULL,
+                args TEXT NOT NULL,
+                outputs TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                refcount INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            )''')
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def _record(row):
+        key, tool, args, outputs, metadata, refcount, created_at, last_used_at = row
+        return {
+            'key': key,
+            'tool': tool,
+            'args': json.loads(args),
+            'outputs': json.loads(outputs),
+            'metadata': json.loads(metadata),
+            'refcount': refcount,
+            'created_at': created_at,
+            'last_used_at': last_used_at,
+        }
+
+    def get(self, key):
+        """Get - artifact record or None, the reference count is untouched."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return None
+            row = conn.execute('SELECT key, tool, args, outputs, metadata, refcount, created_at, last_used_at FROM artifacts WHERE key = ?', (key,)).fetchone()
+            return self._record(row) if row is not None else None
+
+    def acquire(self, key, args = None, local_files = ()):
+        """Acquire - artifact record with one more reference. None when missing, when it was built with other args (i.e.: other output paths) or when one of its local_files was deleted (the stale record is dropped)."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            record = self.get(key)
+            if record is None or (args is not None and record['args'] != self.normalize(args)):
+                self._stats['misses'] += 1
+                return None
+            if any(not os.path.exists(path) for path in local_files):
+                self.delete(key)
+                self._stats['stale'] += 1
+                self._stats['misses'] += 1
+                return None
+            now = time.time()
+            conn = self._connection()
+            conn.execute('UPDATE artifacts SET refcount = refcount + 1, last_used_at = ? WHERE key = ?', (now, key))
+            conn.commit()
+            self._stats['hits'] += 1
+            return { **record, 'refcount': record['refcount'] + 1, 'last_used_at': now }
+
+    def put(self, key, tool_name, args, outputs, metadata = None):
+        """Put - store the outputs built for a request (replacing the previous ones), it holds the first reference."""
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return
+            conn.execute(
+                'INSERT OR REPLACE INTO artifacts (key, tool, args, outputs, metadata, refcount, created_at, last_used_at) VALUES (?, ?, ?, ?, ?, 1, ?, ?)',
+                (key, tool_name, self.canonical_args(args), json.dumps(self.normalize(outputs), ensure_ascii=False), json.dumps(metadata or dict(), default=str, ensure_ascii=False), now, now)
+            )
+            conn.commit()
+            self._stats['writes'] += 1
+
+    def release(self, key):
+        """Release - drop one reference, returns the remaining count (None if the key is unknown)."""
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return None
+            conn.execute('UPDATE artifacts SET refcount = MAX(refcount - 1, 0) WHERE key = ?', (key,))
+            conn.commit()
+            row = conn.execute('SELECT refcount FROM artifacts WHERE key = ?', (key,)).fetchone()
+            return row[0] if row is not None else None
+
+    def delete(self, key):
+        """Delete - forget an artifact, whatever its reference count."""
+        with self._lock:
+            conn = self._connection()
+            if conn is not None:
+                conn.execute('DELETE FROM artifacts WHERE key = ?', (key,))
+                conn.commit()
+
+    def prune(self, max_idle = None):
+        """Prune - forget unreferenced artifacts (only the ones unused for max_idle seconds, if given), files are left on disk. Returns the removed records."""
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return []
+            last_used_before = time.time() - max_idle if max_idle is not None else float('inf')
+            rows = conn.execute('SELECT key, tool, args, outputs, metadata, refcount, created_at, last_used_at FROM artifacts WHERE refcount <= 0 AND last_used_at < ?', (last_used_before,)).fetchall()
+            conn.executemany('DELETE FROM artifacts WHERE key = ?', [(row[0],) for row in rows])
+            conn.commit()
+            return [self._record(row) for row in rows]
+
+    def clear(self):
+        """Clear - forget every artifact, files are left on disk."""
+        with self._lock:
+            conn = self._connection()
+            if conn is not None:
+                conn.execute('DELETE FROM artifacts')
+                conn.commit()
+
+
+    @property
+    def stats(self):
+        """Stats - hit / miss counters and hit rate."""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups > 0 else 0.0
+        return stats
+
+    def reset_stats(self):
+        """reset_stats - counters back to 0."""
+        with self._lock:
+            self._stats = { name: 0 for name in self._stats }
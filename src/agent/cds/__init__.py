@@ -0,0 +1,41 @@
+"""CDS (Climate Data Store) data access package, imported by the notebooks built by the agent tools."""
+
+from .planner import (
+    CDS_CACHE_DIR,
+    DEFAULT_TILE_SIZE,
+    ERA5_LAND_RESOLUTION,
+    DownloadIndex,
+    DownloadPlanner,
+    DownloadRequest,
+    TileGrid,
+    download_file,
+    month_range,
+    snap_area,
+    split_antimeridian,
+)
+from .reducer import (
+    MONTHLY_DATASETS,
+    MONTHLY_PRODUCT_LAG_MONTHS,
+    MonthlyAccumulator,
+    monthly_product_months,
+    monthly_totals,
+)
+
+__all__ = [
+    'ERA5_LAND_RESOLUTION',
+    'DEFAULT_TILE_SIZE',
+    'CDS_CACHE_DIR',
+    'DownloadRequest',
+    'DownloadIndex',
+    'DownloadPlanner',
+    'TileGrid',
+    'download_file',
+    'month_range',
+    'snap_area',
+    'split_antimeridian',
+    'MONTHLY_DATASETS',
+    'MONTHLY_PRODUCT_LAG_MONTHS',
+    'MonthlyAccumulator',
+    'monthly_product_months',
+    'monthly_totals',
+]
@@ -0,0 +1,315 @@
+"""Download planner for hourly CDS datasets (i.e.: reanalysis-era5-land). Requested areas are snapped to the native grid and split in fixed tiles, (tile, month) pairs are looked up in a local cache indexed by (dataset, variable, tile, month), and the missing ones are coalesced into the fewest CDS requests (one per year and set of months) submitted concurrently on a bounded pool."""
+# DOC: Tiles are a grid hash → overlapping areas (i.e.: "Italy" and "Northern Italy", or a bbox moved by 0.01°) share the tiles already downloaded, a requested window is assembled from its tiles (see agent.cds.reducer).
+# DOC: Files are downloaded to <target>.part and renamed when complete, an interrupted download restarts from the bytes already on disk (HTTP Range).
+# INFO: client is any cdsapi-like object → client.retrieve(dataset, request) returns a result with a .location url (or a .download(target) method)
+
+import concurrent.futures
+import datetime
+import hashlib
+import json
+import math
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from dataclasses import dataclass
+
+# DOC: ERA5-Land native grid step in degrees
+ERA5_LAND_RESOLUTION = 0.1
+
+# DOC: Tile side in degrees (10 x 10 ERA5-Land grid points)
+DEFAULT_TILE_SIZE = 1.0
+
+# DOC: Default cache folder (relocate with ICISK_CDS_CACHE), next to the other agent caches (see agent.utils._temp_dir)
+CDS_CACHE_DIR = os.environ.get('ICISK_CDS_CACHE', os.path.join(tempfile.gettempdir(), 'icisk-chat', 'cds-cache'))
+
+
+def _decimals(resolution):
+    return max(0, -math.floor(math.log10(resolution)) + 1)
+
+
+def snap_area(area, resolution = ERA5_LAND_RESOLUTION):
+    """snap_area - bbox [min_x, min_y, max_x, max_y] grown to the native grid, so close bboxes share the same requests."""
+    decimals = _decimals(resolution)
+
+    def snap(value, rounding):
+        return round(rounding(round(value / resolution, 6)) * resolution, decimals)
+
+    min_x, min_y, max_x, max_y = area
+    return (snap(min_x, math.floor), snap(min_y, math.floor), snap(max_x, math.ceil), snap(max_y, math.ceil))
+
+
+def split_antimeridian(area, resolution = ERA5_LAND_RESOLUTION):
+    """split_antimeridian - bbox wrapped around ±180 (min_x > max_x, as agent.gazetteer stores i.e. Fiji) → its parts east and west of the antimeridian, [area] otherwise."""
+    min_x, min_y, max_x, max_y = area
+    if min_x <= max_x:
+        return [tuple(area)]
+    return [(min_x, min_y, round(180 - resolution, _decimals(resolution)), max_y), (-180.0, min_y, max_x, max_y)]     # INFO: 180 is the grid column of -180
+
+
+class TileGrid:
+    """TileGrid - fixed tiles of tile_size degrees on the native grid. Tile (i, j) holds the grid points of columns [i*n, (i+1)*n) and rows [j*n, (j+1)*n), so tiles never overlap."""
+
+    def __init__(self, resolution = ERA5_LAND_RESOLUTION, tile_size = DEFAULT_TILE_SIZE):
+        """__init__ - tiles of tile_size degrees (rounded to whole grid cells) on a grid of resolution degrees."""
+        self.resolution = resolution
+        self.tile_cells = max(1, int(round(tile_size / resolution)))
+
+    def cells(self, area):
+        """Cells - (min col, min row, max col, max row) of the grid points covering area, bounds included."""
+        min_x, min_y, max_x, max_y = area
+
+        def to_cell(value, rounding):
+            return int(rounding(round(value / self.resolution, 6)))
+
+        return (to_cell(min_x, math.floor), to_cell(min_y, math.floor), to_cell(max_x, math.ceil), to_cell(max_y, math.ceil))
+
+    def coord(self, cell):
+        """Coord - coordinate of a grid point index."""
+        return round(cell * self.resolution, _decimals(self.resolution))
+
+    def tiles(self, area):
+        """Tiles - [(i, j), ...] of the tiles covering area (both sides of a bbox wrapped around ±180)."""
+        n = self.tile_cells
+        tiles = []
+        for min_col, min_row, max_col, max_row in (self.cells(part) for part in split_antimeridian(area, self.resolution)):
+            tiles.extend((i, j) for j in range(min_row // n, max_row // n + 1) for i in range(min_col // n, max_col // n + 1))
+        return tiles
+
+    def tile_area(self, tile):
+        """tile_area - bbox of the first and last grid points of a tile."""
+        (i, j), n = tile, self.tile_cells
+        return (self.coord(i * n), self.coord(j * n), self.coord((i + 1) * n - 1), self.coord((j + 1) * n - 1))
+
+
+def month_range(start, end):
+    """month_range - [(year, month), ...] from start to end (dates or 'YYYY-MM' strings) included."""
+    start = datetime.datetime.strptime(start, '%Y-%m') if isinstance(start, str) else start
+    end = datetime.datetime.strptime(end, '%Y-%m') if isinstance(end, str) else end
+    months = []
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+@dataclass(frozen=True)
+class DownloadRequest:
+    """DownloadRequest - one CDS request, the tiles of an area for some months of the same year."""
+    dataset: str
+    variable: str
+    area: tuple         # INFO: snapped [min_x, min_y, max_x, max_y] → bbox of the tiles
+    months: tuple       # INFO: ((year, month), ...) sorted, all in the same year
+    tiles: tuple = ()   # INFO: (tile area, ...) recorded in the index, the whole area if empty
+
+    @property
+    def key(self):
+        """Key - short content hash of the request."""
+        payload = json.dumps([self.dataset, self.variable, list(self.area), [list(m) for m in self.months], [list(t) for t in self.tiles]])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+    @property
+    def filename(self):
+        """Filename - name of the downloaded file in the cache folder."""
+        (year, first), (_, last) = self.months[0], self.months[-1]
+        return f'{self.dataset}__{self.variable}__{year}-{first:02d}_{year}-{last:02d}__{self.key}.nc'
+
+    def query(self):
+        """Query - CDS API request body (monthly products get one value per month, hourly ones every day and hour)."""
+        min_x, min_y, max_x, max_y = self.area
+        if self.dataset.endswith('-monthly-means'):
+            return {
+                'product_type': ['monthly_averaged_reanalysis'],
+                'variable': [self.variable],
+                'year': [str(self.months[0][0])],
+                'month': [f'{month:02d}' for _, month in self.months],
+                'time': ['00:00'],
+                'area': [max_y, min_x, min_y, max_x],
+                'data_format': 'netcdf',
+                'download_format': 'unarchived'
+            }
+        return {
+            'variable': [self.variable],
+            'year': [str(self.months[0][0])],
+            'month': [f'{month:02d}' for _, month in self.months],
+            'day': [f'{day:02d}' for day in range(1, 32)],
+            'time': [f'{hour:02d}:00' for hour in range(0, 24)],
+            'area': [max_y, min_x, min_y, max_x],     # INFO: N, W, S, E
+            'data_format': 'netcdf',
+            'download_format': 'unarchived'
+        }
+
+
+class DownloadIndex:
+    """DownloadIndex - local cache index → (dataset, variable, tile area, month) → downloaded file. Shared by every process through a SQLite file in the cache folder."""
+
+    def __init__(self, db_path):
+        """__init__ - index stored in the SQLite file db_path, opened on first use."""
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS downloads (dataset TEXT NOT NULL, variable TEXT NOT NULL, area TEXT NOT NULL, month TEXT NOT NULL, path TEXT NOT NULL, created_at REAL NOT NULL, PRIMARY KEY (dataset, variable, area, month))')
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def _row_key(dataset, variable, area, month):
+        return (dataset, variable, json.dumps(list(area)), f'{month[0]}-{month[1]:02d}')
+
+    def get(self, dataset, variable, area, month):
+        """Get - local file holding the month, None if missing (or deleted)."""
+        with self._lock:
+            row = self._connection().execute('SELECT path FROM downloads WHERE dataset = ? AND variable = ? AND area = ? AND month = ?', self._row_key(dataset, variable, area, month)).fetchone()
+        return row[0] if row is not None and os.path.exists(row[0]) else None
+
+    def add(self, request, path):
+        """Add - record path as the file holding every (tile, month) of request."""
+        now = datetime.datetime.now().timestamp()
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                'INSERT OR REPLACE INTO downloads (dataset, variable, area, month, path, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+                [(*self._row_key(request.dataset, request.variable, tile, month), path, now) for tile in (request.tiles or (request.area,)) for month in request.months]
+            )
+            conn.commit()
+
+
+def download_file(url, target, chunk_size = 1 << 20, timeout = 60):
+    """download_file - url → target through target.part, resuming from the bytes already in target.part."""
+    part = f'{target}.part'
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    request = urllib.request.Request(url, headers={ 'Range': f'bytes={offset}-' } if offset > 0 else {})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        mode = 'ab' if offset > 0 and response.status == 206 else 'wb'     # INFO: Server ignoring Range → start over
+        with open(part, mode) as f:
+            shutil.copyfileobj(response, f, chunk_size)
+    os.replace(part, target)
+    return target
+
+
+class DownloadPlanner:
+    """DownloadPlanner - missing (tile, month) pairs of a request grouped in a few CDS requests, downloaded concurrently into the cache folder."""
+
+    DEFAULT_MAX_WORKERS = 4
+    DEFAULT_MAX_MONTHS_PER_REQUEST = 12
+
+    def __init__(self, client, cache_dir = CDS_CACHE_DIR, max_workers = DEFAULT_MAX_WORKERS, max_months_per_request = DEFAULT_MAX_MONTHS_PER_REQUEST, resolution = ERA5_LAND_RESOLUTION, tile_size = DEFAULT_TILE_SIZE):
+        """__init__ - client is a cdsapi.Client (or any object with its retrieve), at most max_workers requests of max_months_per_request months are running at a time."""
+        self.client = client
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.max_months_per_request = max_months_per_request
+        self.resolution = resolution
+        self.grid = TileGrid(resolution, tile_size)
+        self.index = DownloadIndex(os.path.join(cache_dir, 'index.sqlite'))
+        self._stats = { 'cached_tile_months': 0, 'missing_tile_months': 0, 'requests': 0 }
+
+
+    def plan(self, dataset, variable, area, months):
+        """Plan - ([(months, cached path, tile areas)], [DownloadRequest for the missing tiles and months])."""
+        months = sorted(set(tuple(m) for m in months))
+        cached, missing = dict(), dict()
+        for side, part in enumerate(split_antimeridian(area, self.resolution)):     # INFO: A request never spans the antimeridian (its bbox would cover every longitude)
+            for tile in self.grid.tiles(part):
+                tile_area = self.grid.tile_area(tile)
+                tile_missing = []
+                for month in months:
+                    path = self.index.get(dataset, variable, tile_area, month)
+                    if path is not None:
+                        cached.setdefault(path, dict()).setdefault(tile_area, []).append(month)
+                    else:
+                        tile_missing.append(month)
+                # INFO: Tiles missing the same months of a year go in the same request (a CDS request lists one year, its months and every day and hour of them)
+                for year in sorted(set(year for year, _ in tile_missing)):
+                    year_months = tuple(m for m in tile_missing if m[0] == year)
+                    for i in range(0, len(year_months), self.max_months_per_request):
+                        missing.setdefault((side, year_months[i : i + self.max_months_per_request]), []).append(tile_area)
+
+        cached_files = []
+        for path, tiles in cached.items():
+            by_months = dict()
+            for tile_area, tile_months in tiles.items():
+                by_months.setdefault(tuple(tile_months), []).append(tile_area)
+            cached_files.extend((tile_months, path, tuple(tile_areas)) for tile_months, tile_areas in by_months.items())
+
+        requests = []
+        for (_, request_months), tile_areas in missing.items():
+            bbox = (min(t[0] for t in tile_areas), min(t[1] for t in tile_areas), max(t[2] for t in tile_areas), max(t[3] for t in tile_areas))
+            requests.append(DownloadRequest(dataset, variable, bbox, request_months, tuple(tile_areas)))
+        return cached_files, sorted(requests, key=lambda request: request.months)
+
+    def _submit(self, request, target, location_file):
+        """_submit - new CDS request → its result url (saved in location_file), None when the client downloaded it itself."""
+        result = self.client.retrieve(request.dataset, request.query())
+        location = getattr(result, 'location', None)
+        if location is None:
+            result.download(f'{target}.part')
+            os.replace(f'{target}.part', target)
+        else:
+            with open(location_file, 'w', encoding='utf-8') as f:
+                f.write(location)
+        return location
+
+    def _fetch(self, request):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        target = os.path.join(self.cache_dir, request.filename)
+        location_file = f'{target}.location'      # INFO: Url of a submitted request, an interrupted download resumes from it without asking CDS again
+        if not os.path.exists(target):
+            location = None
+            if os.path.exists(location_file):
+                with open(location_file, encoding='utf-8') as f:
+                    location = f.read().strip() or None
+            if location is not None:
+                try:
+                    download_file(location, target)
+                except urllib.error.HTTPError as exc:
+                    if not 400 <= exc.code < 500:
+                        raise
+                    # INFO: Stored result expired or removed by CDS → its partial file is dropped and the request is submitted again
+                    for path in (location_file, f'{target}.part'):
+                        if os.path.exists(path):
+                            os.remove(path)
+            if not os.path.exists(target):
+                location = self._submit(request, target, location_file)
+                if location is not None:
+                    download_file(location, target)
+        if os.path.exists(location_file):
+            os.remove(location_file)
+        self.index.add(request, target)
+        return request, target
+
+    def iter_downloads(self, dataset, variable, area, months):
+        """iter_downloads - (months, local file, tile areas) triples, every (tile, month) of area once. Cached ones first and then each request as soon as it completes (i.e.: to process a file while the others download)."""
+        cached, requests = self.plan(dataset, variable, area, months)
+        self._stats['cached_tile_months'] += sum(len(file_months) * len(tiles) for file_months, _, tiles in cached)
+        self._stats['missing_tile_months'] += sum(len(request.months) * len(request.tiles) for request in requests)
+        self._stats['requests'] += len(requests)
+        yield from cached
+        if len(requests) > 0:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.max_workers, len(requests))) as pool:
+                for future in concurrent.futures.as_completed([pool.submit(self._fetch, request) for request in requests]):
+                    request, target = future.result()
+                    yield request.months, target, request.tiles
+
+    def download(self, dataset, variable, area, months):
+        """Download - { (year, month): [local files] } for every requested month, only the missing tiles are requested to CDS."""
+        paths = dict()
+        for file_months, path, _ in self.iter_downloads(dataset, variable, area, months):
+            for month in file_months:
+                paths.setdefault(month, set()).add(path)
+        return { month: sorted(month_paths) for month, month_paths in paths.items() }
+
+    @property
+    def stats(self):
+        """Stats - cached / missing (tile, month) pairs and requests made so far."""
+        return dict(self._stats)
@@ -0,0 +1,174 @@
+"""Streaming hourly → monthly reduction. Every downloaded file is folded into per-month accumulators as soon as it arrives, one month of hourly grids is read at a time, so memory is O(one month grid) and downloads overlap with the reduction. The tiles of each file are placed in the requested window, which is assembled from cached and new tiles."""
+# DOC: Months already covered by the monthly CDS product (i.e.: reanalysis-era5-land-monthly-means) are requested from it instead of the hourly dataset.
+# INFO: xarray is imported on first use, files are opened lazily (netCDF) and only the slices of one month are loaded.
+
+import calendar
+import datetime
+import warnings
+
+import numpy as np
+
+from .planner import ERA5_LAND_RESOLUTION, TileGrid
+
+# DOC: Monthly product of the hourly datasets
+MONTHLY_DATASETS = {
+    'reanalysis-era5-land': 'reanalysis-era5-land-monthly-means',
+}
+
+# DOC: Monthly means of a month are published some weeks after its end, more recent months come from the hourly dataset
+MONTHLY_PRODUCT_LAG_MONTHS = 2
+
+
+class MonthlyAccumulator:
+    """MonthlyAccumulator - per month sums of the hourly values of a variable over a window of the native grid, a file (and its tiles) at a time."""
+
+    def __init__(self, short_name, months = None, area = None, resolution = ERA5_LAND_RESOLUTION):
+        """__init__ - only months (if given) are kept, the window covers area (or the extent of the first file)."""
+        self.short_name = short_name
+        self.months = set(tuple(m) for m in months) if months is not None else None     # INFO: Cached files may hold other months too
+        self.grid = TileGrid(resolution)
+        self._rows = self._cols = None      # INFO: Grid point indices of the window (the first file extent without area), rows north → south as in ERA5 files
+        if area is not None:
+            self._set_window(*self.grid.cells(area))
+        self._sums = dict()         # INFO: (year, month) → window grid
+        self._filled = dict()       # INFO: (year, month) → window points with data
+        self._steps = dict()        # INFO: (year, month) → number of summed time steps
+
+    def _set_window(self, min_col, min_row, max_col, max_row):
+        self._rows = np.arange(max_row, min_row - 1, -1)
+        if min_col > max_col:       # INFO: Area wrapped around ±180 → the columns east of min_col, then the ones west of max_col
+            half_turn = int(round(180 / self.grid.resolution))
+            self._cols = np.concatenate([np.arange(min_col, half_turn), np.arange(-half_turn, max_col + 1)])
+        else:
+            self._cols = np.arange(min_col, max_col + 1)
+
+    @staticmethod
+    def _time_dim(dataset):
+        return 'valid_time' if 'valid_time' in dataset.dims else 'time'
+
+    @staticmethod
+    def _space_dims(data, time_dim):
+        return [dim for dim in data.dims if dim != time_dim]
+
+    def _placement(self, data, time_dim, tiles):
+        """_placement - (window rows, window cols, data rows, data cols, tile mask) of the data points inside the window, the mask keeps the ones of the tiles."""
+        lat_dim, lon_dim = self._space_dims(data, time_dim)
+        rows = np.round(data[lat_dim].values / self.grid.resolution).astype(int)
+        cols = np.round(data[lon_dim].values / self.grid.resolution).astype(int)
+        if self._rows is None:
+            self._set_window(cols.min(), rows.min(), cols.max(), rows.max())
+        data_rows, data_cols = np.flatnonzero(np.isin(rows, self._rows)), np.flatnonzero(np.isin(cols, self._cols))
+        rows, cols = rows[data_rows], cols[data_cols]
+        if tiles is None:
+            mask = np.ones((len(rows), len(cols)), dtype=bool)
+        else:
+            mask = np.zeros((len(rows), len(cols)), dtype=bool)
+            for min_col, min_row, max_col, max_row in (self.grid.cells(tile) for tile in tiles):
+                mask |= ((rows >= min_row) & (rows <= max_row))[:, None] & ((cols >= min_col) & (cols <= max_col))[None, :]
+        window_rows = np.searchsorted(-self._rows, -rows)
+        col_order = np.argsort(self._cols)
+        window_cols = col_order[np.searchsorted(self._cols, cols, sorter=col_order)]
+        return window_rows, window_cols, data_rows, data_cols, mask
+
+    def add_file(self, path, months = None, tiles = None):
+        """add_file - fold a downloaded file into the accumulators (see add)."""
+        import xarray as xr
+        with xr.open_dataset(path) as dataset:
+            self.add(dataset, months=months, tiles=tiles)
+
+    def add(self, dataset, months = None, tiles = None):
+        """Add - fold the time steps of a dataset (hourly or daily) into the month sums. months and tiles (areas) limit what is taken from it, i.e.: the (tile, month) pairs the cache index points to this file."""
+        time_dim = self._time_dim(dataset)
+        data = dataset[self.short_name]
+        times = data[time_dim].dt
+        window_rows, window_cols, data_rows, data_cols, mask = self._placement(data, time_dim, tiles)
+        file_months = sorted(set(zip(times.year.values.tolist(), times.month.values.tolist())))
+        for month in file_months:
+            if (self.months is not None and month not in self.months) or (months is not None and month not in set(tuple(m) for m in months)):
+                continue
+            in_month = (times.year.values == month[0]) & (times.month.values == month[1])
+            month_data = data.isel({ time_dim: np.flatnonzero(in_month) })
+            month_sum = month_data.sum(time_dim, skipna=False).values[np.ix_(data_rows, data_cols)]     # INFO: Only this month is read from disk
+            self._fold(month, window_rows, window_cols, month_sum, mask)
+            self._steps[month] = (self._steps.get(month) or 0) + int(in_month.sum())
+
+    def _fold(self, month, window_rows, window_cols, grid, mask):
+        if month not in self._sums:
+            self._sums[month] = np.zeros((len(self._rows), len(self._cols)))
+            self._filled[month] = np.zeros((len(self._rows), len(self._cols)), dtype=bool)
+        target = np.ix_(window_rows, window_cols)
+        self._sums[month][target] += np.where(mask, grid, 0)
+        self._filled[month][target] |= mask
+
+    def set_month(self, month, data, tiles = None):
+        """set_month - final value of a month (2d DataArray, i.e.: from the monthly product), it is not scaled by to_dataset."""
+        month = tuple(month)
+        window_rows, window_cols, data_rows, data_cols, mask = self._placement(data, None, tiles)
+        self._fold(month, window_rows, window_cols, np.asarray(data.values, dtype=float)[np.ix_(data_rows, data_cols)], mask)
+        self._steps[month] = None
+
+    def discard(self, months):
+        """Discard - forget months (i.e.: partially filled from a source that failed)."""
+        for month in months:
+            for values in (self._sums, self._filled, self._steps):
+                values.pop(tuple(month), None)
+
+    @property
+    def steps(self):
+        """Steps - { (year, month): summed time steps }, None for the months set with set_month."""
+        return dict(self._steps)
+
+    def to_dataset(self, scale = 1.0):
+        """to_dataset - xarray.Dataset (time, lat, lon) of the months, the summed ones times scale. time is the first day of the month, window points without data are NaN."""
+        import xarray as xr
+        months = sorted(self._sums)
+        grids = [np.where(self._filled[m], self._sums[m] * (scale if self._steps[m] is not None else 1), np.nan) for m in months]
+        return xr.Dataset(
+            data_vars = { self.short_name: (('time', 'lat', 'lon'), np.stack(grids)) },
+            coords = {
+                'time': np.array([np.datetime64(f'{y}-{m:02d}-01', 'ns') for y, m in months]),
+                'lat': np.array([self.grid.coord(r) for r in self._rows]),
+                'lon': np.array([self.grid.coord(c) for c in self._cols]),
+            }
+        ).sortby(['time', 'lat', 'lon'])
+
+
+def monthly_product_months(months, today = None, lag_months = MONTHLY_PRODUCT_LAG_MONTHS):
+    """monthly_product_months - months already published in the monthly product (older than lag_months)."""
+    today = today or datetime.date.today()
+    last = (today.year, today.month)
+    for _ in range(lag_months):
+        last = (last[0] - 1, 12) if last[1] == 1 else (last[0], last[1] - 1)
+    return [tuple(m) for m in months if tuple(m) <= last]
+
+
+def monthly_totals(planner, area, months, dataset = 'reanalysis-era5-land', variable = 'total_precipitation', short_name = 'tp', hourly_scale = 1 / 12, use_monthly_product = True, today = None):
+    """monthly_totals - xarray.Dataset (time, lat, lon) of the monthly values of an accumulated variable over area.
+
+    Monthly product months (mean daily value) are times the days of the month, hourly months are the sum of the hourly steps times hourly_scale (the notebook convention, accumulations restart every day at 00 UTC).
+    """
+    import xarray as xr
+
+    months = sorted(set(tuple(m) for m in months))
+    accumulator = MonthlyAccumulator(short_name, months=months, area=area, resolution=planner.resolution)
+
+    product_months = monthly_product_months(months, today=today) if use_monthly_product and dataset in MONTHLY_DATASETS else []
+    if len(product_months) > 0:
+        try:
+            for file_months, path, tiles in planner.iter_downloads(MONTHLY_DATASETS[dataset], variable, area, product_months):
+                with xr.open_dataset(path) as product:
+                    time_dim = accumulator._time_dim(product)
+                    data = product[short_name]
+                    for i, month in enumerate(zip(data[time_dim].dt.year.values.tolist(), data[time_dim].dt.month.values.tolist())):
+                        if month in file_months and month in product_months:
+                            accumulator.set_month(month, data.isel({ time_dim: i }) * calendar.monthrange(*month)[1], tiles=tiles)
+        except OSError as exc:      # INFO: Download errors → requests.RequestException and urllib.error.URLError are OSError too
+            warnings.warn(f'Monthly product {MONTHLY_DATASETS[dataset]} not available ({exc}), using {dataset}', RuntimeWarning)
+            accumulator.discard(product_months)
+    hourly_months = [m for m in months if m not in accumulator.steps]
+
+    if len(hourly_months) > 0:
+        for file_months, path, tiles in planner.iter_downloads(dataset, variable, area, hourly_months):
+            accumulator.add_file(path, months=file_months, tiles=tiles)      # INFO: Folded while the other requests are still downloading
+
+    return accumulator.to_dataset(scale=hourly_scale)
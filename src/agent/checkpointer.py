@@ -0,0 +1,362 @@
+"""File-backed LangGraph checkpointer. Checkpoints and pending writes go to a SQLite file (WAL mode) in batched transactions, only the last K checkpoints of each thread namespace are kept and only the most recently used threads stay in memory."""
+# DOC: Durability window → a batch is written every flush_interval seconds (or as soon as batch_size rows are pending), so a crash loses at most the checkpoints of the last flush_interval. Interrupt and error writes and thread deletes are written right away (a run waiting for the user always survives a restart), close() / process exit write the rest. flush_interval = 0 is write-through: every put is in the file when it returns.
+
+import atexit
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.serde.types import ERROR, INTERRUPT
+
+_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS checkpoints (
+        thread_id TEXT NOT NULL,
+        checkpoint_ns TEXT NOT NULL DEFAULT '',
+        checkpoint_id TEXT NOT NULL,
+        parent_checkpoint_id TEXT,
+        type TEXT,
+        checkpoint BLOB,
+        metadata_type TEXT,
+        metadata BLOB,
+        PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS writes (
+        thread_id TEXT NOT NULL,
+        checkpoint_ns TEXT NOT NULL DEFAULT '',
+        checkpoint_id TEXT NOT NULL,
+        task_id TEXT NOT NULL,
+        idx INTEGER NOT NULL,
+        channel TEXT NOT NULL,
+        type TEXT,
+        value BLOB,
+        task_path TEXT NOT NULL DEFAULT '',
+        PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+    )""",
+]
+
+
+# DOC: In-memory view of one thread: { ns: { checkpoint_id: (parent_id, checkpoint_typed, metadata_typed) } } and { (ns, checkpoint_id): { (task_id, idx): (task_id, channel, value_typed, task_path) } }
+class _ThreadCache:
+
+    def __init__(self):
+        self.checkpoints = {}
+        self.writes = {}
+
+
+class SQLiteCheckpointSaver(BaseCheckpointSaver[int]):
+    """SQLiteCheckpointSaver - LangGraph checkpointer with the hot threads in memory and every checkpoint written to a SQLite file in batches."""
+
+    # DOC: Default values (overridable by env vars ICISK_CHECKPOINT_KEEP_LAST, ICISK_CHECKPOINT_MEMORY_THREADS, ICISK_CHECKPOINT_FLUSH_INTERVAL)
+    DEFAULT_KEEP_LAST = 20
+    DEFAULT_MEMORY_THREADS = 128
+    DEFAULT_BATCH_SIZE = 256
+    DEFAULT_FLUSH_INTERVAL = 0.5
+
+    def __init__(self, db_path, keep_last=None, max_memory_threads=None, batch_size=None, flush_interval=None, *, serde=None):
+        """__init__ - keep_last checkpoints per thread and namespace, max_memory_threads hot threads, pending rows written every flush_interval seconds (0 → write-through) or every batch_size rows."""
+        super().__init__(serde=serde)
+        self.db_path = db_path
+        self.keep_last = keep_last if keep_last is not None else int(os.environ.get('ICISK_CHECKPOINT_KEEP_LAST', self.DEFAULT_KEEP_LAST))
+        self.max_memory_threads = max_memory_threads if max_memory_threads is not None else int(os.environ.get('ICISK_CHECKPOINT_MEMORY_THREADS', self.DEFAULT_MEMORY_THREADS))
+        self.batch_size = batch_size if batch_size is not None else self.DEFAULT_BATCH_SIZE
+        self.flush_interval = flush_interval if flush_interval is not None else float(os.environ.get('ICISK_CHECKPOINT_FLUSH_INTERVAL', self.DEFAULT_FLUSH_INTERVAL))
+
+        self._threads = OrderedDict()       # INFO: thread_id → _ThreadCache, LRU of hot threads
+        self._pending = []                  # INFO: (sql, params) not yet written to the file
+        self._lock = threading.RLock()      # INFO: guards _threads and _pending
+        self._flush_lock = threading.Lock() # INFO: serializes flushes so batches hit the file in order
+        self._conn = None
+        self._flusher = None
+        self._closed = threading.Event()
+        self._stats = { 'flushes': 0, 'rows_written': 0, 'thread_loads': 0, 'compacted': 0 }
+
+
+    # REGION: [Storage]
+
+    def _connection(self):
+        if self._conn is None:
+            if os.path.dirname(self.db_path):
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _enqueue(self, sql, params):
+        with self._lock:
+            self._pending.append((sql, params))
+
+    # INFO: Never called while holding _lock (flush takes _flush_lock first, then _lock)
+    def _maybe_flush(self, force=False):
+        if force or self.flush_interval <= 0 or len(self._pending) >= self.batch_size:
+            self.flush()
+        else:
+            self._start_flusher()
+
+    def _start_flusher(self):
+        if self._flusher is None and self.flush_interval > 0:
+            with self._lock:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush_loop, name='icisk-checkpoint-flusher', daemon=True)
+                    self._flusher.start()
+                    atexit.register(self.close)
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Flush - write every pending row in one transaction, returns the number of rows."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if len(pending) == 0:
+                return 0
+            conn = self._connection()
+            with conn:
+                for sql, params in pending:
+                    conn.execute(sql, params)
+            self._stats['flushes'] += 1
+            self._stats['rows_written'] += len(pending)
+            return len(pending)
+
+    def close(self):
+        """Close - stop the flusher, write the pending rows and close the file."""
+        self._closed.set()
+        self.flush()
+        with self._flush_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def __enter__(self):
+        """__enter__ - the saver itself, closed on exit."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """__exit__ - flush and close (see close)."""
+        self.close()
+
+    @property
+    def stats(self):
+        """Stats - flush counters, hot threads and pending rows."""
+        return { **self._stats, 'memory_threads': len(self._threads), 'pending_rows': len(self._pending) }
+
+    # ENDREGION: [Storage]
+
+
+    # REGION: [Hot threads]
+
+    # DOC: Thread view from the LRU, loaded from the file on miss (pending rows are flushed first so the file is complete)
+    def _thread(self, thread_id):
+        with self._lock:
+            cache = self._threads.get(thread_id)
+            if cache is not None:
+                self._threads.move_to_end(thread_id)
+                return cache
+        self.flush()
+        cache = _ThreadCache()
+        with self._flush_lock:
+            conn = self._connection()
+            checkpoint_rows = conn.execute(
+                'SELECT checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata FROM checkpoints WHERE thread_id = ?',
+                (thread_id,)
+            ).fetchall()
+            write_rows = conn.execute(
+                'SELECT checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, task_path FROM writes WHERE thread_id = ?',
+                (thread_id,)
+            ).fetchall()
+        for ns, checkpoint_id, parent_id, c_type, c_blob, m_type, m_blob in checkpoint_rows:
+            cache.checkpoints.setdefault(ns, {})[checkpoint_id] = (parent_id, (c_type, c_blob), (m_type, m_blob))
+        for ns, checkpoint_id, task_id, idx, channel, v_type, v_blob, task_path in write_rows:
+            cache.writes.setdefault((ns, checkpoint_id), {})[(task_id, idx)] = (task_id, channel, (v_type, v_blob), task_path)
+        with self._lock:
+            current = self._threads.get(thread_id)
+            if current is not None:         # INFO: Another caller loaded it meanwhile, keep the one that may have new puts
+                return current
+            self._threads[thread_id] = cache
+            self._stats['thread_loads'] += 1
+            while len(self._threads) > self.max_memory_threads:
+                self._threads.popitem(last=False)   # INFO: Its rows are already in the file or in _pending
+        return cache
+
+    # DOC: Drop checkpoints (and their writes) older than the last keep_last of a namespace
+    def _compact(self, thread_id, cache, checkpoint_ns):
+        checkpoints = cache.checkpoints.get(checkpoint_ns, {})
+        if self.keep_last is None or self.keep_last <= 0 or len(checkpoints) <= self.keep_last:
+            return
+        stale_ids = sorted(checkpoints.keys())[:-self.keep_last]
+        for checkpoint_id in stale_ids:
+            del checkpoints[checkpoint_id]
+            cache.writes.pop((checkpoint_ns, checkpoint_id), None)
+        oldest_kept = min(checkpoints.keys())
+        self._enqueue('DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?', (thread_id, checkpoint_ns, oldest_kept))
+        self._enqueue('DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?', (thread_id, checkpoint_ns, oldest_kept))
+        self._stats['compacted'] += len(stale_ids)
+
+    # DOC: A new root run drops the subgraph namespaces of the previous ones (they are never resumed again)
+    def _drop_subgraph_namespaces(self, thread_id, cache):
+        stale_ns = [ns for ns in cache.checkpoints if ns != '']
+        for ns in stale_ns:
+            del cache.checkpoints[ns]
+        for key in [key for key in cache.writes if key[0] != '']:
+            del cache.writes[key]
+        if len(stale_ns) > 0:
+            self._enqueue("DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns != ''", (thread_id,))
+            self._enqueue("DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns != ''", (thread_id,))
+
+    def _checkpoint_tuple(self, thread_id, checkpoint_ns, checkpoint_id, cache, metadata=None):
+        parent_id, checkpoint, metadata_typed = cache.checkpoints[checkpoint_ns][checkpoint_id]
+        writes = cache.writes.get((checkpoint_ns, checkpoint_id), {})
+        ordered_writes = sorted(writes.items(), key=lambda kv: (kv[1][3], kv[0][0], kv[0][1]))     # INFO: writes_sort_key order (task_path, task_id, idx)
+        return CheckpointTuple(
+            config = { 'configurable': { 'thread_id': thread_id, 'checkpoint_ns': checkpoint_ns, 'checkpoint_id': checkpoint_id } },
+            checkpoint = self.serde.loads_typed(checkpoint),
+            metadata = metadata if metadata is not None else self.serde.loads_typed(metadata_typed),
+            parent_config = { 'configurable': { 'thread_id': thread_id, 'checkpoint_ns': checkpoint_ns, 'checkpoint_id': parent_id } } if parent_id else None,
+            pending_writes = [(task_id, channel, self.serde.loads_typed(value)) for (task_id, channel, value, _) in (w for _, w in ordered_writes)],
+        )
+
+    # ENDREGION: [Hot threads]
+
+
+    # REGION: [BaseCheckpointSaver]
+
+    def get_tuple(self, config):
+        """get_tuple - checkpoint of config (the latest one without checkpoint_id) with its pending writes."""
+        thread_id = config['configurable']['thread_id']
+        checkpoint_ns = config['configurable'].get('checkpoint_ns', '')
+        cache = self._thread(thread_id)
+        with self._lock:
+            checkpoints = cache.checkpoints.get(checkpoint_ns, {})
+            checkpoint_id = get_checkpoint_id(config) or max(checkpoints.keys(), default=None)
+            if checkpoint_id is None or checkpoint_id not in checkpoints:
+                return None
+            return self._checkpoint_tuple(thread_id, checkpoint_ns, checkpoint_id, cache)
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        """List - checkpoints of config (every thread when None) from the newest."""
+        if config is not None:
+            thread_ids = [config['configurable']['thread_id']]
+        else:
+            self.flush()
+            with self._flush_lock:
+                thread_ids = [row[0] for row in self._connection().execute('SELECT DISTINCT thread_id FROM checkpoints').fetchall()]
+        config_checkpoint_ns = config['configurable'].get('checkpoint_ns') if config else None
+        config_checkpoint_id = get_checkpoint_id(config) if config else None
+        before_checkpoint_id = get_checkpoint_id(before) if before else None
+
+        for thread_id in thread_ids:
+            cache = self._thread(thread_id)
+            with self._lock:
+                candidates = [
+                    (checkpoint_ns, checkpoint_id)
+                    for checkpoint_ns, checkpoints in cache.checkpoints.items()
+                    if config_checkpoint_ns is None or checkpoint_ns == config_checkpoint_ns
+                    for checkpoint_id in checkpoints
+                    if (config_checkpoint_id is None or checkpoint_id == config_checkpoint_id)
+                    and (before_checkpoint_id is None or checkpoint_id < before_checkpoint_id)
+                ]
+            for checkpoint_ns, checkpoint_id in sorted(candidates, key=lambda c: c[1], reverse=True):
+                if limit is not None and limit <= 0:
+                    return
+                with self._lock:
+                    if checkpoint_id not in cache.checkpoints.get(checkpoint_ns, {}):
+                        continue        # INFO: Compacted meanwhile
+                    metadata = self.serde.loads_typed(cache.checkpoints[checkpoint_ns][checkpoint_id][2])
+                    if filter and not all(metadata.get(key) == value for key, value in filter.items()):
+                        continue
+                    checkpoint_tuple = self._checkpoint_tuple(thread_id, checkpoint_ns, checkpoint_id, cache, metadata=metadata)
+                if limit is not None:
+                    limit -= 1
+                yield checkpoint_tuple
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        """Put - store a checkpoint, older ones beyond keep_last are dropped."""
+        thread_id = config['configurable']['thread_id']
+        checkpoint_ns = config['configurable'].get('checkpoint_ns', '')
+        parent_id = config['configurable'].get('checkpoint_id')
+        metadata = get_checkpoint_metadata(config, metadata)
+        checkpoint_typed = self.serde.dumps_typed(checkpoint)
+        metadata_typed = self.serde.dumps_typed(metadata)
+
+        cache = self._thread(thread_id)
+        with self._lock:
+            if checkpoint_ns == '' and metadata.get('source') == 'input':
+                self._drop_subgraph_namespaces(thread_id, cache)
+            cache.checkpoints.setdefault(checkpoint_ns, {})[checkpoint['id']] = (parent_id, checkpoint_typed, metadata_typed)
+            self._enqueue(
+                'INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (thread_id, checkpoint_ns, checkpoint['id'], parent_id, checkpoint_typed[0], checkpoint_typed[1], metadata_typed[0], metadata_typed[1])
+            )
+            self._compact(thread_id, cache, checkpoint_ns)
+        self._maybe_flush()
+
+        return { 'configurable': { 'thread_id': thread_id, 'checkpoint_ns': checkpoint_ns, 'checkpoint_id': checkpoint['id'] } }
+
+    def put_writes(self, config, writes, task_id, task_path=''):
+        """put_writes - store the pending writes of a task, interrupts and errors are flushed right away."""
+        thread_id = config['configurable']['thread_id']
+        checkpoint_ns = config['configurable'].get('checkpoint_ns', '')
+        checkpoint_id = config['configurable']['checkpoint_id']
+
+        cache = self._thread(thread_id)
+        force_flush = False
+        with self._lock:
+            stored = cache.writes.setdefault((checkpoint_ns, checkpoint_id), {})
+            for idx, (channel, value) in enumerate(writes):
+                write_idx = WRITES_IDX_MAP.get(channel, idx)
+                if write_idx >= 0 and (task_id, write_idx) in stored:
+                    continue        # INFO: Regular writes are idempotent, special ones (interrupt, error, ...) are overwritten
+                value_typed = self.serde.dumps_typed(value)
+                stored[(task_id, write_idx)] = (task_id, channel, value_typed, task_path)
+                self._enqueue(
+                    f"INSERT OR {'REPLACE' if write_idx < 0 else 'IGNORE'} INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, task_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (thread_id, checkpoint_ns, checkpoint_id, task_id, write_idx, channel, value_typed[0], value_typed[1], task_path)
+                )
+                force_flush = force_flush or channel in (INTERRUPT, ERROR)
+        self._maybe_flush(force=force_flush)     # INFO: On interrupt the run stops waiting for the user, make it survive a restart right away
+
+    def delete_thread(self, thread_id):
+        """delete_thread - drop every checkpoint and write of a thread."""
+        with self._lock:
+            self._threads.pop(thread_id, None)
+        self._enqueue('DELETE FROM checkpoints WHERE thread_id = ?', (thread_id,))
+        self._enqueue('DELETE FROM writes WHERE thread_id = ?', (thread_id,))
+        self._maybe_flush(force=True)
+
+    # INFO: Async variants run inline like InMemorySaver, the hot path is in memory and file writes happen in the flusher thread
+    async def aget_tuple(self, config):
+        """Async version of get_tuple."""
+        return self.get_tuple(config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        """Async version of list."""
+        for checkpoint_tuple in self.list(config, filter=filter, before=before, limit=limit):
+            yield checkpoint_tuple
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        """Async version of put."""
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=''):
+        """Async version of put_writes."""
+        return self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        """Async version of delete_thread."""
+        return self.delete_thread(thread_id)
+
+    # ENDREGION: [BaseCheckpointSaver]
@@ -18,6 +18,12 @@ class Configuration:
     # and when you invoke the graph
     my_configurable_param: str = "changeme"
 
+    # Chatbot prompt history: approximate token budget, number of recent
+    # messages sent verbatim and max chars kept from older tool responses
+    history_token_budget: int = 6000
+    history_window: int = 12
+    history_tool_message_chars: int = 600
+
     @classmethod
     def from_runnable_config(
         cls, config: Optional[RunnableConfig] = None
@@ -0,0 +1,19 @@
+"""Offline gazetteer: area name → bounding box [min_x, min_y, max_x, max_y] (EPSG:4326) without asking the LLM."""
+
+from .index import (
+    GAZETTEER_STORE,
+    Gazetteer,
+    GazetteerMatch,
+    get_gazetteer,
+    lookup,
+    normalize_name,
+)
+
+__all__ = [
+    'Gazetteer',
+    'GazetteerMatch',
+    'GAZETTEER_STORE',
+    'get_gazetteer',
+    'lookup',
+    'normalize_name',
+]
@@ -0,0 +1,265 @@
+"""Offline builders for the gazetteer store. They are run by maintainers, never at agent runtime."""
+#   python -m agent.gazetteer.build natural-earth                 → rebuild countries / regions / continents from Natural Earth admin-0 map subunits (pip install country-bounding-boxes)
+#   python -m agent.gazetteer.build cities --min-population 500000 → append cities (and every national capital) from GeoNames (pip install geonamescache)
+#   python -m agent.gazetteer.build features                      → append the mountain ranges, peninsulas and basins of GEOGRAPHIC_FEATURES
+#   python -m agent.gazetteer.build geocode "Po Valley" "Milan"   → append places resolved once with geopy (Nominatim)
+
+import argparse
+import json
+import math
+import warnings
+
+from agent.gazetteer.index import GAZETTEER_STORE, normalize_name
+
+# DOC: A non-home subunit (i.e. Sicily, Corsica, Bornholm) is merged into its country bbox when it lies within this margin (degrees)
+NEAR_SUBUNIT_MARGIN = 3.0
+
+
+# DOC: Common country names missing from Natural Earth (only admin names, formal names and ISO codes are country aliases)
+COUNTRY_ALIASES = {
+    'United Kingdom': ['UK', 'Great Britain', 'Britain'],
+    'United States': ['US', 'America'],
+}
+
+
+# DOC: GeoNames cities are points → the place bbox is a square of about the city area (population / PLACE_DENSITY km²), never smaller than an ERA5-Land cell
+PLACE_DENSITY = 3000.0
+MIN_PLACE_HALF_SIDE_KM = 10.0
+
+# DOC: Named geographic features missing from the country and city sources, approximate extents [min_lon, min_lat, max_lon, max_lat] (refresh them with the geocode command)
+GEOGRAPHIC_FEATURES = {
+    'Alps': ([5.0, 43.6, 16.6, 48.3], ['European Alps']),
+    'Pyrenees': ([-1.9, 42.2, 3.3, 43.3], []),
+    'Apennines': ([8.0, 38.0, 16.5, 44.5], ['Apennine Mountains']),
+    'Carpathians': ([17.2, 44.2, 26.7, 49.9], ['Carpathian Mountains']),
+    'Dinaric Alps': ([13.5, 41.5, 20.5, 46.5], []),
+    'Ural Mountains': ([55.0, 50.0, 66.5, 69.0], ['Urals']),
+    'Himalayas': ([72.9, 26.6, 95.4, 35.9], ['Himalaya']),
+    'Andes': ([-80.5, -55.9, -62.5, 11.0], []),
+    'Rocky Mountains': ([-128.0, 32.0, -104.0, 60.0], ['Rockies']),
+    'Po Valley': ([7.6, 44.3, 12.6, 45.9], ['Padan Plain']),
+    'Iberian Peninsula': ([-9.5, 36.0, 3.4, 43.8], ['Iberia']),
+    'Scandinavian Peninsula': ([4.6, 55.3, 31.6, 71.2], []),
+    'Balkan Peninsula': ([13.4, 36.3, 29.7, 46.9], ['Balkans']),
+    'Anatolia': ([26.0, 36.0, 45.0, 42.1], ['Asia Minor']),
+    'Mediterranean Basin': ([-9.5, 30.0, 36.5, 46.0], ['Mediterranean']),
+    'Sahara': ([-17.1, 14.0, 39.0, 33.0], ['Sahara Desert']),
+    'Sahel': ([-17.5, 11.0, 38.5, 20.0], []),
+}
+
+
+def _lon_union(intervals):
+    """_lon_union - (min_lon, max_lon) of the shortest arc covering the intervals, min_lon > max_lon when it crosses the antimeridian."""
+    merged = []
+    for start, end in sorted(intervals):
+        if len(merged) > 0 and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    # INFO: The largest gap between the merged intervals (the one across ±180 included) is left out of the box
+    gaps = [(merged[i + 1][0] - merged[i][1], i) for i in range(len(merged) - 1)]
+    wrap_gap = merged[0][0] + 360 - merged[-1][1]
+    if len(gaps) == 0 or wrap_gap >= max(gaps)[0]:
+        return merged[0][0], merged[-1][1]
+    _, i = max(gaps)
+    return merged[i + 1][0], merged[i][1]
+
+def _lon_parts(bbox):
+    return [(bbox[0], 180.0), (-180.0, bbox[2])] if bbox[0] > bbox[2] else [(bbox[0], bbox[2])]
+
+def _union(bboxes):
+    min_lon, max_lon = _lon_union([part for b in bboxes for part in _lon_parts(b)])
+    return [
+        min_lon,
+        min(b[1] for b in bboxes),
+        max_lon,
+        max(b[3] for b in bboxes),
+    ]
+
+def _is_near(bbox, other, margin):
+    if bbox[1] > other[3] + margin or bbox[3] < other[1] - margin:
+        return False
+    return any(not (start > other_end + margin or end < other_start - margin) for start, end in _lon_parts(bbox) for other_start, other_end in _lon_parts(other))
+
+def _round_bbox(bbox, decimals=4):
+    return [round(float(c), decimals) for c in bbox]
+
+def _aliases(name, *candidates):
+    aliases = []
+    for candidate in candidates:
+        candidate = candidate if isinstance(candidate, str) else None      # INFO: Natural Earth missing values are -99 (float)
+        if candidate and candidate not in ('-99', '') and normalize_name(candidate) != normalize_name(name) and candidate not in aliases:
+            aliases.append(candidate)
+    return aliases
+
+
+def from_natural_earth_subunits(records):
+    """from_natural_earth_subunits - Build entries from Natural Earth "admin-0 map subunits" records (objects exposing bbox, admin, subunit, name, name_long, formal_en, name_alt, adm0_a3, homepart, continent, subregion) bboxes crossing the antimeridian (i.e. Russia, Fiji, Alaska) are stored wrapped around it → min_lon > max_lon."""
+    records = list(records)
+    entries = []
+
+    countries = {}
+    for record in records:
+        countries.setdefault(record.admin, []).append(record)
+
+    country_bboxes = {}
+    for admin, subunits in countries.items():
+        home = [s for s in subunits if s.homepart == 1] or subunits
+        bbox = _union([s.bbox for s in home])
+        near = [s for s in subunits if s not in home and _is_near(s.bbox, bbox, NEAR_SUBUNIT_MARGIN)]
+        bbox = _union([bbox] + [s.bbox for s in near])
+        country_bboxes[admin] = (bbox, home[0])
+        # INFO: Home subunits alone (i.e. Spain without the Balearic and Canary Islands) are the mainland of the country
+        home_bbox = _union([s.bbox for s in home])
+        if len(home) < len(subunits) and _round_bbox(home_bbox) != _round_bbox(bbox):
+            entries.append({
+                'name': f'Mainland {admin}',
+                'kind': 'region',
+                'bbox': _round_bbox(home_bbox),
+                'aliases': [f'Continental {admin}'],
+                'country': admin,
+            })
+        # INFO: Home subunit names (i.e. England, Honshu, Hainan) are regions, only the records named as the country give its formal and alternate names
+        country_records = [s for s in subunits if normalize_name(s.subunit) == normalize_name(admin)]
+        entries.append({
+            'name': admin,
+            'kind': 'country',
+            'bbox': _round_bbox(bbox),
+            'aliases': _aliases(admin, *[n for s in country_records for n in (s.name_long, s.formal_en, s.name_alt)], home[0].adm0_a3, *COUNTRY_ALIASES.get(admin, [])),
+            'country': admin,
+        })
+        regions = {}
+        for subunit in subunits:
+            if normalize_name(subunit.subunit) != normalize_name(admin):
+                regions.setdefault(subunit.subunit, []).append(subunit)
+        for name, parts in regions.items():
+            entries.append({
+                'name': name,
+                'kind': 'region',
+                'bbox': _round_bbox(_union([s.bbox for s in parts])),
+                'aliases': _aliases(name, *[n for s in parts for n in (s.name, s.name_long, s.name_alt, s.formal_en)]),
+                'country': admin,
+            })
+
+    for group_field, kind in (('subregion', 'region'), ('continent', 'continent')):
+        groups = {}
+        for admin, (bbox, home) in country_bboxes.items():
+            group = getattr(home, group_field)
+            if group and group != 'Seven seas (open ocean)' and group not in country_bboxes:
+                groups.setdefault(group, []).append(bbox)
+        for group, bboxes in groups.items():
+            entries.append({
+                'name': group,
+                'kind': kind,
+                'bbox': _round_bbox(_union(bboxes)),
+                'aliases': [],
+                'country': None,
+            })
+
+    return entries
+
+
+def _wrap_lon(lon):
+    return lon if -180 <= lon <= 180 else (lon + 180) % 360 - 180
+
+def _point_bbox(lon, lat, half_side_km):
+    half_lat = half_side_km / 111.32
+    half_lon = half_side_km / (111.32 * max(math.cos(math.radians(lat)), 0.01))
+    return [_wrap_lon(lon - half_lon), max(lat - half_lat, -90.0), _wrap_lon(lon + half_lon), min(lat + half_lat, 90.0)]     # INFO: Wrapped around ±180 (min_lon > max_lon) near the antimeridian
+
+
+def from_geonames_cities(min_population=500000, exclude=(), cache=None):
+    """from_geonames_cities - cities with at least min_population and every national capital from GeoNames (geonamescache), names in exclude (i.e. the stored countries and regions) keep their larger area."""
+    if cache is None:
+        import geonamescache
+        cache = geonamescache.GeonamesCache()
+    countries = cache.get_countries()
+    capitals = { (code, country['capital']) for code, country in countries.items() if country.get('capital') }
+    taken = { normalize_name(name) for name in exclude }
+    entries = []
+    for city in sorted(cache.get_cities().values(), key=lambda c: -c['population']):      # INFO: A name shared by several cities goes to the most populated one
+        key = normalize_name(city['name'])
+        if key in taken or (city['population'] < min_population and (city['countrycode'], city['name']) not in capitals):
+            continue
+        taken.add(key)
+        half_side_km = max(MIN_PLACE_HALF_SIDE_KM, math.sqrt(city['population'] / PLACE_DENSITY) / 2)
+        entries.append({
+            'name': city['name'],
+            'kind': 'place',
+            'bbox': _round_bbox(_point_bbox(city['longitude'], city['latitude'], half_side_km)),
+            'aliases': [],
+            'country': countries.get(city['countrycode'], dict()).get('name'),
+        })
+    return entries
+
+
+def from_geographic_features(features=GEOGRAPHIC_FEATURES):
+    """from_geographic_features - entries of the named geographic features table { name: (bbox, aliases) }."""
+    return [
+        { 'name': name, 'kind': 'region', 'bbox': _round_bbox(bbox), 'aliases': list(aliases), 'country': None }
+        for name, (bbox, aliases) in features.items()
+    ]
+
+
+def from_geocoder(names, geocoder=None, kind='place'):
+    """from_geocoder - geocode place names once with geopy and return gazetteer entries (Nominatim boundingbox is [south, north, west, east])."""
+    if geocoder is None:
+        from geopy.extra.rate_limiter import RateLimiter
+        from geopy.geocoders import Nominatim
+        geocode = RateLimiter(Nominatim(user_agent='icisk-ai-agent-gazetteer').geocode, min_delay_seconds=1)     # INFO: Nominatim usage policy, at most one request per second
+        geocode_kwargs = { 'addressdetails': True, 'language': 'en' }
+    else:
+        geocode, geocode_kwargs = geocoder.geocode, dict()
+    entries = []
+    for name in names:
+        location = geocode(name, exactly_one=True, **geocode_kwargs)
+        if location is None or 'boundingbox' not in location.raw:
+            warnings.warn(f'Skipped {name}: not found', RuntimeWarning)
+            continue
+        south, north, west, east = map(float, location.raw['boundingbox'])
+        entries.append({
+            'name': name,
+            'kind': kind,
+            'bbox': _round_bbox([west, south, east, north]),
+            'aliases': [],
+            'country': location.raw.get('address', {}).get('country'),
+        })
+    return entries
+
+
+def write_store(entries, path=GAZETTEER_STORE, append=False):
+    """write_store - entries to the store file, append=True keeps the stored entries with other names."""
+    if append:
+        with open(path, encoding='utf-8') as f:
+            existing = json.load(f)['entries']
+        new_names = { normalize_name(e['name']) for e in entries }
+        entries = [e for e in existing if normalize_name(e['name']) not in new_names] + entries
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({ 'version': 1, 'crs': 'EPSG:4326', 'entries': entries }, f, ensure_ascii=False, separators=(',', ':'))
+
+
+def main(argv=None):
+    """Run the command line builder (see the module docstring)."""
+    parser = argparse.ArgumentParser(description='Build the offline gazetteer store')
+    parser.add_argument('command', choices=['natural-earth', 'cities', 'features', 'geocode'])
+    parser.add_argument('names', nargs='*')
+    parser.add_argument('--kind', default='place')
+    parser.add_argument('--min-population', type=int, default=500000)
+    parser.add_argument('--store', default=GAZETTEER_STORE)
+    args = parser.parse_args(argv)
+
+    if args.command == 'natural-earth':
+        from country_bounding_boxes.generated import countries
+        write_store(from_natural_earth_subunits(countries), args.store)
+    elif args.command == 'cities':
+        with open(args.store, encoding='utf-8') as f:
+            areas = [name for e in json.load(f)['entries'] if e['kind'] != 'place' for name in [e['name']] + e['aliases']]
+        write_store(from_geonames_cities(args.min_population, exclude=areas), args.store, append=True)
+    elif args.command == 'features':
+        write_store(from_geographic_features(), args.store, append=True)
+    else:
+        write_store(from_geocoder(args.names, kind=args.kind), args.store, append=True)
+
+
+if __name__ == '__main__':
+    main()
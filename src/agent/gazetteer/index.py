@@ -0,0 +1,136 @@
+"""In-memory name index over the prebuilt gazetteer store. Lookups go exact → prefix → fuzzy (trigram candidates ranked by similarity)."""
+
+import bisect
+import difflib
+import json
+import os
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass
+
+GAZETTEER_STORE = os.path.join(os.path.dirname(__file__), 'data', 'gazetteer.json')
+
+# DOC: Lower kinds win ties → the most specific kind first, a name shared by a place or region and a larger area resolves to the place asked for
+KIND_PRIORITY = { 'place': 0, 'region': 1, 'country': 2, 'continent': 3 }
+
+
+def normalize_name(name):
+    """normalize_name - lookup key of a name → ascii, casefolded, punctuation as single spaces, no leading "the"."""
+    name = unicodedata.normalize('NFKD', str(name)).encode('ascii', 'ignore').decode('ascii')
+    name = re.sub(r'[^a-z0-9]+', ' ', name.casefold()).strip()
+    if name.startswith('the '):
+        name = name[4:]
+    return name
+
+def _trigrams(key):
+    padded = f'  {key} '
+    return { padded[i:i+3] for i in range(len(padded) - 2) }
+
+
+@dataclass(frozen=True)
+class GazetteerMatch:
+    """GazetteerMatch - a resolved area name, how it was matched and how close."""
+    name: str
+    kind: str
+    bbox: list
+    country: str = None
+    method: str = 'exact'        # INFO: 'exact' | 'prefix' | 'fuzzy'
+    score: float = 1.0
+
+    @property
+    def crosses_antimeridian(self):
+        """crosses_antimeridian - bbox wrapped around ±180 (min_lon > max_lon)."""
+        return self.bbox[0] > self.bbox[2]
+
+
+class Gazetteer:
+    """Gazetteer - in-memory index over the entries of the store."""
+
+    FUZZY_CUTOFF = 0.8
+
+    def __init__(self, entries):
+        """__init__ - index entries by their normalized name and aliases."""
+        self.entries = list(entries)
+        self._exact = {}            # INFO: normalized key → entry ids
+        self._trigrams = {}         # INFO: trigram → normalized keys
+        for entry_id, entry in enumerate(self.entries):
+            for name in [entry['name']] + list(entry.get('aliases', [])):
+                key = normalize_name(name)
+                if key:
+                    self._exact.setdefault(key, []).append(entry_id)
+        for key in self._exact:
+            for trigram in _trigrams(key):
+                self._trigrams.setdefault(trigram, set()).add(key)
+        self._sorted_keys = sorted(self._exact.keys())
+
+    @classmethod
+    def load(cls, path=GAZETTEER_STORE):
+        """Load - gazetteer of the store file."""
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f)['entries'])
+
+
+    def _best(self, keys, method, score=1.0):
+        entry_ids = { entry_id for key in keys for entry_id in self._exact[key] }
+        entry = min((self.entries[i] for i in entry_ids), key=lambda e: (KIND_PRIORITY.get(e['kind'], len(KIND_PRIORITY)), len(e['name']), e['name']))
+        return GazetteerMatch(name=entry['name'], kind=entry['kind'], bbox=list(entry['bbox']), country=entry.get('country'), method=method, score=score)
+
+    def _prefix_keys(self, key):
+        start = bisect.bisect_left(self._sorted_keys, key)
+        keys = []
+        for candidate in self._sorted_keys[start:]:
+            if not candidate.startswith(key):
+                break
+            keys.append(candidate)
+        return keys
+
+    def _fuzzy_keys(self, key):
+        query_trigrams = _trigrams(key)
+        counts = {}
+        for trigram in query_trigrams:
+            for candidate in self._trigrams.get(trigram, ()):
+                counts[candidate] = counts.get(candidate, 0) + 1
+        scored = []
+        for candidate, shared in counts.items():
+            if shared * 3 < len(query_trigrams):       # INFO: cheap trigram filter before the real similarity (loose enough for transpositions)
+                continue
+            score = difflib.SequenceMatcher(None, key, candidate).ratio()
+            if score >= self.FUZZY_CUTOFF:
+                scored.append((score, candidate))
+        return sorted(scored, key=lambda sc: (-sc[0], sc[1]))
+
+
+    def lookup(self, name):
+        """Lookup - resolve an area name to its best match, None when nothing is close enough."""
+        key = normalize_name(name)
+        if not key:
+            return None
+        if key in self._exact:
+            return self._best([key], 'exact')
+        # INFO: prefix matches need at least 4 chars and a single owning entry to be unambiguous (i.e. "Ital" → Italy, never "S" → anything)
+        prefix_keys = self._prefix_keys(key) if len(key) >= 4 else []
+        if len({ entry_id for k in prefix_keys for entry_id in self._exact[k] }) == 1:
+            return self._best(prefix_keys, 'prefix')
+        fuzzy_keys = self._fuzzy_keys(key)
+        if len(fuzzy_keys) > 0:
+            best_score = fuzzy_keys[0][0]
+            return self._best([k for s, k in fuzzy_keys if s == best_score], 'fuzzy', score=best_score)
+        return None
+
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+def get_gazetteer():
+    """get_gazetteer - shared Gazetteer built from the packaged store on first use."""
+    global _gazetteer
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                _gazetteer = Gazetteer.load()
+    return _gazetteer
+
+def lookup(name):
+    """Lookup - see Gazetteer.lookup, on the shared gazetteer."""
+    return get_gazetteer().lookup(name)
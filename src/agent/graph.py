@@ -2,11 +2,14 @@
 Defining agent graph
 """
 
+import os
+
 from langgraph.graph import StateGraph
 from langgraph.graph import StateGraph, START, END
-from langgraph.checkpoint.memory import MemorySaver
 
+from agent import utils
 from agent.names import *
+from agent.checkpointer import SQLiteCheckpointSaver
 
 from agent.configuration import Configuration
 from agent.states.state import State
@@ -45,7 +48,9 @@ graph_builder.add_edge(SPI_CALCULATION_SUBGRAPH, CHATBOT)
 
 graph_builder.add_edge(CODE_EDITOR_SUBGRAPH, CHATBOT)
 
-# DOC: build graph
-memory = MemorySaver()
+# DOC: build graph (checkpoints survive restarts, relocate them with ICISK_CHECKPOINT_PATH)
+memory = SQLiteCheckpointSaver(
+    db_path = os.environ.get('ICISK_CHECKPOINT_PATH', os.path.join(utils._temp_dir, 'checkpoints.sqlite'))
+)
 graph = graph_builder.compile(checkpointer=memory)
 graph.name = GRAPH
\ No newline at end of file
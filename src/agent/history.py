@@ -0,0 +1,117 @@
+"""Conversation history management for the chatbot prompt. The prompt stays under a token budget: recent turns are sent verbatim (tool outputs of older turns collapsed), everything before them is folded into a running summary that is cached in the graph state."""
+
+from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
+from langchain_core.messages.utils import count_tokens_approximately
+
+from agent import utils
+
+# DOC: Share of the budget left to the summary message
+SUMMARY_BUDGET_RATIO = 0.25
+
+
+def count_tokens(messages):
+    """count_tokens - approximate token count of a list of messages (no tokenizer download needed)."""
+    return count_tokens_approximately(messages)
+
+def _content_str(message):
+    return message.content if isinstance(message.content, str) else str(message.content)
+
+def collapse_tool_message(message, max_chars):
+    """collapse_tool_message - truncate a stale tool response (i.e. generated code), the message is kept so its tool call stays answered."""
+    content = _content_str(message)
+    if not isinstance(message, ToolMessage) or len(content) <= max_chars:
+        return message
+    return message.model_copy(update={ 'content': f'{content[:max_chars]} … [{len(content) - max_chars} chars collapsed]' })
+
+
+def _turn_starts(messages):
+    return [i for i, message in enumerate(messages) if isinstance(message, HumanMessage)]
+
+# DOC: Window start → last `window` messages, moved back so tool responses are never separated from the AI message that called them
+def _window_start(messages, window):
+    start = max(0, len(messages) - window)
+    while start > 0 and isinstance(messages[start], ToolMessage):
+        start -= 1
+    return start
+
+def _collapsed_window(messages, start, tool_message_chars):
+    last_turn = max([i for i in _turn_starts(messages) if i >= start], default=start)
+    return [
+        collapse_tool_message(message, tool_message_chars) if i < last_turn else message
+        for i, message in enumerate(messages[start:], start)
+    ]
+
+def _summarized_until(messages, summary_until):
+    if summary_until is None:
+        return 0
+    for i, message in enumerate(messages):
+        if message.id == summary_until:
+            return i + 1
+    return None     # INFO: Summarized messages were removed from the thread, the summary is rebuilt
+
+
+def plan_history(messages, summary_until = None, token_budget = 6000, window = 12, tool_message_chars = 600):
+    """plan_history - decide what is sent verbatim and what has to be folded into the summary → (window_start, summarized_until)."""
+    if count_tokens(messages) <= token_budget:
+        return 0, None
+
+    start = _window_start(messages, window)
+    turn_starts = _turn_starts(messages)
+    window_budget = token_budget * (1 - SUMMARY_BUDGET_RATIO)
+
+    # INFO: Drop whole turns from the window until it fits (the latest turn is always sent)
+    while count_tokens(_collapsed_window(messages, start, tool_message_chars)) > window_budget:
+        next_turns = [i for i in turn_starts if i > start]
+        if len(next_turns) == 0:
+            break
+        start = next_turns[0]
+
+    return start, _summarized_until(messages, summary_until)
+
+
+def _summary_prompt(summary, messages, token_budget, tool_message_chars):
+    transcript = '\n'.join([f'{message.type}: {_content_str(message)[:tool_message_chars]}' for message in messages])
+    return dict(
+        role = 'system',
+        message = f"""You keep a running summary of a conversation between a user and an AI agent that builds climate data notebooks (CDS forecasts, SPI calculation, code editing).
+
+        Current summary:
+        {summary or 'No summary yet.'}
+
+        New messages to fold into the summary:
+        {transcript}
+
+        Reply with the updated summary only, in less than {int(token_budget * SUMMARY_BUDGET_RATIO * 0.75)} words.
+        Keep user requests, areas, variables, dates, tool outcomes and every file path that was produced.
+        """
+    )
+
+def _summary_message(summary):
+    return SystemMessage(content=f'Summary of the earlier conversation:\n{summary}')
+
+def _prompt(messages, summary, start, tool_message_chars):
+    window_messages = _collapsed_window(messages, start, tool_message_chars)
+    return ([_summary_message(summary)] if summary and start > 0 else []) + window_messages
+
+
+def compact_history(messages, summary = None, summary_until = None, token_budget = 6000, window = 12, tool_message_chars = 600, summarizer = None):
+    """compact_history - bounded prompt for the chatbot → (prompt_messages, summary, summary_until) to store back in state."""
+    start, summarized = plan_history(messages, summary_until, token_budget, window, tool_message_chars)
+    if summarized is None:
+        summary, summarized = None, 0
+    if start > summarized:
+        prompt = _summary_prompt(summary, messages[summarized:start], token_budget, tool_message_chars)
+        summary = summarizer(prompt) if summarizer is not None else utils.ask_llm(**prompt)
+        summary_until = messages[start - 1].id
+    return _prompt(messages, summary, start, tool_message_chars), summary, summary_until
+
+async def acompact_history(messages, summary = None, summary_until = None, token_budget = 6000, window = 12, tool_message_chars = 600, summarizer = None):
+    """acompact_history - compact_history counterpart for async nodes, summarizer is awaited."""
+    start, summarized = plan_history(messages, summary_until, token_budget, window, tool_message_chars)
+    if summarized is None:
+        summary, summarized = None, 0
+    if start > summarized:
+        prompt = _summary_prompt(summary, messages[summarized:start], token_budget, tool_message_chars)
+        summary = await summarizer(prompt) if summarizer is not None else await utils.ask_llm_async(**prompt)
+        summary_until = messages[start - 1].id
+    return _prompt(messages, summary, start, tool_message_chars), summary, summary_until
@@ -0,0 +1,34 @@
+"""I-CISK API access package (collections, processes), imported by the notebooks built by the agent tools."""
+
+from . import coveragejson
+from .coveragejson import CoverageJSONDecoder
+from .coveragejson import decode as decode_coveragejson
+from .coveragejson import to_dataset as coveragejson_to_dataset
+from .cube import CubeClient, CubeRequestError, split_bbox, split_period, stitch
+from .processes import ProcessesClient, ProcessJobError
+from .session import new_session
+from .zarr_writer import (
+    ForecastZarrWriter,
+    chunk_layout,
+    compressor_encoding,
+    to_lead_time,
+)
+
+__all__ = [
+    'coveragejson',
+    'CoverageJSONDecoder',
+    'decode_coveragejson',
+    'coveragejson_to_dataset',
+    'CubeClient',
+    'CubeRequestError',
+    'split_bbox',
+    'split_period',
+    'stitch',
+    'ProcessesClient',
+    'ProcessJobError',
+    'new_session',
+    'ForecastZarrWriter',
+    'chunk_layout',
+    'compressor_encoding',
+    'to_lead_time',
+]
@@ -0,0 +1,230 @@
+"""Streaming CoverageJSON decoder for the I-CISK collection cubes (/collections/{name}/cube?f=json). The body is read chunk by chunk, the numeric "values" of the ranges are parsed straight into one preallocated typed buffer (float32 by default) and only the small rest of the document (domain, parameters, …) goes through json."""
+# DOC: No Python list of floats is ever built → peak memory is about the size of the typed data, and the ranges of the same shape come out as one contiguous block (stacked without copies by to_dataset).
+# REF: https://covjson.org/spec/
+
+import json
+import re
+
+import numpy as np
+
+# DOC: CoverageJSON axis names → dataset dims
+AXIS_DIMS = {
+    'x': 'lon',
+    'y': 'lat',
+    't': 'time',
+    'time': 'time',
+    'z': 'z',
+}
+
+# DOC: Axis order of the I-CISK cube ranges when they do not list their axisNames
+DEFAULT_AXIS_NAMES = ('time', 'x', 'y')
+
+_STRUCTURAL = re.compile(rb'["{}\[\]:,]')
+_STRING = re.compile(rb'["\\]')
+_SHAPE = re.compile(rb'"shape"\s*:\s*\[([^\]]*)\]')
+
+
+class CoverageJSONDecoder:
+    """CoverageJSONDecoder - incremental decoder, feed(chunk) the body bytes and close() to get the document with numpy arrays as range values."""
+
+    NDARRAY_KEY = '__ndarray__'
+
+    def __init__(self, dtype = 'float32'):
+        """__init__ - range values are decoded as dtype arrays."""
+        self.dtype = np.dtype(dtype)
+        self._skeleton = bytearray()    # INFO: The document without the range values
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_string = None
+        self._key = None                # INFO: Key of the value being parsed
+        self._path = []                 # INFO: (key, skeleton offset) of the open containers
+        self._in_values = False
+        self._tail = b''                # INFO: Number split between two chunks
+        self._buffer = np.empty(0, dtype=self.dtype)
+        self._used = 0
+        self._arrays = []               # INFO: (start, stop) of every range values in the buffer
+
+    def _reserve(self, size):
+        if self._used + size > len(self._buffer):
+            buffer = np.empty(max(2 * len(self._buffer), self._used + size), dtype=self.dtype)
+            buffer[:self._used] = self._buffer[:self._used]
+            self._buffer = buffer
+
+    def _parse_numbers(self, text):
+        if len(text.strip()) == 0:
+            return
+        values = np.fromstring(text.replace(b'null', b'nan').decode('ascii'), dtype=self.dtype, sep=',')
+        self._reserve(len(values))
+        self._buffer[self._used : self._used + len(values)] = values
+        self._used += len(values)
+
+    def _start_values(self):
+        # INFO: Range shape is usually listed before its values → the whole array is reserved at once
+        shape = _SHAPE.search(self._skeleton, self._path[-1][1]) if len(self._path) > 0 else None
+        if shape is not None:
+            self._reserve(int(np.prod([int(s) for s in shape.group(1).split(b',') if s.strip()])))
+        self._arrays.append([self._used, None])
+        self._skeleton += json.dumps({ self.NDARRAY_KEY: len(self._arrays) - 1 }).encode('utf-8')
+        self._in_values = True
+
+    def _in_ranges(self):
+        return any(key == 'ranges' for key, _ in self._path)
+
+    def feed(self, chunk):
+        """Feed - decode the next bytes of the body."""
+        i, n = 0, len(chunk)
+        while i < n:
+            if self._in_values:
+                end = chunk.find(b']', i)
+                text = self._tail + chunk[i : end if end >= 0 else n]
+                if end >= 0:
+                    self._parse_numbers(text)
+                    self._tail = b''
+                    self._arrays[-1][1] = self._used
+                    self._in_values = False
+                    i = end + 1
+                else:
+                    split = text.rfind(b',')
+                    self._parse_numbers(text[:max(split, 0)])
+                    self._tail = text[split + 1:] if split >= 0 else text
+                    i = n
+            elif self._in_string:
+                if self._escape:
+                    self._skeleton += chunk[i : i + 1]
+                    self._escape, i = False, i + 1
+                    continue
+                match = _STRING.search(chunk, i)
+                if match is None:
+                    self._skeleton += chunk[i:]
+                    i = n
+                elif match.group() == b'\\':
+                    self._skeleton += chunk[i : match.end()]
+                    self._escape, i = True, match.end()
+                else:
+                    self._skeleton += chunk[i : match.end()]
+                    self._in_string, i = False, match.end()
+                    self._last_string = json.loads(bytes(self._skeleton[self._string_start - 1:]))
+            else:
+                match = _STRUCTURAL.search(chunk, i)
+                if match is None:
+                    self._skeleton += chunk[i:]
+                    i = n
+                    continue
+                char = match.group()
+                if char == b'[' and self._key == 'values' and self._in_ranges():
+                    self._skeleton += chunk[i : match.start()]
+                    self._start_values()
+                    i = match.end()
+                    continue
+                self._skeleton += chunk[i : match.end()]
+                i = match.end()
+                if char == b'"':
+                    self._in_string, self._string_start = True, len(self._skeleton)
+                elif char == b':':
+                    self._key = self._last_string
+                elif char in (b'{', b'['):
+                    self._path.append((self._key, len(self._skeleton) - 1))
+                    self._key = None
+                elif char in (b'}', b']'):
+                    self._path.pop()
+                    self._key = None
+                elif char == b',':
+                    self._key = None
+
+    def close(self):
+        """Close - the decoded document, range "values" are numpy arrays (reshaped to the range shape) sharing one buffer."""
+        if self._in_values or self._in_string or len(self._path) > 0:
+            raise ValueError('Truncated CoverageJSON document')
+        buffer = self._buffer[:self._used]
+        arrays = [buffer[start:stop] for start, stop in self._arrays]
+
+        def resolve(item):
+            if isinstance(item, dict):
+                if len(item) == 1 and self.NDARRAY_KEY in item:
+                    return arrays[item[self.NDARRAY_KEY]]
+                item = { key: resolve(value) for key, value in item.items() }
+                if isinstance(item.get('values'), np.ndarray) and 'shape' in item:
+                    item['values'] = item['values'].reshape(item['shape'])
+                return item
+            if isinstance(item, list):
+                return [resolve(value) for value in item]
+            return item
+
+        return resolve(json.loads(bytes(self._skeleton)))
+
+
+def _iter_chunks(source, chunk_size):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        for i in range(0, len(source), chunk_size):
+            yield bytes(source[i : i + chunk_size])
+    elif hasattr(source, 'iter_content'):                   # INFO: requests.Response opened with stream=True
+        yield from source.iter_content(chunk_size=chunk_size)
+    elif hasattr(source, 'read'):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    else:
+        yield from source
+
+
+def decode(source, dtype = 'float32', chunk_size = 1 << 20):
+    """Decode - CoverageJSON document from bytes, a file-like object, a streamed requests.Response or an iterable of byte chunks."""
+    decoder = CoverageJSONDecoder(dtype=dtype)
+    for chunk in _iter_chunks(source, chunk_size):
+        decoder.feed(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+    return decoder.close()
+
+
+def _axis_coords(name, axis):
+    import pandas as pd
+    is_time = AXIS_DIMS.get(name) == 'time'
+    if 'values' in axis:
+        return pd.to_datetime(axis['values']).values if is_time else np.asarray(axis['values'])
+    if is_time:
+        return pd.date_range(axis['start'], axis['stop'], periods=axis['num']).values
+    return np.linspace(axis['start'], axis['stop'], axis['num'], endpoint=True)
+
+
+def _member_id(name, default):
+    suffix = name.rsplit('_', 1)[-1]
+    return int(suffix) if suffix.isdigit() else default
+
+
+def _stacked(arrays):
+    """_stacked - arrays of the same shape as one (n, *shape) array, a view when they are consecutive in the same buffer."""
+    first = arrays[0]
+    base = first.base if first.base is not None else first
+    while base.base is not None:
+        base = base.base
+
+    def address(array):
+        return array.__array_interface__['data'][0]
+
+    offset = (address(first) - address(base)) // first.itemsize
+    contiguous = all(
+        array.shape == first.shape and array.flags.c_contiguous and np.shares_memory(array, base) and address(array) == address(first) + k * first.nbytes
+        for k, array in enumerate(arrays)
+    )
+    if contiguous:
+        return base.reshape(-1)[offset : offset + len(arrays) * first.size].reshape(len(arrays), *first.shape)
+    return np.stack(arrays)
+
+
+def to_dataset(coverage, variable = None, member_dim = 'model'):
+    """to_dataset - xarray.Dataset of a decoded coverage. With variable every parameter (i.e.: one per ensemble member, named <name>_<member>) is stacked in a single variable along member_dim, otherwise each parameter is its own variable."""
+    import xarray as xr
+
+    axes = coverage['domain']['axes']
+    coords = { AXIS_DIMS.get(name, name): _axis_coords(name, axis) for name, axis in axes.items() }
+    names = list(coverage['ranges'])
+    ranges = [coverage['ranges'][name] for name in names]
+    dims = [tuple(AXIS_DIMS.get(a, a) for a in (r.get('axisNames') or DEFAULT_AXIS_NAMES)) for r in ranges]
+    values = [r['values'] if np.ndim(r['values']) > 1 else np.asarray(r['values']).reshape([len(coords[d]) for d in dims[k]]) for k, r in enumerate(ranges)]
+
+    if variable is None:
+        return xr.Dataset(data_vars = { name: (dims[k], values[k]) for k, name in enumerate(names) }, coords = coords)
+    coords[member_dim] = [_member_id(name, k) for k, name in enumerate(names)]
+    return xr.Dataset(data_vars = { variable: ((member_dim, *dims[0]), _stacked(values)) }, coords = coords)
@@ -0,0 +1,143 @@
+"""Tiled client for the I-CISK collection cubes (/collections/{name}/cube). A large bbox (and optionally its time range) is split in tiles fetched concurrently over one pooled HTTP session, every tile is retried on its own and decoded while it streams (see agent.icisk.coveragejson), then the tiles are stitched into a single dataset."""
+# INFO: Tiles share their boundary grid points (bbox and datetime are inclusive) → stitching places every tile by coordinate, so overlaps are written twice with the same values and never duplicated.
+
+import concurrent.futures
+import datetime
+import threading
+import time
+
+import numpy as np
+
+from . import coveragejson
+from .session import RETRY_STATUS, backoff_delays, new_session
+
+DEFAULT_TILE_SIZE = (5.0, 5.0)      # INFO: (lon, lat) degrees
+
+
+def split_bbox(bbox, tile_size = DEFAULT_TILE_SIZE):
+    """split_bbox - [min_x, min_y, max_x, max_y] → tiles (same format) of at most tile_size degrees, row by row."""
+    min_x, min_y, max_x, max_y = bbox
+
+    def edges(start, stop, step):
+        return list(np.round(np.append(np.arange(start, stop, step), stop), 6)) if step and stop > start else [start, stop]
+
+    xs, ys = edges(min_x, max_x, tile_size[0]), edges(min_y, max_y, tile_size[1])
+    xs = xs[:-1] if len(xs) > 2 and xs[-1] == xs[-2] else xs
+    ys = ys[:-1] if len(ys) > 2 and ys[-1] == ys[-2] else ys
+    return [[float(xs[i]), float(ys[j]), float(xs[i + 1]), float(ys[j + 1])] for j in range(len(ys) - 1) for i in range(len(xs) - 1)]
+
+
+def split_period(period, chunk_days = None):
+    """split_period - (start, end) dates → [(start, end), ...] chunks of at most chunk_days, [period] when chunk_days is None."""
+    if period is None or chunk_days is None:
+        return [period]
+
+    def parse(value):
+        return datetime.datetime.fromisoformat(value) if isinstance(value, str) else value
+
+    start, end = parse(period[0]), parse(period[1])
+    chunks = []
+    while start <= end:
+        chunk_end = min(start + datetime.timedelta(days=chunk_days), end)
+        chunks.append((start, chunk_end))
+        if chunk_end == end:
+            break
+        start = chunk_end
+    return chunks
+
+
+class CubeRequestError(Exception):
+    """CubeRequestError - a cube tile failed after every retry."""
+
+    def __init__(self, url, params, status_code = None, message = None):
+        """__init__ - failed url and query params, the last status code (or error message)."""
+        self.url = url
+        self.params = params
+        self.status_code = status_code
+        super().__init__(f'Cube request failed ({status_code or message}): {url} {params}')
+
+
+class CubeClient:
+    """CubeClient - concurrent, retried and stitched cube queries over a pooled requests.Session."""
+
+    def __init__(self, root_url, max_workers = 8, retries = 3, backoff = 0.5, timeout = 120, dtype = 'float32', session = None):
+        """__init__ - at most max_workers tiles in flight, each retried retries times with exponential backoff."""
+        self.root_url = root_url.rstrip('/')
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.dtype = dtype
+        self.session = session or new_session(max_workers)      # INFO: One kept-alive connection per worker
+        self._stats = { 'tiles': 0, 'retries': 0 }
+        self._stats_lock = threading.Lock()     # INFO: cube updates the stats from its worker threads
+
+    def _count(self, key, n = 1):
+        with self._stats_lock:
+            self._stats[key] += n
+
+    def _params(self, bbox, period):
+        params = { 'bbox': ','.join(map(str, bbox)), 'f': 'json' }
+        if period is not None:
+            start, end = [p.isoformat() if hasattr(p, 'isoformat') else str(p) for p in period]
+            params['datetime'] = f'{start}/{end}'
+        return params
+
+    def fetch(self, collection, bbox, period = None):
+        """Fetch - decoded CoverageJSON of one cube query, retried with exponential backoff on connection errors, timeouts and 429 / 5xx."""
+        import requests
+        url = f'{self.root_url}/collections/{collection}/cube'
+        params = self._params(bbox, period)
+        delays = backoff_delays(self.retries, self.backoff)
+        for attempt in range(self.retries + 1):
+            status_code, message = None, None
+            try:
+                with self.session.get(url, params=params, stream=True, timeout=self.timeout) as response:
+                    if response.status_code == 200:
+                        return coveragejson.decode(response, dtype=self.dtype)
+                    status_code = response.status_code
+                    if status_code not in RETRY_STATUS:
+                        raise CubeRequestError(url, params, status_code=status_code)
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError, ValueError) as exc:
+                message = str(exc)      # INFO: ValueError → truncated body
+            if attempt < self.retries:
+                self._count('retries')
+                time.sleep(delays[attempt])
+        raise CubeRequestError(url, params, status_code=status_code, message=message)
+
+    def cube(self, collection, bbox, period = None, tile_size = DEFAULT_TILE_SIZE, chunk_days = None, variable = None, member_dim = 'model'):
+        """Cube - xarray.Dataset of collection over bbox (and period), fetched as tiles of tile_size degrees (and chunk_days) in parallel."""
+        tiles = [(tile_bbox, tile_period) for tile_period in split_period(period, chunk_days) for tile_bbox in split_bbox(bbox, tile_size)]
+        self._count('tiles', len(tiles))
+        if len(tiles) == 1:
+            return coveragejson.to_dataset(self.fetch(collection, *tiles[0]), variable=variable, member_dim=member_dim)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.max_workers, len(tiles))) as pool:
+            futures = [pool.submit(self.fetch, collection, tile_bbox, tile_period) for tile_bbox, tile_period in tiles]
+            datasets = [coveragejson.to_dataset(future.result(), variable=variable, member_dim=member_dim) for future in futures]
+        return stitch(datasets)
+
+    @property
+    def stats(self):
+        """Stats - request and retry counters."""
+        with self._stats_lock:
+            return dict(self._stats)
+
+
+def stitch(datasets, decimals = 6):
+    """Stitch - tile datasets (same vars and dims) → one dataset on the union of their coords, overlapping points are taken once."""
+    import xarray as xr
+
+    first = datasets[0]
+
+    def rounded(values):
+        return np.round(values, decimals) if np.issubdtype(values.dtype, np.floating) else values
+
+    coords = { dim: np.unique(np.concatenate([rounded(ds[dim].values) for ds in datasets])) for dim in first.dims }
+    data_vars = dict()
+    for name, variable in first.data_vars.items():
+        values = np.full([len(coords[dim]) for dim in variable.dims], np.nan, dtype=variable.dtype)
+        for ds in datasets:
+            index = np.ix_(*[np.searchsorted(coords[dim], rounded(ds[dim].values)) for dim in variable.dims])
+            values[index] = ds[name].values
+        data_vars[name] = (variable.dims, values)
+    return xr.Dataset(data_vars = data_vars, coords = coords)
@@ -0,0 +1,139 @@
+"""Client for the I-CISK OGC API Processes endpoints (i.e.: ingestor-cds-process). Jobs are submitted asynchronously (Prefer: respond-async), their status is polled with a growing interval until they end, and several submissions run concurrently over one pooled HTTP session."""
+# REF: https://docs.ogc.org/is/18-062r2/18-062r2.html
+# INFO: A server executing synchronously (200 with the results) is accepted too → the results are returned without polling.
+# INFO: Status and results reads (GET) are retried on connection errors, timeouts and 429 / 5xx. An execution (POST) is retried only when the connection failed before the request was sent, a timeout or a 5xx may come after the job was created and a retry would run it twice.
+
+import concurrent.futures
+import threading
+import time
+
+from .session import RETRY_STATUS, backoff_delays, new_session
+
+
+def _not_sent(exc):
+    """_not_sent - the request failed while connecting (refused, unresolved host, connect timeout), so the server never got it."""
+    import requests
+    import urllib3
+    if isinstance(exc, requests.exceptions.ConnectTimeout):
+        return True
+    reason = exc.args[0] if isinstance(exc, requests.ConnectionError) and len(exc.args) > 0 else None
+    reason = getattr(reason, 'reason', reason)      # INFO: urllib3 MaxRetryError wraps the connection error
+    return isinstance(reason, urllib3.exceptions.NewConnectionError)
+
+
+class ProcessJobError(Exception):
+    """ProcessJobError - a process execution could not be submitted, failed or did not end in time."""
+
+    def __init__(self, message, job_id = None, status = None):
+        """__init__ - job_id and last status of the job, if it was submitted."""
+        self.job_id = job_id
+        self.status = status
+        super().__init__(message)
+
+
+class ProcessesClient:
+    """ProcessesClient - async OGC API Processes jobs (submit → poll → results) over a pooled requests.Session."""
+
+    RUNNING_STATUS = ('accepted', 'running')
+    FAILED_STATUS = ('failed', 'dismissed')
+
+    def __init__(self, root_url, max_workers = 4, retries = 3, backoff = 0.5, poll_interval = 1.0, max_poll_interval = 30.0, timeout = 60, headers = None, session = None):
+        """__init__ - at most max_workers jobs at a time, polled every poll_interval seconds growing up to max_poll_interval."""
+        self.root_url = root_url.rstrip('/')
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.timeout = timeout
+        self.session = session or new_session(max_workers, headers=headers)
+        self._stats = { 'submitted': 0, 'polls': 0, 'retries': 0 }
+        self._stats_lock = threading.Lock()     # INFO: execute_many updates the stats from its worker threads
+
+    def _count(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def _request(self, method, url, idempotent = True, **kwargs):
+        """_request - response of an HTTP call, retried with exponential backoff. Idempotent calls on connection errors, timeouts and 429 / 5xx, the others only when they were never sent."""
+        import requests
+        delays = backoff_delays(self.retries, self.backoff)
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+                if not idempotent or response.status_code not in RETRY_STATUS or attempt == self.retries:
+                    return response
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                if attempt == self.retries or not (idempotent or _not_sent(exc)):
+                    raise
+            self._count('retries')
+            time.sleep(delays[attempt])
+
+    def _job_url(self, job):
+        return job if job.startswith('http') else f'{self.root_url}/jobs/{job}'
+
+    def submit(self, process_id, inputs, outputs = None):
+        """Submit - job url of an async execution, or the results dict if the server executed it synchronously."""
+        payload = { 'inputs': inputs }
+        if outputs is not None:
+            payload['outputs'] = outputs
+        response = self._request('POST', f'{self.root_url}/processes/{process_id}/execution', idempotent=False, json=payload, headers={ 'Prefer': 'respond-async' })
+        self._count('submitted')
+        if response.status_code in (201, 202) and 'Location' in response.headers:
+            location = response.headers['Location']
+            return location if location.startswith('http') else f"{self.root_url}/{location.lstrip('/')}"
+        if response.status_code == 200:
+            return { 'status': 'successful', 'results': response.json() }
+        raise ProcessJobError(f'Execution of {process_id} not accepted ({response.status_code}): {response.text}', status=response.status_code)
+
+    def status(self, job):
+        """Status - job status document ({'status': 'accepted' | 'running' | 'successful' | 'failed' | 'dismissed', ...})."""
+        response = self._request('GET', self._job_url(job), params={ 'f': 'json' })
+        self._count('polls')
+        if response.status_code != 200:
+            raise ProcessJobError(f'Job status not available ({response.status_code}): {response.text}', job_id=job, status=response.status_code)
+        return response.json()
+
+    def wait(self, job, max_wait = None):
+        """Wait - final job status, polled every poll_interval growing by 1.5x up to max_poll_interval."""
+        started, interval = time.monotonic(), self.poll_interval
+        while True:
+            status = self.status(job)
+            if status.get('status') not in self.RUNNING_STATUS:
+                break
+            if max_wait is not None and time.monotonic() - started + interval > max_wait:
+                raise ProcessJobError(f'Job did not end in {max_wait}s: {job}', job_id=job, status=status.get('status'))
+            time.sleep(interval)
+            interval = min(interval * 1.5, self.max_poll_interval)
+        if status.get('status') in self.FAILED_STATUS:
+            raise ProcessJobError(f"Job {status.get('status')}: {status.get('message', job)}", job_id=job, status=status.get('status'))
+        return status
+
+    def results(self, job):
+        """Results - results document of a successful job."""
+        response = self._request('GET', f'{self._job_url(job)}/results', params={ 'f': 'json' })
+        if response.status_code != 200:
+            raise ProcessJobError(f'Job results not available ({response.status_code}): {response.text}', job_id=job, status=response.status_code)
+        return response.json()
+
+    def execute(self, process_id, inputs, outputs = None, max_wait = None):
+        """Execute - results of a process execution, submitted async and awaited."""
+        job = self.submit(process_id, inputs, outputs=outputs)
+        if isinstance(job, dict):
+            return job['results']
+        self.wait(job, max_wait=max_wait)
+        return self.results(job)
+
+    def execute_many(self, process_id, inputs_list, outputs = None, max_wait = None):
+        """execute_many - results of several executions (same order as inputs_list), submitted and awaited concurrently."""
+        if len(inputs_list) == 0:
+            return []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.max_workers, len(inputs_list))) as pool:
+            futures = [pool.submit(self.execute, process_id, inputs, outputs, max_wait) for inputs in inputs_list]
+            return [future.result() for future in futures]
+
+    @property
+    def stats(self):
+        """Stats - submit, poll and retry counters."""
+        with self._stats_lock:
+            return dict(self._stats)
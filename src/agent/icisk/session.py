@@ -0,0 +1,21 @@
+"""HTTP session shared by the I-CISK API clients → one requests.Session with a connection pool sized to the client workers (kept-alive connections are reused across requests and threads)."""
+
+# DOC: Responses worth a retry (rate limited, server or gateway errors)
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+def new_session(pool_size = 8, headers = None):
+    """new_session - requests.Session with a pool of pool_size connections per host."""
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update(headers or dict())
+    return session
+
+
+def backoff_delays(retries, backoff, max_delay = None):
+    """backoff_delays - retries exponential delays: backoff, 2*backoff, 4*backoff, ... (at most max_delay)."""
+    return [min(backoff * 2 ** attempt, max_delay) if max_delay is not None else backoff * 2 ** attempt for attempt in range(retries)]
@@ -0,0 +1,115 @@
+"""Chunked, compressed and appendable zarr writer for the forecast datasets (i.e.: the cubes of agent.icisk.cube). Every init month is a slice along 'init_time' of the same store → a monthly refresh appends (or replaces in place) only its slice, the chunks of the other months are never rewritten."""
+# DOC: Chunk layout → one chunk holds every member and lead time of a (lat, lon) tile of one init month: a cell time series is read from a single chunk and a map from a few large tiles. Tiles are sized to about target_chunk_bytes.
+# DOC: init_time stays sorted in the store → a new init month must be later than the stored ones (a backfilled older month raises ValueError, rewrite the store to add it), a stored one is replaced in place.
+# INFO: zarr is imported on first use, zarr v3 (BloscCodec) and v2 (numcodecs.Blosc) codecs are both supported. Metadata is consolidated after every write.
+
+import math
+
+import numpy as np
+
+DEFAULT_TARGET_CHUNK_BYTES = 4 << 20        # INFO: ~4 MiB uncompressed
+DEFAULT_SPATIAL_DIMS = ('lat', 'lon')
+
+
+def chunk_layout(sizes, dims, itemsize = 4, target_chunk_bytes = DEFAULT_TARGET_CHUNK_BYTES, append_dim = 'init_time', spatial_dims = DEFAULT_SPATIAL_DIMS):
+    """chunk_layout - chunk shape (in dims order): 1 along append_dim, whole along the other non spatial dims, square spatial tiles filling target_chunk_bytes."""
+    series = math.prod(sizes[dim] for dim in dims if dim != append_dim and dim not in spatial_dims)
+    side = max(1, int(math.sqrt(max(1, target_chunk_bytes // (itemsize * series)))))
+    return tuple(1 if dim == append_dim else min(side, sizes[dim]) if dim in spatial_dims else sizes[dim] for dim in dims)
+
+
+def compressor_encoding(codec = 'zstd', level = 3, shuffle = 'bitshuffle'):
+    """compressor_encoding - xarray zarr encoding of a Blosc codec (None → uncompressed) for the installed zarr version."""
+    import zarr
+    if int(zarr.__version__.split('.')[0]) >= 3:
+        from zarr.codecs import BloscCodec
+        return { 'compressors': (BloscCodec(cname=codec, clevel=level, shuffle=shuffle),) if codec is not None else None }
+    import numcodecs
+    shuffles = { 'noshuffle': numcodecs.Blosc.NOSHUFFLE, 'shuffle': numcodecs.Blosc.SHUFFLE, 'bitshuffle': numcodecs.Blosc.BITSHUFFLE }
+    return { 'compressor': numcodecs.Blosc(cname=codec, clevel=level, shuffle=shuffles[shuffle]) if codec is not None else None }
+
+
+def to_lead_time(dataset, init_time, time_dim = 'time', append_dim = 'init_time'):
+    """to_lead_time - forecast dataset over valid times → (init_time, ..., lead_time, ...) dataset, so every init month shares the same coords."""
+    import pandas as pd
+    init_time = pd.Timestamp(init_time)
+    dataset = dataset.assign_coords(lead_time = (time_dim, (pd.to_datetime(dataset[time_dim].values) - init_time).values))
+    dataset = dataset.swap_dims({ time_dim: 'lead_time' }).drop_vars(time_dim)
+    return dataset.expand_dims({ append_dim: [init_time.to_datetime64()] })
+
+
+class ForecastZarrWriter:
+    """ForecastZarrWriter - writes forecast datasets into one store, a slice per init_time."""
+
+    def __init__(self, store, append_dim = 'init_time', codec = 'zstd', level = 3, shuffle = 'bitshuffle', chunks = None, target_chunk_bytes = DEFAULT_TARGET_CHUNK_BYTES, spatial_dims = DEFAULT_SPATIAL_DIMS, consolidated = True, storage_options = None):
+        """__init__ - store path (or fsspec url with storage_options), Blosc codec settings and chunk layout."""
+        self.store = store
+        self.append_dim = append_dim
+        self.codec = codec
+        self.level = level
+        self.shuffle = shuffle
+        self.chunks = chunks            # INFO: { dim: size } overrides of chunk_layout
+        self.target_chunk_bytes = target_chunk_bytes
+        self.spatial_dims = spatial_dims
+        self.consolidated = consolidated
+        self.storage_options = storage_options
+
+    def _open(self):
+        import xarray as xr
+        try:
+            return xr.open_zarr(self.store, consolidated=self.consolidated or None, storage_options=self.storage_options)
+        except (FileNotFoundError, KeyError, ValueError):
+            return None
+
+    def encoding(self, dataset):
+        """Return the xarray zarr encoding (chunks and codec) of every data variable."""
+        compressor = compressor_encoding(self.codec, self.level, self.shuffle)
+        encoding = dict()
+        for name, variable in dataset.data_vars.items():
+            chunks = chunk_layout(dict(variable.sizes), variable.dims, variable.dtype.itemsize, self.target_chunk_bytes, self.append_dim, self.spatial_dims)
+            chunks = tuple((self.chunks or dict()).get(dim, size) for dim, size in zip(variable.dims, chunks))
+            encoding[name] = { 'chunks': chunks, **compressor }
+        return encoding
+
+    def write(self, dataset, init_time = None, time_dim = 'time'):
+        """Write - dataset (with append_dim, or over time_dim with its init_time) into the store → list of 'created', 'appended' or 'replaced', one per init_time in ascending order."""
+        if self.append_dim not in dataset.dims:
+            if init_time is None:
+                raise ValueError(f"Dataset without '{self.append_dim}' dimension needs its init_time")
+            dataset = to_lead_time(dataset, init_time, time_dim=time_dim, append_dim=self.append_dim)
+        if not dataset.indexes[self.append_dim].is_monotonic_increasing:
+            dataset = dataset.sortby(self.append_dim)
+        kwargs = { 'consolidated': self.consolidated, 'storage_options': self.storage_options }
+
+        existing = self._open()
+        if existing is None:
+            dataset.to_zarr(self.store, mode='w', encoding=self.encoding(dataset), **kwargs)
+            return ['created'] * dataset.sizes[self.append_dim]
+
+        # INFO: Checked before anything is written → a rejected call leaves the store untouched
+        stored = existing[self.append_dim].values
+        new_values = dataset[self.append_dim].values[~np.isin(dataset[self.append_dim].values, stored)]
+        if len(new_values) > 0 and len(stored) > 0 and new_values.min() < stored.max():
+            raise ValueError(f"{self.append_dim} {new_values.min()} is earlier than the last one in the store {self.store} ({stored.max()}), appending it would break the {self.append_dim} order")
+
+        # INFO: New slices are aligned to the stored coords (lead times beyond the stored ones are dropped, missing ones are NaN)
+        align = { dim: existing[dim].values for dim in existing.dims if dim != self.append_dim and dim in dataset.dims }
+        spatial = { dim: align.pop(dim) for dim in self.spatial_dims if dim in align }
+        for dim, values in spatial.items():
+            if dataset.sizes[dim] != len(values) or not np.allclose(np.sort(dataset[dim].values), np.sort(values), atol=1e-6):
+                raise ValueError(f"Dataset {dim} does not match the grid of the store {self.store}")
+        dataset = dataset.reindex(align)
+        if len(spatial) > 0:
+            dataset = dataset.reindex(spatial, method='nearest', tolerance=1e-6)
+
+        slices = []
+        for value in dataset[self.append_dim].values:
+            index = np.flatnonzero(stored == value)
+            if len(index) > 0:
+                region = dataset.sel({ self.append_dim: [value] }).drop_vars([dim for dim in dataset.coords if dim != self.append_dim and self.append_dim not in dataset[dim].dims])
+                region.to_zarr(self.store, region={ self.append_dim: slice(int(index[0]), int(index[0]) + 1) }, **kwargs)
+                slices.append('replaced')
+            else:
+                dataset.sel({ self.append_dim: [value] }).to_zarr(self.store, append_dim=self.append_dim, **kwargs)
+                slices.append('appended')
+        return slices
@@ -0,0 +1,153 @@
+"""Content-addressed cache for LLM responses. Two tiers: an in-memory LRU for hot prompts and a SQLite file shared by every worker process."""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class LLMResponseCache:
+    """LLMResponseCache - LLM answers by (model, role, prompt), in memory and in a SQLite file."""
+
+    # DOC: Default values (overridable by env vars ICISK_LLM_CACHE_TTL, ICISK_LLM_CACHE_MEMORY_ITEMS)
+    DEFAULT_TTL = 7 * 24 * 3600
+    DEFAULT_MEMORY_ITEMS = 512
+
+    def __init__(self, db_path=None, max_memory_items=None, default_ttl=None, enabled=True):
+        """__init__ - disk tier in db_path (None → memory only), answers expire after default_ttl seconds, enabled=False turns every lookup into a miss."""
+        self.db_path = db_path
+        self.max_memory_items = max_memory_items if max_memory_items is not None else int(os.environ.get('ICISK_LLM_CACHE_MEMORY_ITEMS', self.DEFAULT_MEMORY_ITEMS))
+        self.default_ttl = default_ttl if default_ttl is not None else float(os.environ.get('ICISK_LLM_CACHE_TTL', self.DEFAULT_TTL))
+        self.enabled = enabled
+
+        self._memory = OrderedDict()    # INFO: key → (expires_at, value)
+        self._lock = threading.RLock()
+        self._conn = None
+        self._stats = { 'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'writes': 0 }
+
+
+    # DOC: Cache key is the sha256 of model identity, role and normalized prompt
+    @staticmethod
+    def normalize_prompt(message):
+        """normalize_prompt - prompt without trailing spaces and repeated blank lines."""
+        lines = [line.rstrip() for line in str(message).strip().split('\n')]
+        normalized = []
+        for line in lines:
+            if line == '' and len(normalized) > 0 and normalized[-1] == '':
+                continue
+            normalized.append(line)
+        return '\n'.join(normalized)
+
+    @classmethod
+    def make_key(cls, model, role, message):
+        """make_key - sha256 of model identity, role and normalized prompt."""
+        payload = json.dumps([model, role, cls.normalize_prompt(message)], default=str, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def model_identity(llm):
+        """model_identity - model settings that change the answer."""
+        return [
+            getattr(llm, 'model_name', None) or getattr(llm, 'model', None) or type(llm).__name__,
+            getattr(llm, 'temperature', None),
+        ]
+
+
+    # DOC: Disk tier is opened lazily, so importing the module never touches the filesystem
+    def _connection(self):
+        if self._conn is None and self.db_path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, expires_at REAL NOT NULL)')
+            self._conn.commit()
+        return self._conn
+
+    def _remember(self, key, expires_at, value):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+
+    def get(self, key):
+        """Get - cached answer or None (missing or expired)."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            if key in self._memory:
+                expires_at, value = self._memory[key]
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    return json.loads(value)
+                del self._memory[key]
+
+            conn = self._connection()
+            if conn is not None:
+                row = conn.execute('SELECT value, expires_at FROM llm_cache WHERE key = ?', (key,)).fetchone()
+                if row is not None and row[1] > now:
+                    self._remember(key, row[1], row[0])
+                    self._stats['disk_hits'] += 1
+                    return json.loads(row[0])
+                if row is not None:
+                    conn.execute('DELETE FROM llm_cache WHERE key = ?', (key,))
+                    conn.commit()
+
+            self._stats['misses'] += 1
+            return None
+
+    def set(self, key, value, ttl=None):
+        """Set - cache an answer (JSON serializable) for ttl seconds."""
+        if not self.enabled:
+            return
+        now = time.time()
+        expires_at = now + (ttl if ttl is not None else self.default_ttl)
+        serialized = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._remember(key, expires_at, serialized)
+            conn = self._connection()
+            if conn is not None:
+                conn.execute('INSERT OR REPLACE INTO llm_cache (key, value, created_at, expires_at) VALUES (?, ?, ?, ?)', (key, serialized, now, expires_at))
+                conn.commit()
+            self._stats['writes'] += 1
+
+    def purge_expired(self):
+        """purge_expired - drop the expired answers of both tiers."""
+        now = time.time()
+        with self._lock:
+            for key in [k for k, (expires_at, _) in self._memory.items() if expires_at <= now]:
+                del self._memory[key]
+            conn = self._connection()
+            if conn is not None:
+                conn.execute('DELETE FROM llm_cache WHERE expires_at <= ?', (now,))
+                conn.commit()
+
+    def clear(self):
+        """Clear - drop every answer of both tiers."""
+        with self._lock:
+            self._memory.clear()
+            conn = self._connection()
+            if conn is not None:
+                conn.execute('DELETE FROM llm_cache')
+                conn.commit()
+
+
+    @property
+    def stats(self):
+        """Stats - hit / miss counters and hit rate."""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups > 0 else 0.0
+        return stats
+
+    def reset_stats(self):
+        """reset_stats - counters back to 0."""
+        with self._lock:
+            self._stats = { name: 0 for name in self._stats }
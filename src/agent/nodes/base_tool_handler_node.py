@@ -5,7 +5,7 @@ from typing_extensions import Literal
 from langgraph.graph import END
 from langgraph.types import Command
 
-# from agent import utils
+from agent import utils
 
 from agent.tools import ToolInterrupt
 
@@ -22,7 +22,8 @@ class BaseToolHandlerNode:
         tool_handler_node_name: str,
         tool_interrupt_node_name: str,
         tools: dict,
-        additional_ouput_state: dict = dict()
+        additional_ouput_state: dict = dict(),
+        is_async: bool = False
     ):
         instance = super().__new__(cls) 
         instance.__init__(
@@ -30,7 +31,8 @@ class BaseToolHandlerNode:
             tool_handler_node_name,
             tool_interrupt_node_name,
             tools,
-            additional_ouput_state
+            additional_ouput_state,
+            is_async
         )
         return instance.setup()
         
@@ -41,7 +43,8 @@ class BaseToolHandlerNode:
             tool_handler_node_name: str,
             tool_interrupt_node_name: str,
             tools: dict,
-            additional_ouput_state: dict = dict()
+            additional_ouput_state: dict = dict(),
+            is_async: bool = False
     ):
         self.state = state
         self.state_type = type(state)
@@ -49,45 +52,89 @@ class BaseToolHandlerNode:
         self.tool_interrupt_node_name = tool_interrupt_node_name
         self.tools = tools
         self.additional_ouput_state = additional_ouput_state
+        self.is_async = is_async
+        
+        
+    # DOC: The tool call this node has to run → the one sent by the chatbot (Send payload 'tool_call_id'), else the last one
+    def _select_tool_call(self, state):
+        tool_call_id = state.get('tool_call_id')
+        for message in reversed(state["messages"]):
+            for tool_call in reversed(getattr(message, 'tool_calls', None) or []):
+                if tool_call_id is None or tool_call['id'] == tool_call_id:
+                    return message, tool_call
+        raise ValueError(f"{self.tool_handler_node_name}: no tool call {tool_call_id or ''} found in messages")
+        
+    # DOC: Run state of this tool call (confirmations and output) handed back by the interrupt node, None on first call
+    def _restore_run_state(self, state):
+        return state.get('nodes_params', dict()).get(self.tool_handler_node_name, dict()).get('run_state')
+    
+    # DOC: Args of this tool call updated by the interrupt node, else the ones in the AI message. They are kept per call in nodes_params → parallel branches never return (and overwrite each other's) copies of the shared AI message
+    def _restore_tool_args(self, state, tool_call):
+        tool_args = state.get('nodes_params', dict()).get(self.tool_handler_node_name, dict()).get('tool_args')
+        return tool_args if tool_args is not None else tool_call['args']
+        
+    # DOC: Tool interrupted → go to interrupt node with the data it needs to handle the interruption
+    def _interrupt_command(self, tool_message, tool_call, tool_args, tool_interrupt, run_state):
+        update_state = {}
+        update_state['nodes_params'] = { 
+            self.tool_interrupt_node_name: {
+                'tool_message': tool_message,
+                'tool_interrupt': tool_interrupt.as_dict,
+                'tool_handler_node': self.tool_handler_node_name,    # INFO: Where to return interrupt "response" data
+                'tool_call_id': tool_call['id'],
+                'tool_args': tool_args,
+                'run_state': run_state,
+            }
+        }
+        return Command(goto=self.tool_interrupt_node_name, update = update_state)
+    
+    # DOC: Tool completed → append tool response message
+    def _tool_response_update(self, tool_call, result):
+        tool_response_message = {
+            "role": "tool",
+            "name": tool_call['name'], 
+            "content": result,
+            "tool_call_id": tool_call['id'],
+        }
+        return {"messages": tool_response_message, **self.additional_ouput_state}
+        
+        
+    # DOC: Shared by the sync and async templates → yields (tool, tool_args) to run, gets back its result (or its ToolInterrupt) and returns the node update
+    def _handle_steps(self, state):
+        tool_message, tool_call = self._select_tool_call(state)
+        tool = self.tools[tool_call['name']]
+        
+        tool_args = self._restore_tool_args(state, tool_call)
+        
+        result = None
+        with tool.run_context(self._restore_run_state(state)) as run_state:
+            try:
+                result = yield tool, tool_args
+            except ToolInterrupt as tool_interrupt:
+                return self._interrupt_command(tool_message, tool_call, tool_args, tool_interrupt, run_state)
+        
+        return self._tool_response_update(tool_call, result)
         
         
     def setup(self):
         
         # DOC: This is a template function that will be used to create the tool handler function node.
         def tool_handler_template(state):
-            tool_message = state["messages"][-1]
-            tool_call = tool_message.tool_calls[-1]
-            
-            result = None
-            try:
-                result = self.tools[tool_call['name']].invoke(tool_call['args'])
-            except ToolInterrupt as tool_interrupt:
-                update_state = {}
-                update_state['nodes_params'] = { 
-                    self.tool_interrupt_node_name: {
-                        'tool_message': tool_message,
-                        'tool_interrupt': tool_interrupt.as_dict,
-                        'tool_handler_node': self.tool_handler_node_name,    # INFO: Where to return interrupt "response" data
-                    }
-                }
-                return Command(goto=self.tool_interrupt_node_name, update = update_state)     
-                    
-            tool_response_message = {
-                "role": "tool",
-                "name": tool_call['name'], 
-                "content": result,
-                "tool_call_id": tool_call['id'],
-            }
-            
-            return {"messages": tool_response_message, **self.additional_ouput_state}
+            return utils.run_steps(self._handle_steps(state), lambda step: step[0].invoke(step[1]))
+        
+        # DOC: Async template → tool.ainvoke() runs the tool _arun, so LLM-backed steps are awaited
+        async def async_tool_handler_template(state):
+            return await utils.arun_steps(self._handle_steps(state), lambda step: step[0].ainvoke(step[1]))
+        
+        template = async_tool_handler_template if self.is_async else tool_handler_template
 
         # DOC: Creating the tool handler function using the template function.
         tool_handler = types.FunctionType(
-            tool_handler_template.__code__,
+            template.__code__,
             globals(),
             name = self.tool_handler_node_name,
-            argdefs = tool_handler_template.__defaults__,
-            closure = tool_handler_template.__closure__
+            argdefs = template.__defaults__,
+            closure = template.__closure__
         )
         
         tool_handler.__annotations__ = {
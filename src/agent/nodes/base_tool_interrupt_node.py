@@ -1,16 +1,40 @@
+import os
 import types
+import functools
+from typing import Optional
 from typing_extensions import Literal
 
+from pydantic import Field, create_model
+
 from langgraph.graph import END
 from langgraph.types import Command, interrupt
 from langchain_core.messages import SystemMessage
 
 from agent import utils
 from agent.tools import ToolInterrupt
+from agent.tools import reply_parsers
+
+
+# DOC: Interrupt handling mode → 'llm' (default): LLM phrased question, then LLM parsed reply | 'structured' (opt-in): templated question and one structured call to parse the reply. In both modes trivial replies are parsed locally first (see _fast_parse_reply)
+INTERRUPT_MODE = os.environ.get('ICISK_INTERRUPT_MODE', 'llm')
 
 
+@functools.cache
+def interrupt_reply_model(args_schema):
+    """interrupt_reply_model - user reply to an interrupt parsed against the tool args_schema (every arg optional, only what the user provided is set)."""
+    return create_model(
+        f'{args_schema.__name__}InterruptReply',
+        intent = (Literal['confirm', 'update', 'exit'], Field(description="'confirm' if the user agrees or just provides the requested values, 'update' if the user wants to change something, 'exit' if the user wants to stop the tool process")),
+        args = (Optional[utils.partial_model(args_schema)], Field(default=None, description="Only the argument values the user provided or asked to change")),
+    )
+
+
+# DOC: A handler instance is created for each interrupt (it holds the data of a single run), subclasses are registered as classes
 class BaseToolInterruptHandler:
     
+    interrupt_mode = INTERRUPT_MODE
+    interrupt_type = None
+    
     def __init__(self):
         self.tool = None
         self.interrupt_data = None
@@ -18,25 +42,186 @@ class BaseToolInterruptHandler:
         self.tool_interrupt = None
         self.tool_handler_node = None
         self.tool_name = None
+        self.tool_call = None
+        self.run_state = None
         
     def handle(self, tool, interupt_data):
         self.tool = tool
         self.interrupt_data = interupt_data
-        self.tool_message = self.interrupt_data['tool_message']
+        self.tool_message = self.interrupt_data['tool_message']     # INFO: Shared by the parallel branches → never updated, the args of this call go back in nodes_params
         self.tool_interrupt = self.interrupt_data['tool_interrupt']
         self.tool_handler_node = self.interrupt_data['tool_handler_node']
         self.tool_name = self.interrupt_data['tool_interrupt']['tool']
+        tool_call = next(
+            (tc for tc in self.tool_message.tool_calls if tc['id'] == self.interrupt_data.get('tool_call_id')),
+            self.tool_message.tool_calls[-1]
+        )
+        tool_args = self.interrupt_data.get('tool_args')
+        self.tool_call = { **tool_call, 'args': dict(tool_args if tool_args is not None else tool_call['args']) }
+        self.run_state = dict(self.interrupt_data.get('run_state') or tool.new_run_state())
+        
+    # DOC: Go back to the tool handler node with the (updated) args of this tool call and this run state
+    def _rerun_tool_command(self):
+        return {
+            'goto': self.tool_handler_node,
+            'update': { 
+                "nodes_params": { self.tool_handler_node: { 'run_state': self.run_state, 'tool_args': self.tool_call['args'] } }
+            }
+        }
+        
+    # DOC: User asked to exit → drop the tool call message, or answer only this call when it was sent together with others (they are still running)
+    def _exit_command(self):
+        if len(self.tool_message.tool_calls) > 1:
+            tool_response_message = {
+                "role": "tool",
+                "name": self.tool_call['name'],
+                "content": "User choose to exit the tool process.",
+                "tool_call_id": self.tool_call['id'],
+            }
+            return {
+                'goto': END,
+                'update': { "messages": [tool_response_message], "nodes_params": dict() }
+            }
+        remove_tool_message = utils.remove_tool_messages(self.tool_message)
+        system_message = SystemMessage(content="User choose to exit the tool process.")
+        return {
+            'goto': END,
+            'update': { "messages": [remove_tool_message, system_message] }
+        }
+        
+    async def ahandle(self, tool, interupt_data):
+        """Ahandle - async counterpart of handle, subclasses await their LLM calls through utils.ask_llm_async."""
+        BaseToolInterruptHandler.handle(self, tool, interupt_data)
+        
+    # REGION: [Structured mode]
+    
+    # DOC: Normalized one-line description of an argument from the serialized args_schema
+    def _describe_arg(self, arg):
+        schema = self.tool_interrupt['data'].get('args_schema', dict()).get(arg, dict())
+        return schema.get('title') or arg, ' '.join(str(schema.get('description') or '').split())
+    
+    # DOC: Deterministic question shown to the user, no LLM involved (override per interrupt type)
+    def _render_interrupt_message(self):
+        return self.tool_interrupt['reason']
+    
+    # DOC: Additional tool specific instructions to parse the reply (i.e. how to merge a free text update)
+    def _reply_instructions(self):
+        return ''
+    
+    def _reply_prompt(self, interrupt_message, response):
+        args_value = '\n'.join([ f'- {arg}: {val}' for arg,val in self.tool_call["args"].items() ])
+        return dict(
+            role = 'system',
+            message = f"""The execution of the tool {self.tool_name} was paused to ask the user a question.
+            Current tool arguments:
+            {args_value}
+            Question asked to the user:
+            {interrupt_message}
+            The user replied: "{response}".
+            Classify the intent of the reply and set args only with the argument values the user provided or asked to change, leave the others null.
+            {self._reply_instructions()}
+            """
+        )
+        
+    def _parse_reply(self, interrupt_message, response):
+        return utils.ask_llm_structured(**self._reply_prompt(interrupt_message, response), output_schema=interrupt_reply_model(self.tool.args_schema))
+    
+    async def _aparse_reply(self, interrupt_message, response):
+        return await utils.ask_llm_structured_async(**self._reply_prompt(interrupt_message, response), output_schema=interrupt_reply_model(self.tool.args_schema))
+    
+    # DOC: Args the reply is expected to set (override per interrupt type), None means any tool arg
+    def _reply_candidate_args(self):
+        return None
+    
+    # DOC: Whether a locally parsed (intent, args) can be used as it is (i.e. a bare "yes" does not provide missing args)
+    def _accept_fast_reply(self, intent, args):
+        return True
+    
+    # DOC: Trivial replies ("yes", "cancel", "no, use 2024-03") are parsed with the tool reply parsers → reply model, None when the LLM has to be asked
+    def _fast_parse_reply(self, response):
+        parsed = reply_parsers.fast_parse_reply(response, self.tool._set_args_reply_parsers(), self._reply_candidate_args())
+        if parsed is not None and self._accept_fast_reply(*parsed):
+            reply = utils.try_default(lambda: interrupt_reply_model(self.tool.args_schema)(intent=parsed[0], args=parsed[1] or None), None)
+            if reply is not None:
+                reply_parsers.record('fast', parsed[0])
+                return reply
+        reply_parsers.record('llm', ToolInterrupt.ToolInterruptType(self.interrupt_type).value)
+        return None
+    
+    # DOC: Validated args model → dict with only the provided values
+    def _args_dict(self, args):
+        return args.model_dump(exclude_none=True) if args is not None else dict()   # INFO: python mode, tuple args (i.e. reference_period) stay tuples
+    
+    def _reply_args(self, reply):
+        return self._args_dict(reply.args)
+    
+    # DOC: Reply could not be parsed even after the retries → rerun the tool unchanged, it raises the same interrupt and the user is asked again
+    def _unparsed_reply_command(self):
+        return self._rerun_tool_command()
+    
+    # DOC: Command from the parsed reply (override per interrupt type)
+    def _reply_command(self, reply):
+        if reply.intent == 'exit':
+            return self._exit_command()
+        self.tool_call["args"].update(self._reply_args(reply))
+        return self._rerun_tool_command()
+    
+    def _handle_structured(self):
+        interrupt_message = self._render_interrupt_message()
+        response = self._ask_user(interrupt_message, self.interrupt_type)
+        reply = self._fast_parse_reply(response)
+        if reply is None:
+            try:
+                reply = self._parse_reply(interrupt_message, response)
+            except utils.LLMOutputError:
+                return self._unparsed_reply_command()
+        return self._reply_command(reply)
+    
+    async def _ahandle_structured(self):
+        interrupt_message = self._render_interrupt_message()
+        response = self._ask_user(interrupt_message, self.interrupt_type)
+        reply = self._fast_parse_reply(response)
+        if reply is None:
+            try:
+                reply = await self._aparse_reply(interrupt_message, response)
+            except utils.LLMOutputError:
+                return self._unparsed_reply_command()
+        return self._reply_command(reply)
+    
+    # ENDREGION: [Structured mode]
+        
+    # DOC: Ask the user (human-in-the-loop), this is the same for sync and async nodes
+    def _ask_user(self, interrupt_message, interrupt_type):
+        interruption = interrupt({
+            "content": interrupt_message,
+            "interrupt_type": ToolInterrupt.ToolInterruptType(interrupt_type).value,
+            "tool": self.tool_name,
+            "tool_call_id": self.tool_call['id'],    # INFO: Parallel tool calls may be interrupted together, clients resume each one by interrupt id
+        })
+        return interruption.get('response', 'User did not provide any response.')
         
 
 class BaseToolInterruptProvideArgsHandler(BaseToolInterruptHandler):        
+    
+    interrupt_type = ToolInterrupt.ToolInterruptType.PROVIDE_ARGS
+    
+    def _render_interrupt_message(self):
+        missing_args = '\n'.join([ '- {}: {}'.format(*self._describe_arg(arg)) for arg in self.tool_interrupt['data']['missing_args'] ])
+        return f"To run {self.tool_name} I still need some information:\n{missing_args}\nPlease provide these values, or say cancel to stop."
+    
+    def _reply_candidate_args(self):
+        return self.tool_interrupt['data']['missing_args']
+    
+    def _accept_fast_reply(self, intent, args):
+        return intent != 'confirm'
         
-    def _generate_interrupt_message(self):
+    def _interrupt_message_prompt(self):
         args_description = '\n'.join([
-            f'- {field} : {self.tool_interrupt["data"]["args_schema"][field].description}'
+            f'- {field} : {self.tool_interrupt["data"]["args_schema"][field]["description"]}'
             for field in self.tool_interrupt['data']['args_schema'].keys()
             if field in self.tool_interrupt['data']['missing_args']
         ])        
-        interrupt_message = utils.ask_llm(
+        return dict(
             role = 'system',
             message = f"""The tool execution can't be completed for this reason:
             {self.tool_interrupt['reason']}
@@ -44,56 +229,96 @@ class BaseToolInterruptProvideArgsHandler(BaseToolInterruptHandler):
             {args_description}
             Ask the user to provide the missing arguments for the tool execution."""
         )
-        return interrupt_message
         
-    def _generate_provided_args(self, response):
-        provided_args = utils.ask_llm(
+    def _provided_args_prompt(self, response):
+        return dict(
             role = 'system',
             message = f"""The tool execution could not be completed for this reason:
             {self.tool_interrupt['reason']}
             The user was asked to provide the missing arguments for the tool execution.
             The user replied: "{response}".
-            If the user has provided valid arguments please reply with a dictionary with key the argument names and value what was specified by the user.
-            If a value for an argument was not provided, then the value should be None.
+            Set the arguments with what was specified by the user, if a value for an argument was not provided leave it null.
             User can provide only some of the arguments.
-            Reply with only the dictionary and nothing else.
             """,
-            eval_output = True
-        ) 
-        return provided_args
+            output_schema = utils.partial_model(self.tool.args_schema)
+        )
+        
+    def _generate_interrupt_message(self):
+        return utils.ask_llm(**self._interrupt_message_prompt())
+    
+    async def _agenerate_interrupt_message(self):
+        return await utils.ask_llm_async(**self._interrupt_message_prompt())
+        
+    def _generate_provided_args(self, response):
+        return self._args_dict(utils.ask_llm(**self._provided_args_prompt(response)))
+    
+    async def _agenerate_provided_args(self, response):
+        return self._args_dict(await utils.ask_llm_async(**self._provided_args_prompt(response)))
+    
+    def _build_command(self, provided_args):
+        self.tool_call["args"].update(provided_args if provided_args is not None else dict())
+        
+        return self._rerun_tool_command()
               
     def handle(self, tool, interupt_data):
         super().handle(tool, interupt_data)
+        if self.interrupt_mode == 'structured':
+            return self._handle_structured()
         
         interrupt_message = self._generate_interrupt_message()
-        interruption = interrupt({
-            "content": interrupt_message,
-            "interrupt_type": ToolInterrupt.ToolInterruptType.PROVIDE_ARGS
-        })
-        response = interruption.get('response', 'User did not provide any response.')
-        provided_args = self._generate_provided_args(response)
+        response = self._ask_user(interrupt_message, ToolInterrupt.ToolInterruptType.PROVIDE_ARGS)
+        reply = self._fast_parse_reply(response)
+        if reply is not None:
+            return self._reply_command(reply)
+        try:
+            provided_args = self._generate_provided_args(response)
+        except utils.LLMOutputError:
+            return self._unparsed_reply_command()
         
-        self.tool_message.tool_calls[-1]["args"].update(provided_args if provided_args is not None else dict())
+        return self._build_command(provided_args)
+    
+    async def ahandle(self, tool, interupt_data):
+        """Async version of handle."""
+        await super().ahandle(tool, interupt_data)
+        if self.interrupt_mode == 'structured':
+            return await self._ahandle_structured()
         
-        return {
-            'goto': self.tool_handler_node,
-            'update': { 
-                "messages": [self.tool_message]
-            }
-        }      
+        interrupt_message = await self._agenerate_interrupt_message()
+        response = self._ask_user(interrupt_message, ToolInterrupt.ToolInterruptType.PROVIDE_ARGS)
+        reply = self._fast_parse_reply(response)
+        if reply is not None:
+            return self._reply_command(reply)
+        try:
+            provided_args = await self._agenerate_provided_args(response)
+        except utils.LLMOutputError:
+            return self._unparsed_reply_command()
+        
+        return self._build_command(provided_args)
         
         
 class BaseToolInterruptInvalidArgsHandler(BaseToolInterruptHandler):        
+    
+    interrupt_type = ToolInterrupt.ToolInterruptType.INVALID_ARGS
+    
+    def _render_interrupt_message(self):
+        invalid_args = '\n'.join([ f'- {self._describe_arg(arg)[0]}: {reason}' for arg, reason in self.tool_interrupt['data']['invalid_args'].items() ])
+        return f"Some arguments of {self.tool_name} are not valid:\n{invalid_args}\nPlease provide valid values, or say cancel to stop."
+    
+    def _reply_candidate_args(self):
+        return list(self.tool_interrupt['data']['invalid_args'].keys())
+    
+    def _accept_fast_reply(self, intent, args):
+        return intent != 'confirm'
         
-    def _generate_interrupt_message(self):
+    def _interrupt_message_prompt(self):
         args_description = '\n'.join([
-            f"""- {field} : {self.tool_interrupt["data"]["args_schema"][field].description}
+            f"""- {field} : {self.tool_interrupt["data"]["args_schema"][field]["description"]}
                     Invalid beacuse: {self.tool_interrupt["data"]["invalid_args"][field]}
             """
             for field in self.tool_interrupt['data']['args_schema'].keys()
             if field in self.tool_interrupt['data']['invalid_args']
         ])          
-        interrupt_message = utils.ask_llm(
+        return dict(
             role = 'system',
             message = f"""The tool execution can't be completed for this reason:
             {self.tool_interrupt['reason']}
@@ -101,11 +326,10 @@ class BaseToolInterruptInvalidArgsHandler(BaseToolInterruptHandler):
             {args_description}
             Ask the user to provide the valid arguments for the tool execution."""
         )
-        return interrupt_message
            
-    def _generate_provided_args(self, response):
-        args_description = '\n'.join([ f'- {arg}: {val}' for arg,val in self.tool_message.tool_calls[-1]["args"].items() ])
-        provided_args = utils.ask_llm(
+    def _provided_args_prompt(self, response):
+        args_description = '\n'.join([ f'- {arg}: {val}' for arg,val in self.tool_call["args"].items() ])
+        return dict(
             role = 'system',
             message = f"""The tool execution could not be completed for this reason:
             {self.tool_interrupt['reason']}
@@ -113,43 +337,82 @@ class BaseToolInterruptInvalidArgsHandler(BaseToolInterruptHandler):
             {args_description}
             The user was asked to provide other valid arguments for the tool execution.
             The user replied: "{response}".
-            If the user provided valid arguments, respond with a complete dictionary string keyed with the all the arguments they provided updated with what the user provided as a value, if any.
-            Reply with only the dictionary string and nothing else.
+            Set the arguments the user provided with their new values, leave the others null.
             """,
-            eval_output = True
-        ) 
-        return provided_args
+            output_schema = utils.partial_model(self.tool.args_schema)
+        )
+        
+    def _generate_interrupt_message(self):
+        return utils.ask_llm(**self._interrupt_message_prompt())
+    
+    async def _agenerate_interrupt_message(self):
+        return await utils.ask_llm_async(**self._interrupt_message_prompt())
+        
+    def _generate_provided_args(self, response):
+        return self._args_dict(utils.ask_llm(**self._provided_args_prompt(response)))
+    
+    async def _agenerate_provided_args(self, response):
+        return self._args_dict(await utils.ask_llm_async(**self._provided_args_prompt(response)))
+    
+    def _build_command(self, provided_args):
+        print('\n\n')
+        print(f'Provided args: {provided_args}')
+        print('\n\n')
+        
+        self.tool_call["args"].update(provided_args)
+        
+        return self._rerun_tool_command()
             
     def handle(self, tool, interupt_data):
         super().handle(tool, interupt_data)
+        if self.interrupt_mode == 'structured':
+            return self._handle_structured()
         
         interrupt_message = self._generate_interrupt_message()
-        interruption = interrupt({
-            "content": interrupt_message,
-            "interrupt_type": ToolInterrupt.ToolInterruptType.PROVIDE_ARGS
-        })
-        response = interruption.get('response', 'User did not provide any response.')
-        provided_args = self._generate_provided_args(response)
+        response = self._ask_user(interrupt_message, ToolInterrupt.ToolInterruptType.PROVIDE_ARGS)
+        reply = self._fast_parse_reply(response)
+        if reply is not None:
+            return self._reply_command(reply)
+        try:
+            provided_args = self._generate_provided_args(response)
+        except utils.LLMOutputError:
+            return self._unparsed_reply_command()
         
-        print('\n\n')
-        print(f'Provided args: {provided_args}')
-        print('\n\n')
+        return self._build_command(provided_args)
+    
+    async def ahandle(self, tool, interupt_data):
+        """Async version of handle."""
+        await super().ahandle(tool, interupt_data)
+        if self.interrupt_mode == 'structured':
+            return await self._ahandle_structured()
         
-        self.tool_message.tool_calls[-1]["args"].update(provided_args)
+        interrupt_message = await self._agenerate_interrupt_message()
+        response = self._ask_user(interrupt_message, ToolInterrupt.ToolInterruptType.PROVIDE_ARGS)
+        reply = self._fast_parse_reply(response)
+        if reply is not None:
+            return self._reply_command(reply)
+        try:
+            provided_args = await self._agenerate_provided_args(response)
+        except utils.LLMOutputError:
+            return self._unparsed_reply_command()
         
-        return {
-            'goto': self.tool_handler_node,
-            'update': { 
-                "messages": [self.tool_message]
-            }
-        }
+        return self._build_command(provided_args)
         
                 
 class BaseToolInterruptArgsConfirmationHandler(BaseToolInterruptHandler):
     
-    def _generate_interrupt_message(self):
+    interrupt_type = ToolInterrupt.ToolInterruptType.CONFIRM_ARGS
+    
+    def _render_interrupt_message(self):
+        args_value = '\n'.join([ f'- {self._describe_arg(arg)[0]}: {val}' for arg,val in self.tool_interrupt["data"]["args"].items() ])
+        return f"I am about to run {self.tool_name} with these arguments:\n{args_value}\nShall I proceed? You can also change any value, or say cancel to stop."
+    
+    def _reply_command(self, reply):
+        return self._build_command(None if reply.intent == 'exit' else self._reply_args(reply))
+    
+    def _interrupt_message_prompt(self):
         args_value = '\n'.join([ f'- {arg}: {val}' for arg,val in self.tool_interrupt["data"]["args"].items() ])    
-        interrupt_message = utils.ask_llm(
+        return dict(
             role = 'system',
             message = f"""The tool execution can't be completed for this reason:
             {self.tool_interrupt['reason']}
@@ -157,11 +420,10 @@ class BaseToolInterruptArgsConfirmationHandler(BaseToolInterruptHandler):
             {args_value}
             Ask the user to confirm if the arguments are correct or if want to provide some updates."""
         )
-        return interrupt_message
     
-    def _generate_provided_args(self, response):
+    def _provided_args_prompt(self, response):
         args_value = '\n'.join([ f'- {arg}: {val}' for arg,val in self.tool_interrupt["data"]["args"].items() ])
-        provided_args = utils.ask_llm(
+        return dict(
             role = 'system',
             message = f"""The tool execution could not be completed for this reason:
             {self.tool_interrupt['reason']}
@@ -169,49 +431,92 @@ class BaseToolInterruptArgsConfirmationHandler(BaseToolInterruptHandler):
             Below there is a list with provided arguments and their values:
             {args_value}
             The user replied: "{response}".
-            If the user provided some updates respond with a complete dictionary string keyed with all the arguments they provided updated with what the user requested or provided as a value, if any.
-            Reply with only the dictionary string and nothing else.
-            If the user asked to interrupt the tool process and exit, return None and nothing else.
+            Classify the intent of the reply and set args only with the argument values the user requested or provided, leave the others null.
             """,
-            eval_output = True
-        )  
-        return provided_args
+            output_schema = interrupt_reply_model(self.tool.args_schema)
+        )
+        
+    def _generate_interrupt_message(self):
+        return utils.ask_llm(**self._interrupt_message_prompt())
+    
+    async def _agenerate_interrupt_message(self):
+        return await utils.ask_llm_async(**self._interrupt_message_prompt())
+        
+    def _provided_args(self, reply):
+        return None if reply.intent == 'exit' else self._reply_args(reply)
+        
+    def _generate_provided_args(self, response):
+        return self._provided_args(utils.ask_llm(**self._provided_args_prompt(response)))
+    
+    async def _agenerate_provided_args(self, response):
+        return self._provided_args(await utils.ask_llm_async(**self._provided_args_prompt(response)))
+    
+    def _build_command(self, provided_args):
+        if provided_args is None:
+            return self._exit_command()
+        
+        else:
+            confirmed_args = self.tool_interrupt['data'].get('args', dict())
+            self.tool_call["args"].update({ arg: confirmed_args[arg] for arg in self.tool._set_args_kept_on_confirmation() if arg in confirmed_args })    # INFO: i.e. the resolved bbox, not resolved again on the rerun
+            self.tool_call["args"].update(provided_args)
+            self.run_state['execution_confirmed'] = True
+            return self._rerun_tool_command()
     
     def handle(self, tool, interupt_data):
         super().handle(tool, interupt_data)
+        if self.interrupt_mode == 'structured':
+            return self._handle_structured()
         
         interrupt_message = self._generate_interrupt_message()
-        interruption = interrupt({
-            "content": interrupt_message,
-            "interrupt_type": ToolInterrupt.ToolInterruptType.CONFIRM_ARGS
-        })
-        response = interruption.get('response', 'User did not provide any response.')
-        provided_args = self._generate_provided_args(response)
+        response = self._ask_user(interrupt_message, ToolInterrupt.ToolInterruptType.CONFIRM_ARGS)
+        reply = self._fast_parse_reply(response)
+        if reply is not None:
+            return self._reply_command(reply)
+        try:
+            provided_args = self._generate_provided_args(response)
+        except utils.LLMOutputError:
+            return self._unparsed_reply_command()
         
-        if provided_args is None:
-            remove_tool_message = utils.remove_tool_messages(self.tool_message)
-            system_message = SystemMessage(content="User choose to exit the tool process.")
-            return {
-                'goto': END,
-                'update': { "messages": [remove_tool_message, system_message] }
-            }
+        return self._build_command(provided_args)
+    
+    async def ahandle(self, tool, interupt_data):
+        """Async version of handle."""
+        await super().ahandle(tool, interupt_data)
+        if self.interrupt_mode == 'structured':
+            return await self._ahandle_structured()
         
-        else:
-            self.tool_message.tool_calls[-1]["args"].update(provided_args)
-            self.tool.execution_confirmed = True
-            return {
-                'goto': self.tool_handler_node,
-                'update': { 
-                    "messages": [self.tool_message]
-                }
-            }
+        interrupt_message = await self._agenerate_interrupt_message()
+        response = self._ask_user(interrupt_message, ToolInterrupt.ToolInterruptType.CONFIRM_ARGS)
+        reply = self._fast_parse_reply(response)
+        if reply is not None:
+            return self._reply_command(reply)
+        try:
+            provided_args = await self._agenerate_provided_args(response)
+        except utils.LLMOutputError:
+            return self._unparsed_reply_command()
+        
+        return self._build_command(provided_args)
             
             
 class BaseToolInterruptOutputConfirmationHandler(BaseToolInterruptHandler):
     
-    def _generate_interrupt_message(self):
+    interrupt_type = ToolInterrupt.ToolInterruptType.CONFIRM_OUTPUT
+    
+    def _render_interrupt_message(self):
         output_description = '\n'.join([ f'- {out_name}: {out_value}' for out_name,out_value in self.tool_interrupt["data"]["output"].items() ])
-        interrupt_message = utils.ask_llm(
+        return f"{self.tool_name} produced this output:\n{output_description}\nDo you confirm it? Otherwise tell me what to change, or say cancel to stop."
+    
+    def _reply_command(self, reply):
+        if reply.intent == 'confirm':
+            return self._confirmed_command()
+        elif reply.intent == 'update':
+            return self._update_inputs_command(self._reply_args(reply))
+        else:
+            return self._exit_command()
+    
+    def _interrupt_message_prompt(self):
+        output_description = '\n'.join([ f'- {out_name}: {out_value}' for out_name,out_value in self.tool_interrupt["data"]["output"].items() ])
+        return dict(
             role = 'system',
             message = f"""Before the completion of the tool execution, some output needs to be confirmed. In particular:
             {self.tool_interrupt['reason']}
@@ -219,12 +524,11 @@ class BaseToolInterruptOutputConfirmationHandler(BaseToolInterruptHandler):
             {output_description}
             Show output to the user and ask him if he wants to confirm it or if he wants to modify some values."""
         )
-        return interrupt_message
     
-    def _classify_output_confirmation(self, response):
+    def _classify_output_confirmation_prompt(self, response):
         args_value = '\n'.join([ f'- {arg}: {val}' for arg,val in self.tool_interrupt["data"]["args"].items() ])
         output_description = '\n'.join([ f'- {out_name}: {out_value}' for out_name,out_value in self.tool_interrupt["data"]["output"].items() ])
-        provided_output = utils.ask_llm(
+        return dict(
             role = 'system',
             message = f"""Before the completion of the tool execution, some output needs to be confirmed.
             The tool was called with this input:
@@ -239,17 +543,14 @@ class BaseToolInterruptOutputConfirmationHandler(BaseToolInterruptHandler):
             
             The user replied: "{response}".
             
-            If the user has answered affirmatively to the outputs produced it respond True and nothing else.
-            If the user has added details or specified changes in the input parameters, respond False and nothing else.
-            If the user asked to interrupt the tool process and exit, return None and nothing else.
+            Intent is 'confirm' if the user has answered affirmatively to the outputs produced, 'update' if the user has added details or specified changes in the input parameters, 'exit' if the user asked to interrupt the tool process.
             """,
-            eval_output = True
-        )   
-        return provided_output
+            output_schema = interrupt_reply_model(self.tool.args_schema)
+        )
     
-    def _generate_provided_output(self, response):
+    def _provided_output_prompt(self, response):
         args_value = '\n'.join([ f'- {arg}: {val}' for arg,val in self.tool_interrupt["data"]["args"].items() ])
-        update_inputs = utils.ask_llm(
+        return dict(
             role = 'system',
             message = f"""Tool was called with this input arguments:
             {args_value}
@@ -260,63 +561,88 @@ class BaseToolInterruptOutputConfirmationHandler(BaseToolInterruptHandler):
             But user provided this additional information for the execution:
             {response}
             
-            Return a dictionary string with the input arguments valued with the update provide by user and nothing else.
+            Set the input arguments updated by the user, leave the others null.
             """,
-            eval_output = True
+            output_schema = utils.partial_model(self.tool.args_schema)
         )
-        return update_inputs
+        
+    def _generate_interrupt_message(self):
+        return utils.ask_llm(**self._interrupt_message_prompt())
+    
+    async def _agenerate_interrupt_message(self):
+        return await utils.ask_llm_async(**self._interrupt_message_prompt())
+    
+    # DOC: Reply intent → True (confirmed) | False (inputs updated) | None (exit)
+    def _output_confirmation(self, reply):
+        return { 'confirm': True, 'update': False }.get(reply.intent)
+    
+    def _classify_output_confirmation(self, response):
+        return self._output_confirmation(utils.ask_llm(**self._classify_output_confirmation_prompt(response)))
+    
+    async def _aclassify_output_confirmation(self, response):
+        return self._output_confirmation(await utils.ask_llm_async(**self._classify_output_confirmation_prompt(response)))
+    
+    def _generate_provided_output(self, response):
+        return self._args_dict(utils.ask_llm(**self._provided_output_prompt(response)))
+    
+    async def _agenerate_provided_output(self, response):
+        return self._args_dict(await utils.ask_llm_async(**self._provided_output_prompt(response)))
     
+    def _confirmed_command(self):
+        self.run_state['output_confirmed'] = True
+        return self._rerun_tool_command()
+        
+    def _update_inputs_command(self, update_inputs):
+        self.tool_call["args"].update(update_inputs)
+        self.run_state['output_confirmed'] = False
+        return self._rerun_tool_command()
+        
     def handle(self, tool, interupt_data):
         super().handle(tool, interupt_data)
+        if self.interrupt_mode == 'structured':
+            return self._handle_structured()
         
         interrupt_message = self._generate_interrupt_message()
-        interruption = interrupt({
-            "content": interrupt_message,
-            "interrupt_type": ToolInterrupt.ToolInterruptType.CONFIRM_OUTPUT,
-        })
-        response = interruption.get('response', 'User did not provide any response.')
-        provided_output = self._classify_output_confirmation(response)
+        response = self._ask_user(interrupt_message, ToolInterrupt.ToolInterruptType.CONFIRM_OUTPUT)
+        reply = self._fast_parse_reply(response)
+        if reply is not None:
+            return self._reply_command(reply)
+        try:
+            provided_output = self._classify_output_confirmation(response)
+            update_inputs = self._generate_provided_output(response) if provided_output is False else None
+        except utils.LLMOutputError:
+            return self._unparsed_reply_command()
         
         if provided_output is True:
-            self.tool.output_confirmed = True
-            return {
-                'goto': self.tool_handler_node,
-                'update': { "messages": [self.tool_message] }
-            }
+            return self._confirmed_command()
+        elif provided_output is False:
+            return self._update_inputs_command(update_inputs)
+        else:
+            return self._exit_command()
+        
+    async def ahandle(self, tool, interupt_data):
+        """Async version of handle."""
+        await super().ahandle(tool, interupt_data)
+        if self.interrupt_mode == 'structured':
+            return await self._ahandle_structured()
         
+        interrupt_message = await self._agenerate_interrupt_message()
+        response = self._ask_user(interrupt_message, ToolInterrupt.ToolInterruptType.CONFIRM_OUTPUT)
+        reply = self._fast_parse_reply(response)
+        if reply is not None:
+            return self._reply_command(reply)
+        try:
+            provided_output = await self._aclassify_output_confirmation(response)
+            update_inputs = await self._agenerate_provided_output(response) if provided_output is False else None
+        except utils.LLMOutputError:
+            return self._unparsed_reply_command()
+        
+        if provided_output is True:
+            return self._confirmed_command()
         elif provided_output is False:
-            # args_value = '\n'.join([ f'- {arg}: {val}' for arg,val in self.tool_interrupt["data"]["args"].items() ])
-            # update_inputs = utils.ask_llm(
-            #     role = 'system',
-            #     message = f"""Tool was called with this input arguments:
-            #     {args_value}
-                
-            #     Output was:
-            #     {self.tool_interrupt['reason']}
-                
-            #     But user provided this additional information for the execution:
-            #     {response}
-                
-            #     Return a dictionary string with the input arguments valued with the update provide by user and nothing else.
-            #     """,
-            #     eval_output = True
-            # )
-            update_inputs = self._generate_provided_output(response)
-            
-            self.tool_message.tool_calls[-1]["args"].update(update_inputs)
-            self.tool.output_confirmed = False
-            return {
-                'goto': self.tool_handler_node,
-                'update': { "messages": [self.tool_message] }
-            }
-    
+            return self._update_inputs_command(update_inputs)
         else:
-            remove_tool_message = utils.remove_tool_messages(self.tool_message)
-            system_message = SystemMessage(content="User choose to exit the tool process.")
-            return {
-                'goto': END,
-                'update': { "messages": [remove_tool_message, system_message] }
-            }
+            return self._exit_command()
 
 
 class BaseToolInterruptNode:
@@ -328,6 +654,7 @@ class BaseToolInterruptNode:
         tool_interrupt_node_name: str,
         tools: dict,
         custom_tool_interupt_handlers: dict = dict(),
+        is_async: bool = False,
     ):
         instance = super().__new__(cls) 
         instance.__init__(
@@ -335,16 +662,17 @@ class BaseToolInterruptNode:
             tool_handler_node_name,
             tool_interrupt_node_name,
             tools,
-            custom_tool_interupt_handlers
+            custom_tool_interupt_handlers,
+            is_async
         )
         return instance.setup()
     
     
     tool_interupt_handlers = {
-        ToolInterrupt.ToolInterruptType.PROVIDE_ARGS: BaseToolInterruptProvideArgsHandler(),
-        ToolInterrupt.ToolInterruptType.INVALID_ARGS: BaseToolInterruptInvalidArgsHandler(),
-        ToolInterrupt.ToolInterruptType.CONFIRM_ARGS: BaseToolInterruptArgsConfirmationHandler(),
-        ToolInterrupt.ToolInterruptType.CONFIRM_OUTPUT: BaseToolInterruptOutputConfirmationHandler(),
+        ToolInterrupt.ToolInterruptType.PROVIDE_ARGS: BaseToolInterruptProvideArgsHandler,
+        ToolInterrupt.ToolInterruptType.INVALID_ARGS: BaseToolInterruptInvalidArgsHandler,
+        ToolInterrupt.ToolInterruptType.CONFIRM_ARGS: BaseToolInterruptArgsConfirmationHandler,
+        ToolInterrupt.ToolInterruptType.CONFIRM_OUTPUT: BaseToolInterruptOutputConfirmationHandler,
     }
     
     
@@ -355,13 +683,15 @@ class BaseToolInterruptNode:
             tool_interrupt_node_name: str,
             tools: dict,
             custom_tool_interupt_handlers: dict = dict(),
+            is_async: bool = False,
     ):
         self.state = state
         self.state_type = type(state)
         self.tool_handler_node_name = tool_handler_node_name
         self.tool_interrupt_node_name = tool_interrupt_node_name
         self.tools = tools
-        self.tool_interupt_handlers.update(custom_tool_interupt_handlers) # DOC: Dict Key is ToolInterruptType and Value is the handler class
+        self.tool_interupt_handlers = { **BaseToolInterruptNode.tool_interupt_handlers, **custom_tool_interupt_handlers } # DOC: Dict Key is ToolInterruptType and Value is the handler class (not shared between nodes)
+        self.is_async = is_async
         
     def setup(self):
         
@@ -373,22 +703,39 @@ class BaseToolInterruptNode:
             
             tool = self.tools[tool_name]
             
-            # DOC: OP.1 — i.e. BaseToolInterruptProvideArgsHandler.handle() -> _generate_interrupt_message > _generate_provided_args > _update_tool_message > return Command(goto=tool_handler_node, update={'messages' [tool_message]}
+            # DOC: OP.1 — i.e. BaseToolInterruptProvideArgsHandler.handle() -> _generate_interrupt_message > _generate_provided_args > return Command(goto=tool_handler_node, update={'nodes_params': {tool_handler_node: {'run_state', 'tool_args'}}})
             # DOC: OP.2 — i.e. A generic class with handle method that return {'goto': node-name, 'update': state}
-            command = self.tool_interupt_handlers[tool_interrupt['type']].handle(tool, interrupt_data)
+            command = self.tool_interupt_handlers[tool_interrupt['type']]().handle(tool, interrupt_data)
             
             next_node = command['goto']
             update_state = command['update']
             
             return Command(goto=next_node, update=update_state)
+        
+        # DOC: Async template → awaits handler.ahandle() so LLM calls do not block the event loop
+        async def async_tool_interrupt_node_template(state):
+            interrupt_data = state['nodes_params'][self.tool_interrupt_node_name]
+            tool_interrupt = interrupt_data['tool_interrupt']
+            tool_name = interrupt_data['tool_interrupt']['tool']
+            
+            tool = self.tools[tool_name]
+            
+            command = await self.tool_interupt_handlers[tool_interrupt['type']]().ahandle(tool, interrupt_data)
+            
+            next_node = command['goto']
+            update_state = command['update']
+            
+            return Command(goto=next_node, update=update_state)
+        
+        template = async_tool_interrupt_node_template if self.is_async else tool_interrupt_node_template
 
         # DOC: Creating the tool interrupt node function using the template function.
         tool_interrupt = types.FunctionType(
-            tool_interrupt_node_template.__code__,
+            template.__code__,
             globals(),
             name = self.tool_interrupt_node_name,
-            argdefs = tool_interrupt_node_template.__defaults__,
-            closure = tool_interrupt_node_template.__closure__
+            argdefs = template.__defaults__,
+            closure = template.__closure__
         )
         
         tool_interrupt.__annotations__ = {
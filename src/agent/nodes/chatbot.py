@@ -3,51 +3,60 @@
 from typing_extensions import Literal
 
 from langchain_core.messages import SystemMessage
+from langchain_core.runnables import RunnableConfig
 
 from langgraph.graph import END
-from langgraph.types import Command
+from langgraph.types import Command, Send
 
-from agent import utils
+from agent import history
 from agent.names import *
+from agent.configuration import Configuration
 from agent.states import State
-from agent.tools import (
-    CDSForecastNotebookTool,
-    SPICalculationNotebookTool,
-    CodeEditorTool
-)
+from agent.tools import tool_registry
 
 
 
-cds_forecast_notebook_tool = CDSForecastNotebookTool()
-spi_calculation_notebook_tool = SPICalculationNotebookTool()
-base_code_editor_tool = CodeEditorTool()
+# DOC: Tools the router can call (shared instances from the tool registry) and the subgraph that runs each of them
+multi_agent_tools = tool_registry.tools_dict([ CDS_FORECAST_NOTEBOOK_TOOL, SPI_CALCULATION_NOTEBOOK_TOOL, CODE_EDITOR_TOOL ])
 
-multi_agent_tools = {
-    cds_forecast_notebook_tool.name : cds_forecast_notebook_tool,
-    spi_calculation_notebook_tool.name : spi_calculation_notebook_tool,
-    base_code_editor_tool.name : base_code_editor_tool
-}
+multi_agent_subgraphs = { name: subgraph for name, subgraph in tool_registry.subgraphs().items() if name in multi_agent_tools }
 
-llm_with_tools = utils._base_llm.bind_tools([tool for tool in multi_agent_tools.values()])
 
 
+def dispatch_tool_calls(state, ai_message, tool_subgraphs = multi_agent_subgraphs, additional_update = dict()):
+    """dispatch_tool_calls - fan-out → one Send per tool call, subgraphs run in the same superstep (concurrently) and the chatbot runs again once all of them are done (or resumed after their interrupts)."""
+    messages = state["messages"] + [ ai_message ]
+    sends = [
+        Send(tool_subgraphs[tool_call['name']], { "messages": messages, "tool_call_id": tool_call['id'] })
+        for tool_call in ai_message.tool_calls
+    ]
+    return Command(goto = sends, update = { "messages": [ ai_message ], **additional_update })
 
-def chatbot(state: State) -> Command[Literal[END, CDS_FORECAST_SUBGRAPH, SPI_CALCULATION_SUBGRAPH, CODE_EDITOR_SUBGRAPH]]:     # type: ignore
+
+
+async def chatbot(state: State, config: RunnableConfig) -> Command[Literal[END, CDS_FORECAST_SUBGRAPH, SPI_CALCULATION_SUBGRAPH, CODE_EDITOR_SUBGRAPH]]:     # type: ignore
+    """Chatbot - async node, the routing call is awaited so one server event loop can serve many threads."""
     state["messages"] = state.get("messages", [])
+    configuration = Configuration.from_runnable_config(config)
+    
+    # DOC: bounded prompt → recent turns verbatim, older ones folded into a summary cached in state
+    prompt_messages, history_summary, history_summary_until = await history.acompact_history(
+        state["messages"],
+        summary = state.get("history_summary"),
+        summary_until = state.get("history_summary_until"),
+        token_budget = configuration.history_token_budget,
+        window = configuration.history_window,
+        tool_message_chars = configuration.history_tool_message_chars
+    )
+    history_update = { "history_summary": history_summary, "history_summary_until": history_summary_until }
     
-    ai_message = llm_with_tools.invoke(state["messages"])
+    ai_message = await tool_registry.bind_tools(list(multi_agent_tools.keys())).ainvoke(prompt_messages)     # INFO: Bound once on the first turn, from the cached schemas
     
     if hasattr(ai_message, "tool_calls") and len(ai_message.tool_calls) > 0:
         
-        # DOC: get the first tool call, discard others (this is ugly asf) edit: this works btw ("get spi and compare with temp" > cds tool then spi tool then code editor tool (don't know why it works))
-        tool_call = ai_message.tool_calls[0]
-        ai_message.tool_calls = [tool_call] 
-        
-        if tool_call['name'] == cds_forecast_notebook_tool.name:
-            return Command(goto = CDS_FORECAST_SUBGRAPH, update = { "messages": [ ai_message ] })
-        elif tool_call['name'] == spi_calculation_notebook_tool.name:
-            return Command(goto = SPI_CALCULATION_SUBGRAPH, update = { "messages": [ ai_message ] })
-        elif tool_call['name'] == base_code_editor_tool.name:
-            return Command(goto = CODE_EDITOR_SUBGRAPH, update = { "messages": [ ai_message ] })
-
-    return Command(goto = END, update = { "messages": [ ai_message ], "requested_agent": None, "nodes_params": dict() })
\ No newline at end of file
+        # DOC: all tool calls of the turn are dispatched together, unknown tool names are dropped
+        ai_message.tool_calls = [tool_call for tool_call in ai_message.tool_calls if tool_call['name'] in multi_agent_subgraphs]
+        if len(ai_message.tool_calls) > 0:
+            return dispatch_tool_calls(state, ai_message, additional_update = history_update)
+
+    return Command(goto = END, update = { "messages": [ ai_message ], "requested_agent": None, "nodes_params": dict(), **history_update })
\ No newline at end of file
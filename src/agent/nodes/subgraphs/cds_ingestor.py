@@ -4,10 +4,9 @@ from langgraph.graph import StateGraph
 from langgraph.graph import StateGraph, START, END
 from langgraph.types import Command
 
-from agent import utils
 from agent.names import *
 from agent.states.state import State
-from agent.tools import CDSForecastNotebookTool
+from agent.tools import tool_registry
 from agent.nodes import BaseToolHandlerNode, BaseToolInterruptNode
 
 
@@ -16,20 +15,19 @@ from agent.nodes import BaseToolHandlerNode, BaseToolInterruptNode
 
 
 
-cds_forecast_notebook_tool = CDSForecastNotebookTool()
+cds_forecast_notebook_tool = tool_registry.get(CDS_FORECAST_NOTEBOOK_TOOL)     # INFO: Same instance the chatbot router binds
 cds_forecast_tools_dict = {
     cds_forecast_notebook_tool.name: cds_forecast_notebook_tool
 }
 cds_tool_names = list(cds_forecast_tools_dict.keys())
 cds_tools = list(cds_forecast_tools_dict.values())
 
-llm_with_cds_tools = utils._base_llm.bind_tools(cds_tools)
-
 
 
 # DOC: This is for store some information that could be util for the nodes in the subgraph. N.B. Keys are node names, values are a custom dict
 class CDSState(State):
     nodes_params: dict
+    tool_call_id: str       # INFO: Which tool call of the last AI message this subgraph runs (set by the chatbot Send)
         
 
 
@@ -39,7 +37,8 @@ cds_forecast_tool_handler = BaseToolHandlerNode(
     tool_handler_node_name = CDS_FORECAST_TOOL_HANDLER,
     tool_interrupt_node_name = CDS_FORECAST_TOOL_INTERRUPT,
     tools = cds_forecast_tools_dict,
-    additional_ouput_state = { 'requested_agent': None, 'nodes_params': dict() }
+    additional_ouput_state = { 'nodes_params': dict() },     # INFO: No 'requested_agent', parallel branches would write it in the same step
+    is_async = True
 )
 
 
@@ -49,7 +48,8 @@ cds_forecast_tool_interrupt = BaseToolInterruptNode(
     tool_handler_node_name = CDS_FORECAST_TOOL_HANDLER,
     tool_interrupt_node_name = CDS_FORECAST_TOOL_INTERRUPT,
     tools = cds_forecast_tools_dict,
-    custom_tool_interupt_handlers = dict()     # DOC: use default 
+    custom_tool_interupt_handlers = dict(),     # DOC: use default
+    is_async = True
 )
     
     
@@ -7,7 +7,7 @@ from langgraph.types import Command
 from agent import utils
 from agent.names import *
 from agent.states.state import State
-from agent.tools import ToolInterrupt, CodeEditorTool
+from agent.tools import ToolInterrupt, tool_registry
 from agent.nodes import BaseToolHandlerNode, BaseToolInterruptNode, BaseToolInterruptOutputConfirmationHandler
 
 
@@ -16,7 +16,7 @@ from agent.nodes import BaseToolHandlerNode, BaseToolInterruptNode, BaseToolInte
 
 
 
-code_editor_tool = CodeEditorTool()
+code_editor_tool = tool_registry.get(CODE_EDITOR_TOOL)
 
 code_editor_tools_dict = {
     code_editor_tool.name: code_editor_tool
@@ -24,13 +24,12 @@ code_editor_tools_dict = {
 code_editor_tool_names = list(code_editor_tools_dict.keys())
 code_editor_tools = list(code_editor_tools_dict.values())
 
-llm_with_code_editor_tools = utils._base_llm.bind_tools(code_editor_tools)
-
 
 
 # DOC: This is for store some information that could be util for the nodes in the subgraph. N.B. Keys are node names, values are a custom dict
 class CodeEditorState(State):
     nodes_params: dict
+    tool_call_id: str       # INFO: Which tool call of the last AI message this subgraph runs (set by the chatbot Send)
     
     
 
@@ -40,7 +39,8 @@ code_editor_tool_handler = BaseToolHandlerNode(
     tool_handler_node_name = CODE_EDITOR_TOOL_HANDLER,
     tool_interrupt_node_name = CODE_EDITOR_TOOL_INTERRUPT,
     tools = code_editor_tools_dict,
-    additional_ouput_state = { 'requested_agent': None, 'nodes_params': dict() }
+    additional_ouput_state = { 'nodes_params': dict() },     # INFO: No 'requested_agent', parallel branches would write it in the same step
+    is_async = True
 )
 
 
@@ -48,9 +48,12 @@ code_editor_tool_handler = BaseToolHandlerNode(
 # DOC: Override this method to handle CodeEditor output updating
 class CodeEditorToolInterruptOutputConfirmationHandler(BaseToolInterruptOutputConfirmationHandler):
     
-    def _generate_provided_output(self, response):
+    def _reply_instructions(self):
+        return """If the user asks for changes to the generated code, the intent is 'update' and args.code_request must be the initial 'code_request' updated with the user provided information in order to get a more detailed request."""
+    
+    def _provided_output_prompt(self, response):
         args_value = '\n'.join([ f'- {arg}: {val}' for arg,val in self.tool_interrupt["data"]["args"].items() ])
-        update_inputs = utils.ask_llm(
+        return dict(
             role = 'system',
             message = f"""Tool was called with this input arguments:
             {args_value}
@@ -62,11 +65,10 @@ class CodeEditorToolInterruptOutputConfirmationHandler(BaseToolInterruptOutputCo
             {response}
             
             Update the initial input argument 'code_request' with the user provided information in order to get a more detailed request.
-            Return the updated dictionary of input arguments and nothing else.
+            Set the updated input arguments, leave the others null.
             """,
-            eval_output = True
+            output_schema = utils.partial_model(self.tool.args_schema)
         )
-        return update_inputs
         
 # DOC: Base tool interrupt node: handle tool interrupt by type and go back to tool hndler with updatet state to rerun tool
 code_editor_tool_interrupt = BaseToolInterruptNode(
@@ -75,8 +77,9 @@ code_editor_tool_interrupt = BaseToolInterruptNode(
     tool_interrupt_node_name = CODE_EDITOR_TOOL_INTERRUPT,
     tools = code_editor_tools_dict,
     custom_tool_interupt_handlers = {
-        ToolInterrupt.ToolInterruptType.CONFIRM_OUTPUT: CodeEditorToolInterruptOutputConfirmationHandler(),
-    }
+        ToolInterrupt.ToolInterruptType.CONFIRM_OUTPUT: CodeEditorToolInterruptOutputConfirmationHandler,
+    },
+    is_async = True
 )
 
 
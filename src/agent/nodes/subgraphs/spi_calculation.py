@@ -4,10 +4,9 @@ from langgraph.graph import StateGraph
 from langgraph.graph import StateGraph, START, END
 from langgraph.types import Command
 
-from agent import utils
 from agent.names import *
 from agent.states.state import State
-from agent.tools import SPICalculationNotebookTool
+from agent.tools import tool_registry
 from agent.nodes import BaseToolHandlerNode, BaseToolInterruptNode
 
 
@@ -16,20 +15,19 @@ from agent.nodes import BaseToolHandlerNode, BaseToolInterruptNode
 
 
 
-spi_calculation_notebook_tool = SPICalculationNotebookTool()
+spi_calculation_notebook_tool = tool_registry.get(SPI_CALCULATION_NOTEBOOK_TOOL)
 spi_calculation_tools_dict = {
     spi_calculation_notebook_tool.name: spi_calculation_notebook_tool
 }
 spi_tool_names = list(spi_calculation_tools_dict.keys())
 spi_tools = list(spi_calculation_tools_dict.values())
 
-llm_with_spi_tools = utils._base_llm.bind_tools(spi_tools)
-
 
 
 # DOC: This is for store some information that could be util for the nodes in the subgraph. N.B. Keys are node names, values are a custom dict
 class SPIState(State):
     nodes_params: dict
+    tool_call_id: str       # INFO: Which tool call of the last AI message this subgraph runs (set by the chatbot Send)
     
     
 
@@ -39,7 +37,8 @@ spi_calculation_tool_handler = BaseToolHandlerNode(
     tool_handler_node_name = SPI_CALCULATION_TOOL_HANDLER,
     tool_interrupt_node_name = SPI_CALCULATION_TOOL_INTERRUPT,
     tools = spi_calculation_tools_dict,
-    additional_ouput_state = { 'requested_agent': None, 'nodes_params': dict() }
+    additional_ouput_state = { 'nodes_params': dict() },     # INFO: No 'requested_agent', parallel branches would write it in the same step
+    is_async = True
 )
 
 
@@ -49,7 +48,8 @@ spi_calculation_tool_interrupt = BaseToolInterruptNode(
     tool_handler_node_name = SPI_CALCULATION_TOOL_HANDLER,
     tool_interrupt_node_name = SPI_CALCULATION_TOOL_INTERRUPT,
     tools = spi_calculation_tools_dict,
-    custom_tool_interupt_handlers = dict()     # DOC: use default 
+    custom_tool_interupt_handlers = dict(),     # DOC: use default
+    is_async = True
 )
 
 
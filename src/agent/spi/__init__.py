@@ -0,0 +1,55 @@
+"""SPI (Standardized Precipitation Index) package, imported by the notebooks built by SPICalculationNotebookTool."""
+
+from .engine import (
+    GammaParams,
+    accumulate,
+    accumulate_scales,
+    compute_spi,
+    fit_gamma,
+    fit_monthly_gamma,
+    gamma_probability,
+    probability_to_spi,
+    select_months,
+    spi,
+    spi_for_months,
+    spi_from_reference,
+    spi_scales,
+)
+from .fit_store import (
+    DEFAULT_FIT_DATASET,
+    SPI_FIT_STORE,
+    GammaFitStore,
+    is_complete_period,
+)
+from .tiling import (
+    DEFAULT_TILE_SIZE,
+    iter_tiles,
+    open_tiled_source,
+    output_name,
+    spi_tiled,
+)
+
+__all__ = [
+    'GammaParams',
+    'accumulate',
+    'accumulate_scales',
+    'fit_gamma',
+    'gamma_probability',
+    'probability_to_spi',
+    'spi',
+    'compute_spi',
+    'fit_monthly_gamma',
+    'select_months',
+    'spi_scales',
+    'spi_for_months',
+    'spi_from_reference',
+    'GammaFitStore',
+    'SPI_FIT_STORE',
+    'DEFAULT_FIT_DATASET',
+    'is_complete_period',
+    'spi_tiled',
+    'iter_tiles',
+    'open_tiled_source',
+    'output_name',
+    'DEFAULT_TILE_SIZE',
+]
@@ -0,0 +1,197 @@
+"""Vectorized SPI (Standardized Precipitation Index) over a whole (time, lat, lon) cube. Gamma parameters of every cell are fitted at once with NumPy (Thom estimate refined by a few Newton steps on the MLE equation), zeros are handled as a point mass and the probabilities are mapped to SPI with a vectorized inverse normal."""
+# DOC: REF: https://drought.emergency.copernicus.eu/data/factsheets/factsheet_spi.pdf
+# DOC: REF: https://mountainscholar.org/items/842b69e8-a465-4aeb-b7ec-021703baa6af [ page 18 to 24 ]
+# INFO: Arrays have time on axis 0, any trailing shape is treated as independent cells. scipy (special functions) and xarray are imported on first use.
+
+from dataclasses import dataclass
+
+import numpy as np
+
+# DOC: Abramowitz & Stegun (26.2.23) rational approximation of the inverse normal, the one used by the SPI reference (|error| < 4.5e-4)
+_C = (2.515517, 0.802853, 0.010328)
+_D = (1.432788, 0.189269, 0.001308)
+
+# INFO: Probabilities are clipped away from 0 and 1 → SPI stays finite (about ±6.4)
+_PROBABILITY_EPS = 1e-10
+
+
+@dataclass(frozen=True)
+class GammaParams:
+    """GammaParams - per calendar month, per cell params of the mixed (zero + gamma) distribution, arrays of shape (12, *grid)."""
+    alpha: np.ndarray       # INFO: shape, nan where the cell can not be fitted
+    beta: np.ndarray        # INFO: scale
+    q: np.ndarray           # INFO: probability of zero
+    dry: np.ndarray         # INFO: cells without precipitation at all (SPI is 0)
+
+
+def accumulate_scales(values, scales):
+    """accumulate_scales - rolling sums over each of `scales` time steps (axis 0) → (len(scales), time, ...), all from one cumulative sum. Windows with missing values are nan."""
+    values = np.asarray(values, dtype=float)
+    missing = np.isnan(values)
+    totals = np.cumsum(np.where(missing, 0.0, values), axis=0)
+    counts = np.cumsum(missing, axis=0)
+    accumulations = np.full((len(scales), *values.shape), np.nan)
+    for i, scale in enumerate(scales):
+        if scale == 1:
+            accumulations[i] = values
+            continue
+        sums = accumulations[i]
+        sums[scale-1] = totals[scale-1]
+        sums[scale:] = totals[scale:] - totals[:-scale]
+        gaps = counts.copy()
+        gaps[scale:] = counts[scale:] - counts[:-scale]
+        sums[gaps > 0] = np.nan
+    return accumulations
+
+def accumulate(values, scale = 1):
+    """Accumulate - rolling sums over `scale` time steps (axis 0), windows with missing values are nan."""
+    return accumulate_scales(values, [scale])[0]
+
+
+def fit_gamma(values, newton_steps = 3):
+    """fit_gamma - gamma MLE (loc=0) of every cell over axis 0 → GammaParams. Zeros only count for q, nan are skipped."""
+    from scipy import special
+
+    values = np.asarray(values, dtype=float)
+    valid = ~np.isnan(values)
+    positive = valid & (values > 0)
+    n_valid = valid.sum(axis=0)
+    n_positive = positive.sum(axis=0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(positive, values, 0.0).sum(axis=0) / n_positive
+        mean_log = np.where(positive, np.log(np.where(positive, values, 1.0)), 0.0).sum(axis=0) / n_positive
+        A = np.log(mean) - mean_log
+        fittable = (n_positive >= 2) & (A > 0)
+        A = np.where(fittable, A, 1.0)
+
+        # INFO: Thom (1958) estimate, then Newton on log(a) - digamma(a) = A (the scipy.stats.gamma.fit(floc=0) equation)
+        alpha = (1 + np.sqrt(1 + 4 * A / 3)) / (4 * A)
+        for _ in range(newton_steps):
+            f = np.log(alpha) - special.digamma(alpha) - A
+            df = 1 / alpha - special.polygamma(1, alpha)
+            alpha = np.maximum(alpha - f / df, alpha / 10)
+
+        alpha = np.where(fittable, alpha, np.nan)
+        beta = mean / alpha
+        q = (n_valid - n_positive) / n_valid
+
+    dry = (n_positive == 0) & (n_valid == values.shape[0])      # INFO: no precipitation and no missing values
+    return GammaParams(alpha=alpha, beta=beta, q=q, dry=dry)
+
+
+def gamma_probability(values, params):
+    """gamma_probability - H(x) = q + (1-q) G(x), cumulative probability with the zero correction."""
+    from scipy import special
+
+    values = np.asarray(values, dtype=float)
+    with np.errstate(invalid='ignore'):
+        G = special.gammainc(params.alpha, np.maximum(values, 0) / params.beta)
+    return params.q + (1 - params.q) * G
+
+
+def probability_to_spi(probability):
+    """probability_to_spi - vectorized inverse normal of the cumulative probability."""
+    H = np.clip(np.asarray(probability, dtype=float), _PROBABILITY_EPS, 1 - _PROBABILITY_EPS)
+    lower = H <= 0.5
+    t = np.sqrt(np.log(1 / np.where(lower, H, 1 - H) ** 2))
+    Z = t - (_C[0] + _C[1] * t + _C[2] * t ** 2) / (1 + _D[0] * t + _D[1] * t ** 2 + _D[2] * t ** 3)
+    return np.where(lower, -Z, Z)
+
+
+def spi(values, params):
+    """Spi - SPI of (accumulated) values given fitted params, dry cells are 0."""
+    values = np.asarray(values, dtype=float)
+    index = probability_to_spi(gamma_probability(values, params))
+    index = np.where(np.isnan(values) | np.isnan(params.alpha), np.nan, index)
+    return np.where(params.dry, 0.0, index)
+
+
+def compute_spi(values, scale = 1, fit_values = None, newton_steps = 3):
+    """compute_spi - accumulate, fit every cell at once and transform. Params come from fit_values (default: values themselves)."""
+    accumulated = accumulate(values, scale)
+    fit_accumulated = accumulated if fit_values is None else accumulate(fit_values, scale)
+    params = fit_gamma(fit_accumulated, newton_steps=newton_steps)
+    return spi(accumulated, params)
+
+
+def fit_monthly_gamma(values, months_of_year, scale = 1, newton_steps = 3):
+    """fit_monthly_gamma - GammaParams with a leading calendar month axis (12, ...), every month fitted on its own accumulations."""
+    accumulated = accumulate(values, scale)
+    months_of_year = np.asarray(months_of_year)
+    fits = [fit_gamma(accumulated[months_of_year == month], newton_steps=newton_steps) for month in range(1, 13)]
+    return GammaParams(**{ name: np.stack([getattr(fit, name) for fit in fits]) for name in GammaParams.__dataclass_fields__ })
+
+def select_months(params, months_of_year):
+    """select_months - per time step params out of the calendar month ones."""
+    index = np.asarray(months_of_year) - 1
+    return GammaParams(**{ name: getattr(params, name)[index] for name in GammaParams.__dataclass_fields__ })
+
+def spi_scales(values, months_of_year, in_reference, selected, scales, fit_store = None, fit_keys = None, newton_steps = 3):
+    """spi_scales - SPI of the selected time steps for every scale → (len(scales), selected, ...). Params are fitted per calendar month on the in_reference steps, or read from fit_store when fit_keys (one per scale) are given."""
+    months_of_year = np.asarray(months_of_year)
+    grids = []
+    for i, accumulated in enumerate(accumulate_scales(values, scales)):     # INFO: windows may start before the reference period or the first month of interest
+        fit_key = fit_keys[i] if fit_store is not None and fit_keys is not None else None
+        params = fit_store.get(fit_key, grid_shape=accumulated.shape[1:]) if fit_key is not None else None
+        if params is None:
+            params = fit_monthly_gamma(accumulated[in_reference], months_of_year[in_reference], newton_steps=newton_steps)
+            if fit_key is not None:
+                fit_store.put(fit_key, params)
+        grids.append(spi(accumulated[selected], select_months(params, months_of_year[selected])))
+    return np.stack(grids)
+
+
+# REGION: [xarray]
+
+def _time_first(data, time_dim):
+    return data.transpose(time_dim, ...)
+
+def spi_for_months(data, months, spi_ts = 1, time_dim = 'time', newton_steps = 3):
+    """spi_for_months - xarray.Dataset with one 'spi' grid per month, each fitted on the whole history up to that month (drop-in for the per-cell apply_ufunc loop of the SPI notebook)."""
+    import xarray as xr
+
+    data = _time_first(data.sortby(time_dim), time_dim)
+    times = data[time_dim].values
+    grids = []
+    for month in np.asarray(months, dtype=times.dtype):
+        history = data.values[times <= month]
+        grids.append(compute_spi(history, scale=spi_ts, newton_steps=newton_steps)[-1])
+
+    coords = { dim: data[dim] for dim in data.dims[1:] }
+    return xr.Dataset(
+        data_vars = { 'spi': ((time_dim, *data.dims[1:]), np.stack(grids)) },
+        coords = { time_dim: np.asarray(months, dtype=times.dtype), **coords }
+    )
+
+def spi_from_reference(data, months, reference_period, spi_ts = 1, time_dim = 'time', fit_store = None, area = None, dataset = None, newton_steps = 3):
+    """spi_from_reference - xarray.Dataset with one 'spi' grid per month.
+
+    Gamma params are fitted once per calendar month on the reference_period years (start, end) and kept in fit_store (see spi.fit_store) under (dataset, area, reference_period, scale), so new months only need the transform step.
+    A list of spi_ts (i.e.: [1, 3, 6, 12, 24]) is computed in the same pass and gives a 'scale' dimension.
+    """
+    import xarray as xr
+
+    scales = list(spi_ts) if isinstance(spi_ts, (list, tuple)) else [spi_ts]
+    data = _time_first(data.sortby(time_dim), time_dim)
+    times = data[time_dim].dt
+    months_of_year = times.month.values
+    in_reference = (times.year >= reference_period[0]).values & (times.year <= reference_period[1]).values
+    selected = np.isin(data[time_dim].values, np.asarray(months, dtype=data[time_dim].dtype))
+
+    fit_keys = [fit_store.make_key(area, reference_period, scale, dataset=dataset) for scale in scales] if fit_store is not None else None
+    grids = spi_scales(data.values, months_of_year, in_reference, selected, scales, fit_store=fit_store, fit_keys=fit_keys, newton_steps=newton_steps)
+
+    dims = (time_dim, *data.dims[1:])
+    coords = { time_dim: data[time_dim].values[selected], **{ dim: data[dim] for dim in data.dims[1:] } }
+    if isinstance(spi_ts, (list, tuple)):
+        return xr.Dataset(
+            data_vars = { 'spi': (('scale', *dims), grids) },
+            coords = { 'scale': scales, **coords }
+        )
+    return xr.Dataset(
+        data_vars = { 'spi': (dims, grids[0]) },
+        coords = coords
+    )
+
+# ENDREGION: [xarray]
@@ -0,0 +1,122 @@
+"""Fit-once store of the per calendar month, per cell gamma params of SPI. Params depend only on (source dataset, area, reference_period, spi_ts), so they are fitted the first time and every later request for the same region (i.e.: the monthly operational update) only runs the transform step."""
+# DOC: One .npz file per key, in memory the most recently used ones are kept as well.
+# INFO: Fits of a reference period that is not over yet (ending in the current year or later) have no key → they are fitted every time and never stored, the next months would change them.
+
+import datetime
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from agent.artifact_store import ArtifactStore
+
+from .engine import GammaParams
+
+# DOC: Default folder (relocate with ICISK_SPI_FIT_STORE), next to the other agent caches (see agent.utils._temp_dir)
+SPI_FIT_STORE = os.environ.get('ICISK_SPI_FIT_STORE', os.path.join(tempfile.gettempdir(), 'icisk-chat', 'spi-fits'))
+
+# DOC: Source of the monthly totals when none is given (the CDS dataset of the SPI notebook)
+DEFAULT_FIT_DATASET = 'reanalysis-era5-land'
+
+
+def is_complete_period(reference_period, today = None):
+    """is_complete_period - True when the (start, end) years of reference_period are all in the past."""
+    today = today or datetime.date.today()
+    return int(reference_period[1]) < today.year
+
+
+class GammaFitStore:
+    """GammaFitStore - GammaParams by fit key, in memory and as .npz files in root_dir."""
+
+    DEFAULT_MEMORY_ITEMS = 16
+    SCHEMA_VERSION = 1      # INFO: Bump when GammaParams or the fit change, older files are no longer matched
+
+    def __init__(self, root_dir = SPI_FIT_STORE, max_memory_items = DEFAULT_MEMORY_ITEMS):
+        """__init__ - files go to root_dir, the last max_memory_items params are kept in memory."""
+        self.root_dir = root_dir
+        self.max_memory_items = max_memory_items
+
+        self._memory = OrderedDict()    # INFO: key → GammaParams
+        self._lock = threading.RLock()
+        self._stats = { 'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'writes': 0 }
+
+
+    @classmethod
+    def make_key(cls, area, reference_period, spi_ts, dataset = None, today = None, **extra):
+        """make_key - canonical hash of the fit args (same normalization as the tool artifacts → bbox rounding, tuples as lists), None (not stored) for an incomplete reference period."""
+        if not is_complete_period(reference_period, today=today):
+            return None
+        return ArtifactStore.make_key('spi_gamma_fit', {
+            'schema_version': cls.SCHEMA_VERSION,
+            'dataset': dataset or DEFAULT_FIT_DATASET,
+            'area': area,
+            'reference_period': reference_period,
+            'spi_ts': spi_ts,
+            **extra
+        })
+
+    def _path(self, key):
+        return os.path.join(self.root_dir, f'{key}.npz')
+
+    def _remember(self, key, params):
+        self._memory[key] = params
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+
+    def get(self, key, grid_shape = None):
+        """Get - stored GammaParams (12, *grid_shape) or None, params of another grid are ignored."""
+        with self._lock:
+            params = self._memory.get(key)
+            if params is not None:
+                self._memory.move_to_end(key)
+                self._stats['memory_hits'] += 1
+            elif os.path.exists(self._path(key)):
+                try:
+                    with np.load(self._path(key)) as stored:
+                        params = GammaParams(**{ name: stored[name] for name in GammaParams.__dataclass_fields__ })
+                    self._remember(key, params)
+                    self._stats['disk_hits'] += 1
+                except (OSError, ValueError, KeyError):
+                    params = None    # INFO: Unreadable file, params are fitted again and the file rewritten
+            if params is not None and grid_shape is not None and params.alpha.shape[1:] != tuple(grid_shape):
+                params = None
+            if params is None:
+                self._stats['misses'] += 1
+            return params
+
+    def put(self, key, params):
+        """Put - store params under key, a None key is ignored."""
+        if key is None:
+            return      # INFO: Incomplete reference period (see make_key)
+        with self._lock:
+            self._remember(key, params)
+            # INFO: Write and rename, concurrent notebooks never read a partial file
+            os.makedirs(self.root_dir, exist_ok=True)
+            tmp_path = f'{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp.npz'
+            try:
+                np.savez(tmp_path, **{ name: getattr(params, name) for name in GammaParams.__dataclass_fields__ })
+                os.replace(tmp_path, self._path(key))
+            except OSError:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            self._stats['writes'] += 1
+
+    def clear(self):
+        """Clear - drop every stored fit."""
+        with self._lock:
+            self._memory.clear()
+            if os.path.isdir(self.root_dir):
+                for filename in os.listdir(self.root_dir):
+                    if filename.endswith('.npz'):
+                        os.remove(os.path.join(self.root_dir, filename))
+
+
+    @property
+    def stats(self):
+        """Stats - hit / miss and write counters."""
+        with self._lock:
+            return dict(self._stats)
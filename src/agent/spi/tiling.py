@@ -0,0 +1,134 @@
+"""Tiled SPI execution. The (lat, lon) grid is split in tiles computed on a local process (or thread) pool and every tile result is written straight into its chunk of a zarr store. At most 2 * max_workers tiles are in flight, so peak memory depends on the tile size and not on the bbox."""
+# INFO: Tiles of a lazily opened dataset (i.e.: xr.open_dataset / open_zarr, see open_tiled_source) are read one at a time, an in-memory cube is only sliced. zarr is imported on first use.
+
+import concurrent.futures
+import os
+
+import numpy as np
+
+from agent.artifact_store import ArtifactStore
+
+from .engine import _time_first, spi_scales
+from .fit_store import GammaFitStore
+
+DEFAULT_TILE_SIZE = (64, 64)
+
+
+def iter_tiles(grid_shape, tile_size = DEFAULT_TILE_SIZE):
+    """iter_tiles - (lat slice, lon slice) of the tiles covering the grid, row by row."""
+    for lat_start in range(0, grid_shape[0], tile_size[0]):
+        for lon_start in range(0, grid_shape[1], tile_size[1]):
+            yield (
+                slice(lat_start, min(lat_start + tile_size[0], grid_shape[0])),
+                slice(lon_start, min(lon_start + tile_size[1], grid_shape[1]))
+            )
+
+
+def output_name(prefix, area, suffix = '.zarr'):
+    """output_name - filesystem safe store name of an area (bbox, place name, ...) → prefix__<hash of the canonical area><suffix>."""
+    return f"{prefix}__{ArtifactStore.make_key(prefix, { 'area': area })[:16]}{suffix}"
+
+
+def open_tiled_source(data, path, tile_size = DEFAULT_TILE_SIZE, time_dim = 'time'):
+    """open_tiled_source - data (DataArray or Dataset over (time, lat, lon)) written to a zarr store in chunks of tile_size cells holding the whole time series, reopened lazily → every tile of spi_tiled reads only its own chunks."""
+    import xarray as xr
+
+    name = (data.name or 'data') if isinstance(data, xr.DataArray) else None
+    dataset = data.to_dataset(name=name) if name is not None else data
+    dataset = dataset.sortby(time_dim).transpose(time_dim, ...)
+    encoding = dict()
+    for var_name, variable in dataset.data_vars.items():
+        spatial = iter(tile_size)
+        encoding[var_name] = { 'chunks': tuple(size if dim == time_dim else min(next(spatial, size), size) for dim, size in variable.sizes.items()) }
+        variable.encoding = dict()      # INFO: Chunks of the source file (if any) would clash with the tile chunks
+    dataset.to_zarr(path, mode='w', encoding=encoding, consolidated=False)
+    opened = xr.open_zarr(path, chunks=None, consolidated=False)     # INFO: No dask arrays, lazily indexed → an isel reads only the chunks it touches
+    return opened[name] if name is not None else opened
+
+
+# DOC: Worker entry point (top level → picklable), the fit store is reopened from its folder in every process
+def _spi_tile(values, months_of_year, in_reference, selected, scales, fit_store_dir, fit_keys, newton_steps):
+    fit_store = GammaFitStore(root_dir=fit_store_dir) if fit_store_dir is not None else None
+    return spi_scales(values, months_of_year, in_reference, selected, scales, fit_store=fit_store, fit_keys=fit_keys, newton_steps=newton_steps).astype(np.float32)
+
+
+def _new_executor(executor, max_workers):
+    if isinstance(executor, concurrent.futures.Executor):
+        return executor, False
+    if executor == 'thread':
+        return concurrent.futures.ThreadPoolExecutor(max_workers=max_workers), True
+    if executor == 'process':
+        return concurrent.futures.ProcessPoolExecutor(max_workers=max_workers), True
+    raise ValueError(f"Unknown executor: {executor}. It should be 'process', 'thread' or a concurrent.futures.Executor")
+
+
+def _create_zarr_output(output, dims, shape, chunks, coords):
+    """_create_zarr_output - zarr store with the coords and an empty chunked 'spi' array, readable by xr.open_zarr."""
+    import xarray as xr
+    import zarr
+
+    xr.Dataset(coords=coords).to_zarr(output, mode='w', consolidated=False)
+    group = zarr.open_group(output, mode='a')
+    if int(zarr.__version__.split('.')[0]) >= 3:
+        return group.create_array('spi', shape=shape, chunks=chunks, dtype='float32', fill_value=np.nan, dimension_names=dims)
+    array = group.create_dataset('spi', shape=shape, chunks=chunks, dtype='float32', fill_value=np.nan)
+    array.attrs['_ARRAY_DIMENSIONS'] = list(dims)
+    return array
+
+
+def spi_tiled(data, months, reference_period, spi_ts = 1, time_dim = 'time', tile_size = DEFAULT_TILE_SIZE, output = None, executor = 'process', max_workers = None, fit_store = None, area = None, dataset = None, newton_steps = 3):
+    """spi_tiled - same result as spi.spi_from_reference, computed tile by tile in parallel. With output (zarr path) tiles are written to the store and the lazily opened dataset is returned, otherwise they are gathered in memory."""
+    import xarray as xr
+
+    scales = list(spi_ts) if isinstance(spi_ts, (list, tuple)) else [spi_ts]
+    if not data.indexes[time_dim].is_monotonic_increasing:
+        data = data.sortby(time_dim)
+    data = _time_first(data, time_dim)
+    times = data[time_dim].dt
+    months_of_year = times.month.values
+    in_reference = (times.year >= reference_period[0]).values & (times.year <= reference_period[1]).values
+    selected = np.isin(data[time_dim].values, np.asarray(months, dtype=data[time_dim].dtype))
+    lat_dim, lon_dim = data.dims[1:]
+    grid_shape = data.shape[1:]
+
+    dims = ('scale', time_dim, lat_dim, lon_dim)
+    shape = (len(scales), int(selected.sum()), *grid_shape)
+    coords = { 'scale': scales, time_dim: data[time_dim].values[selected], lat_dim: data[lat_dim].values, lon_dim: data[lon_dim].values }
+    if output is not None:
+        result = _create_zarr_output(output, dims, shape, (len(scales), max(shape[1], 1), *tile_size), coords)
+    else:
+        result = np.full(shape, np.nan, dtype=np.float32)
+
+    fit_store_dir = fit_store.root_dir if fit_store is not None else None
+    workers = max_workers or os.cpu_count() or 1
+    pool, owned = _new_executor(executor, workers)
+    max_pending = 2 * workers                   # INFO: Bounded memory → tiles are read only when a worker is about to be free
+    pending = dict()
+
+    def write_done(done):
+        for future in done:
+            lat_slice, lon_slice = pending.pop(future)
+            result[:, :, lat_slice, lon_slice] = future.result()
+
+    try:
+        for lat_slice, lon_slice in iter_tiles(grid_shape, tile_size):
+            if len(pending) >= max_pending:
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                write_done(done)
+            fit_keys = [
+                fit_store.make_key(area, reference_period, scale, dataset=dataset, tile=[lat_slice.start, lat_slice.stop, lon_slice.start, lon_slice.stop])
+                for scale in scales
+            ] if fit_store is not None else None
+            values = np.asarray(data.isel({ lat_dim: lat_slice, lon_dim: lon_slice }).values, dtype=float)
+            future = pool.submit(_spi_tile, values, months_of_year, in_reference, selected, scales, fit_store_dir, fit_keys, newton_steps)
+            pending[future] = (lat_slice, lon_slice)
+        write_done(concurrent.futures.wait(pending).done)
+    finally:
+        if owned:
+            pool.shutdown(cancel_futures=True)
+
+    if output is not None:
+        dataset = xr.open_zarr(output, consolidated=False)
+    else:
+        dataset = xr.Dataset(data_vars = { 'spi': (dims, result) }, coords = coords)
+    return dataset if isinstance(spi_ts, (list, tuple)) else dataset.isel(scale=0, drop=True)
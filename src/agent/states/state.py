@@ -9,3 +9,5 @@ from langgraph.graph import MessagesState
 class State(MessagesState):
     """Simple state."""
     requested_agent: str = None
+    history_summary: str = None         # Running summary of the messages left out of the chatbot prompt
+    history_summary_until: str = None   # Id of the last message folded into history_summary
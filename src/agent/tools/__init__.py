@@ -7,4 +7,16 @@ from .cds_forecast_notebook_tool import CDSForecastNotebookTool
 
 from .spi_calculation_notebook_tool import SPICalculationNotebookTool
 
-from .code_editor_tool import CodeEditorTool
\ No newline at end of file
+from .code_editor_tool import CodeEditorTool
+
+from .registry import ToolRegistry, tool_registry
+
+__all__ = [
+    'ToolInterrupt',
+    'BaseAgentTool',
+    'CDSForecastNotebookTool',
+    'SPICalculationNotebookTool',
+    'CodeEditorTool',
+    'ToolRegistry',
+    'tool_registry',
+]
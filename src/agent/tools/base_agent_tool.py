@@ -1,3 +1,7 @@
+import inspect
+import datetime
+import contextlib
+import contextvars
 from typing import Optional
 from langchain_core.tools import BaseTool
 from langchain_core.tools.base import ArgsSchema
@@ -7,9 +11,15 @@ from langchain_core.callbacks import (
     CallbackManagerForToolRun,
 )
 
+from agent import utils
+
 from .tool_interrupt import ToolInterrupt
 
 
+# DOC: Per-invocation tool state ( execution_confirmed, output_confirmed, output ). It is a plain dict kept in the graph state between nodes and bound to the running tool through this context variable, so tool instances are shared but never hold run data.
+_tool_run_state = contextvars.ContextVar('tool_run_state', default=None)
+
+
 # DOC: This is a base agent tool that exploit ToolInterrupt for human-in-the-loop paradigm
 class BaseAgentTool(BaseTool):
     
@@ -19,11 +29,6 @@ class BaseAgentTool(BaseTool):
     args_schema: Optional[ArgsSchema] = None
     return_direct: bool = True
     
-    # DOC: Additional args
-    execution_confirmed: bool = False
-    output_confirmed: bool = False
-    output: dict = None
-    
     # DOC: Setup specific tool with a given name, description and args_schema
     def __init__(self, name: str, description: str, args_schema: Optional[ArgsSchema], **kwargs):
         super().__init__(**kwargs)
@@ -31,19 +36,71 @@ class BaseAgentTool(BaseTool):
         self.description = description
         self.args_schema = args_schema
         
+        
+    # DOC: Initial per-run values, override to skip a confirmation step (i.e.: { 'execution_confirmed': True })
+    def _set_run_state_defaults(self):
+        return dict()
+    
+    def new_run_state(self):
+        """new_run_state - run state of a new tool call (nothing confirmed, no output)."""
+        return {
+            'execution_confirmed': False,
+            'output_confirmed': False,
+            'output': None,
+            **self._set_run_state_defaults()
+        }
+        
+    @contextlib.contextmanager
+    def run_context(self, run_state=None):
+        """run_context - bind a run state (i.e.: restored from graph state) to the current context for the duration of a tool invocation."""
+        run_state = dict(run_state) if run_state is not None else self.new_run_state()
+        token = _tool_run_state.set(run_state)
+        try:
+            yield run_state
+        finally:
+            _tool_run_state.reset(token)
+            
+    # INFO: Reuse the run state bound by the caller (graph handler node), direct calls get a fresh one
+    def _current_run_context(self):
+        run_state = _tool_run_state.get()
+        return contextlib.nullcontext(run_state) if run_state is not None else self.run_context()
+            
+    @property
+    def run_state(self) -> dict:
+        """run_state - run state bound by run_context."""
+        run_state = _tool_run_state.get()
+        if run_state is None:
+            raise RuntimeError(f"{self.name} run state accessed outside of a run_context()")
+        return run_state
+    
+    # DOC: Extra key for the cached OpenAI tool schema (see tools.registry), override when the schema is not fully defined by the source (i.e.: descriptions with the current date)
+    def _schema_cache_salt(self):
+        return ''
+        
+    def args_schema_description(self):
+        """args_schema_description - serializable description of the args_schema (it is stored in graph state together with the interrupt)."""
+        return {
+            arg: {
+                'title': schema.title,
+                'description': schema.description,
+                'required': schema.is_required(),
+            }
+            for arg, schema in self.args_schema.model_fields.items()
+        }
+        
     # DOC: Check missing arguments based on the args_schema (if Deafult is None than it's not required)
     def check_required_args(self, tool_args):
         missing_args = [arg for arg, schema in self.args_schema.model_fields.items() if schema.is_required() and tool_args[arg] is None]
         
         if len(missing_args) > 0:
-            self.execution_confirmed = False
+            self.run_state['execution_confirmed'] = False
             raise ToolInterrupt(
                 interrupt_tool = self.name,
                 interrupt_type = ToolInterrupt.ToolInterruptType.PROVIDE_ARGS,
                 interrupt_reason = f"Missing required arguments: {missing_args}.",
                 interrupt_data = {
                     "missing_args": missing_args,
-                    "args_schema": self.args_schema.model_fields
+                    "args_schema": self.args_schema_description()
                 }
             )
             
@@ -65,16 +122,20 @@ class BaseAgentTool(BaseTool):
                     continue
                 
         if len(invalid_args) > 0:
-            self.execution_confirmed = False
-            raise ToolInterrupt(
-                interrupt_tool = self.name,
-                interrupt_type = ToolInterrupt.ToolInterruptType.INVALID_ARGS,
-                interrupt_reason = f"Invalid arguments: {list(invalid_args.keys())}.",
-                interrupt_data = {
-                    "invalid_args": invalid_args,
-                    "args_schema": self.args_schema.model_fields
-                }
-            )
+            self.invalid_args_interrupt(invalid_args)
+            
+    def invalid_args_interrupt(self, invalid_args):
+        """invalid_args_interrupt - ask the user for valid values { argname: invalid_reason , ... } (i.e.: also from an inference rule that can not resolve an arg)."""
+        self.run_state['execution_confirmed'] = False
+        raise ToolInterrupt(
+            interrupt_tool = self.name,
+            interrupt_type = ToolInterrupt.ToolInterruptType.INVALID_ARGS,
+            interrupt_reason = f"Invalid arguments: {list(invalid_args.keys())}.",
+            interrupt_data = {
+                "invalid_args": invalid_args,
+                "args_schema": self.args_schema_description()
+            }
+        )
             
     # DOC: Infer argument values based on current provided values and one function reated to argument { argname: test(**tool_args) -> inferred_value , ... } 
     def _set_args_inference_rules(self):
@@ -85,39 +146,114 @@ class BaseAgentTool(BaseTool):
         for arg in self.args_schema.model_fields.keys():
             if arg in args_inference_rules and args_inference_rules[arg] is not None:
                 tool_args[arg] = args_inference_rules[arg](**tool_args)
+                
+    # DOC: Async inference rules override the sync ones with the same argname (i.e.: rules that need to ask the LLM) { argname: async test(**tool_args) -> inferred_value , ... }
+    def _set_args_async_inference_rules(self):
+        return dict()
+    
+    async def ainfer_args(self, tool_args):
+        """ainfer_args - async counterpart of infer_args, async rules are awaited."""
+        args_inference_rules = { **self._set_args_inference_rules(), **self._set_args_async_inference_rules() }
+        for arg in self.args_schema.model_fields.keys():
+            if arg in args_inference_rules and args_inference_rules[arg] is not None:
+                inferred_value = args_inference_rules[arg](**tool_args)
+                tool_args[arg] = await inferred_value if inspect.isawaitable(inferred_value) else inferred_value
+
+    # DOC: Inferred args that keep the value the user confirmed on the rerun (i.e.: the bbox resolved from an area name) [ argname, ... ]
+    def _set_args_kept_on_confirmation(self):
+        return list()
+
+    # DOC: Deterministic parsers for user replies to interrupts, tried before asking the LLM { argname: parser(reply_text) -> (value, matched_text) | None , ... } (see tools.reply_parsers)
+    def _set_args_reply_parsers(self):
+        return dict()
+
+
+    # DOC: Output args of the tool artifacts { argname: is_local_file , ... } (see agent.artifact_store). A request with the same args as an already executed one gets back its stored output instead of running _execute again. Empty → outputs are never reused
+    def _set_artifact_outputs(self):
+        return dict()
+    
+    def artifact_key(self, tool_args):
+        """artifact_key - content hash of the request, output args excluded (they can be derived from it, see artifact_name)."""
+        artifact_outputs = self._set_artifact_outputs()
+        return utils.artifact_store.make_key(self.name, { arg: value for arg, value in tool_args.items() if arg not in artifact_outputs })
     
+    def artifact_name(self, tool_args):
+        """artifact_name - suffix for default output names → the artifact key, or the current time when the store is disabled (same request, new files)."""
+        if utils.artifact_store.enabled:
+            return self.artifact_key(tool_args)[:16]
+        return datetime.datetime.now().isoformat(timespec='seconds').replace(':','-')
     
+    def _artifact_local_files(self, tool_args):
+        return [tool_args[arg] for arg, is_local_file in self._set_artifact_outputs().items() if is_local_file and tool_args.get(arg) is not None]
+    
+    def reuse_artifacts(self, tool_args):
+        """reuse_artifacts - stored outputs of the same request (one more reference), None when it has to run."""
+        artifact_outputs = self._set_artifact_outputs()
+        if len(artifact_outputs) == 0:
+            return None
+        record = utils.artifact_store.acquire(self.artifact_key(tool_args), args=tool_args, local_files=self._artifact_local_files(tool_args))
+        return record['outputs'] if record is not None else None
+    
+    def store_artifacts(self, tool_args, output):
+        """store_artifacts - remember the outputs of a completed request."""
+        artifact_outputs = self._set_artifact_outputs()
+        if len(artifact_outputs) > 0 and output is not None:
+            utils.artifact_store.put(self.artifact_key(tool_args), self.name, tool_args, output, metadata={ 'local_files': self._artifact_local_files(tool_args) })
+
+
     # DOC: Confirm args if needed 
     def confirm_args(self, tool_args): 
-        if not self.execution_confirmed:
+        if not self.run_state['execution_confirmed']:
             raise ToolInterrupt(
                 interrupt_tool = self.name,
                 interrupt_type = ToolInterrupt.ToolInterruptType.CONFIRM_ARGS,
                 interrupt_reason = "Please confirm the execution of the tool with the provided arguments.",
                 interrupt_data = {
                     "args": tool_args,
-                    "args_schema": self.args_schema.model_fields,
+                    "args_schema": self.args_schema_description(),
                 }
             )
             
             
     def confirm_ouputs(self, tool_args):
-        if not self.output_confirmed:
+        if not self.run_state['output_confirmed']:
             raise ToolInterrupt(
                 interrupt_tool = self.name,
                 interrupt_type = ToolInterrupt.ToolInterruptType.CONFIRM_OUTPUT,
                 interrupt_reason = "A user confirmation of the ouput is required.",
                 interrupt_data = {
                     "args": tool_args,
-                    "output": self.output
+                    "output": self.run_state['output']
                 }
             )
             
-    # DOC: Tool esecution, what this returns will be settet as tool.ouput so this should be overriden by the user
+    # DOC: Tool esecution, what this returns will be settet as run_state['output'] so this should be overriden by the user
     def _execute(self, **tool_args):
         return None
+    
+    # DOC: Async tool execution, override it when _execute waits on I/O (i.e.: LLM calls). Default runs _execute inline.
+    async def _aexecute(self, **tool_args):
+        return self._execute(**tool_args)
                 
     
+    # DOC: Controls, artifact reuse and execution shared by _run and _arun → yields the steps that may wait on I/O ('infer', 'execute'), run sync by _run and awaited by _arun
+    def _run_steps(self, tool_args):
+        with self._current_run_context() as run_state:
+            
+            self.check_required_args(tool_args)             # 1. Required arguments
+            self.check_validation_rules(tool_args)          # 2. Invalid arguments
+            yield 'infer'                                   # 3. Infer arguments
+            self.confirm_args(tool_args)                    # 4. Confirm arguments
+            
+            run_state['output'] = self.reuse_artifacts(tool_args)      # INFO: Same request already executed → stored output
+            if run_state['output'] is None:
+                run_state['output'] = yield 'execute'
+                self.store_artifacts(tool_args, run_state['output'])
+            
+            self.confirm_ouputs(tool_args)                  # 5. Confirm output
+            
+            return run_state['output']
+    
     # DOC: Run tool with the given arguments, this function should be overridden by the user that will call super() to do args validation and confirmation
     def _run(
         self, 
@@ -125,20 +261,16 @@ class BaseAgentTool(BaseTool):
         tool_args: dict = None,
     ) -> dict:
         """Run the tool with the given arguments."""
-        
-        def controls_before_execution(tool_args):
-            self.check_required_args(tool_args)         # 1. Required arguments
-            self.check_validation_rules(tool_args)      # 2. Invalid arguments
-            self.infer_args(tool_args)                  # 3. Infer arguments)
-            self.confirm_args(tool_args)                # 4. Confirm arguments
-            
-        controls_before_execution(tool_args)
-        
-        self.output = self._execute(**tool_args)
-        
-        def controls_after_execution(tool_args):
-            self.confirm_ouputs(tool_args)              # 5. Confirm output
-        
-        controls_after_execution(tool_args)
-        
-        return self.output
\ No newline at end of file
+        steps = { 'infer': lambda: self.infer_args(tool_args), 'execute': lambda: self._execute(**tool_args) }
+        return utils.run_steps(self._run_steps(tool_args), lambda step: steps[step]())
+    
+    
+    # DOC: Async counterpart of _run, same controls but LLM-backed inference and execution are awaited
+    async def _arun(
+        self, 
+        run_manager: None | Optional[AsyncCallbackManagerForToolRun] = None,
+        tool_args: dict = None,
+    ) -> dict:
+        """Run the tool asynchronously with the given arguments."""
+        steps = { 'infer': lambda: self.ainfer_args(tool_args), 'execute': lambda: self._aexecute(**tool_args) }
+        return await utils.arun_steps(self._run_steps(tool_args), lambda step: steps[step]())
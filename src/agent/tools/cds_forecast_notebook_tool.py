@@ -1,9 +1,8 @@
 import os
 import datetime
-from dateutil import relativedelta
 from enum import Enum
 
-from typing import Optional
+from typing import Optional, ClassVar
 from pydantic import BaseModel, Field
 from langchain_core.callbacks import (
     AsyncCallbackManagerForToolRun,
@@ -13,8 +12,9 @@ from langchain_core.callbacks import (
 from agent import utils
 from agent.names import *
 from agent.tools import BaseAgentTool
+from agent.tools import reply_parsers
+from agent.tools.notebook_template import NotebookTemplate, CellTemplate
 
-import nbformat as nbf
 
 
 # DOC: This is a tool that exploits I-Cisk API to ingests forecast data from the Climate Data Store (CDS) API and saves it in a zarr format. It build a jupyter notebook to do that.
@@ -138,9 +138,6 @@ class CDSForecastNotebookTool(BaseAgentTool):
             default = None
         )
         
-    # DOC: Additional tool args
-    notebook: nbf.NotebookNode = nbf.v4.new_notebook()
-
     
     # DOC: Initialize the tool with a name, description and args_schema
     def __init__(self, **kwargs):
@@ -157,7 +154,18 @@ class CDSForecastNotebookTool(BaseAgentTool):
             args_schema = CDSForecastNotebookTool.InputSchema,
             **kwargs
         )
-        self.output_confirmed = True    # INFO: There is already the execution_confirmed:True
+        
+    
+    # DOC: Default init_time and lead_time in the descriptions follow the current month
+    def _schema_cache_salt(self):
+        return datetime.datetime.now().strftime('%Y-%m')
+        
+    
+    # DOC: Notebook tools do not ask for output confirmation
+    def _set_run_state_defaults(self):
+        return {
+            'output_confirmed': True    # INFO: There is already the execution_confirmed:True
+        }
         
     
     # DOC: Validation rules ( i.e.: valid init and lead time ... ) 
@@ -206,17 +214,12 @@ class CDSForecastNotebookTool(BaseAgentTool):
             return alias_to_enum(ka['forecast_variables'])
         
         def infer_area(**ka):
-            def bounding_box_from_location_name(area):
-                if type(area) is str:
-                    area = utils.ask_llm(
-                        role = 'system',
-                        message = f"""Please provide the bounding box coordinates for the area: {area} with format [min_x, min_y, max_x, max_y] in EPSG:4326 Coordinate Reference System. 
-                        Provide only the coordinates list without any additional text or explanation.""",
-                        eval_output = True
-                    )
-                    self.execution_confirmed = False
-                return area
-            return bounding_box_from_location_name(ka['area'])
+            area, needs_confirmation = utils.bbox_from_area_name(ka['area'])
+            if area is None:
+                self.invalid_args_interrupt({ 'area': f"Could not find the bounding box of {ka['area']}. Please provide it as [min_x, min_y, max_x, max_y] or another area name." })
+            if needs_confirmation and not self.run_state['execution_confirmed']:
+                self.run_state['execution_confirmed'] = False    # INFO: Fuzzy gazetteer match or LLM guess, let the user check it (once, the confirmed bbox is kept)
+            return area
         
         def infer_init_time(**ka):
             if ka['init_time'] is None:
@@ -225,17 +228,20 @@ class CDSForecastNotebookTool(BaseAgentTool):
         
         def infer_lead_time(**ka):
             if ka['lead_time'] is None:
+                from dateutil import relativedelta
                 return (datetime.datetime.now().date().replace(day=1) + relativedelta.relativedelta(month=1)).strftime('%Y-%m-01')
             return ka['lead_time']
         
+        # INFO: Default output names are content addressed → the same request always gets the same notebook and zarr (see agent.artifact_store)
         def infer_zarr_output(**ka):
             if ka['zarr_output'] is None:
-                return f"icisk-ai_cds-forecast_{ka['forecast_variables'][0]}_{datetime.datetime.now().isoformat(timespec='seconds').replace(':','-')}.zarr"
+                return f"icisk-ai_cds-forecast_{self.InputForecastVariable(ka['forecast_variables'][0]).value}_{self.artifact_name(ka)}.zarr"
             return ka['zarr_output']
         
         def infer_jupyter_notebook(**ka):
+            self.run_state['new_notebook'] = ka['jupyter_notebook'] is None    # INFO: Generated name → the notebook is written from scratch, a user given one gets the cells appended
             if ka['jupyter_notebook'] is None:
-                return f"icisk-ai_cds-forecast_{ka['forecast_variables'][0]}_{datetime.datetime.now().isoformat(timespec='seconds').replace(':','-')}.ipynb"
+                return f"icisk-ai_cds-forecast_{self.InputForecastVariable(ka['forecast_variables'][0]).value}_{self.artifact_name(ka)}.ipynb"
             return ka['jupyter_notebook']
         
         return {
@@ -248,173 +254,194 @@ class CDSForecastNotebookTool(BaseAgentTool):
         }
         
     
-    # DOC: Preapre notebook cell code template
-    def prepare_notebook(self, jupyter_notebook):
-        if os.path.exists(jupyter_notebook):
-            self.notebook = nbf.read(jupyter_notebook, as_version=4)
+    # DOC: Async inference rules (only the ones that may ask the LLM)
+    def _set_args_async_inference_rules(self) -> dict:
         
-        self.notebook.cells.extend([
-            nbf.v4.new_code_cell("""
-                # Section "Dependencies"
-
-                %%capture
-
-                import os
-                import json
-                import datetime
-                import requests
-                import getpass
-                import pprint
-
-                import numpy as np
-                import pandas as pd
-
-                !pip install zarr xarray
-                import xarray as xr
-
-                !pip install s3fs
-                import s3fs
-
-                !pip install "cdsapi>=0.7.4"
-                import cdsapi
-                
-                !pip install cartopy
-                import cartopy.crs as ccrs
-                import cartopy.feature as cfeature
-            """),
-            nbf.v4.new_code_cell("""
-                # Section "Define constant"
-
-                # Forcast variables
-                forecast_variables = {forecast_variables}
-                
-                # Bouning box of interest in format [min_lon, min_lat, max_lon, max_lat]
-                region = {area}
-
-                # init forecast datetime
-                init_time = datetime.datetime.strptime('{init_time}', "%Y-%m-%d").replace(day=1)
-
-                # lead forecast datetime
-                lead_time = datetime.datetime.strptime('{lead_time}', "%Y-%m-%d").replace(day=1)
-
-                # ingested data ouput zarr file
-                zarr_output = '{zarr_output}'
-            """, metadata={"need_format": True}),
-            nbf.v4.new_code_cell("""
-                # Section "Call I-Cisk cds-ingestor-process API"
-
-                # Prepare payload
-                icisk_api_payload = {{
-                    "inputs": {{
-                        "dataset": "seasonal-original-single-levels",
-                        "file_out": f"/tmp/{{zarr_output.replace('.zarr', '')}}.nc",
-                        "query": {{
-                            "originating_centre": "ecmwf",
-                            "system": "51",
-                            "variable": forecast_variables,
-                            "year": [f"{{init_time.year}}"],
-                            "month": [f"{{init_time.month:02d}}"],
-                            "day": ["01"],
-                            "leadtime_hour": [str(h) for h in range(24, int((lead_time - init_time).total_seconds() // 3600), 24)],
-                            "area": [
-                                region[3],
-                                region[0],
-                                region[1],
-                                region[2]
-                            ],
-                            "data_format": "netcdf",
-                        }},
-                        "token": "YOUR-ICISK-API-TOKEN",
-                        "zarr_out": f"s3://saferplaces.co/test/icisk/ai-agent/{{zarr_output}}",
-                    }}
-                }}
-
-                print(); print('-------------------------------------------------------------------'); print();
-
-                pprint.pprint(icisk_api_payload)
-
-                print(); print('-------------------------------------------------------------------'); print();
-
-                icisk_api_token = 'token' # getpass.getpass("YOUR ICISK-API-TOKEN: ")
-
-                icisk_api_payload['inputs']['token'] = icisk_api_token
+        async def infer_area(**ka):
+            area, needs_confirmation = await utils.abbox_from_area_name(ka['area'])
+            if area is None:
+                self.invalid_args_interrupt({ 'area': f"Could not find the bounding box of {ka['area']}. Please provide it as [min_x, min_y, max_x, max_y] or another area name." })
+            if needs_confirmation and not self.run_state['execution_confirmed']:
+                self.run_state['execution_confirmed'] = False
+            return area
+        
+        return {
+            'area': infer_area
+        }
+        
+    
+    # DOC: The bbox the user confirmed goes back in the tool args, the rerun does not resolve (and ask for) the area name again
+    def _set_args_kept_on_confirmation(self) -> list:
+        return ['area']
+        
+    
+    # DOC: Identical requests reuse the notebook and the zarr built the first time (the zarr is remote, only the notebook is checked on disk)
+    def _set_artifact_outputs(self) -> dict:
+        return {
+            'zarr_output': False,
+            'jupyter_notebook': True
+        }
+        
+    
+    # DOC: Reply parsers ( i.e.: "precipitation and max temperature" → forecast_variables, "last month" → init_time ... )
+    def _set_args_reply_parsers(self) -> dict:
+        
+        return {
+            'forecast_variables': lambda text: reply_parsers.parse_aliases(text, self.InputForecastVariable.from_str),
+            'area': reply_parsers.parse_area,
+            'init_time': reply_parsers.parse_date,
+            'lead_time': reply_parsers.parse_date,
+            'zarr_output': lambda text: reply_parsers.parse_path(text, '.zarr'),
+            'jupyter_notebook': lambda text: reply_parsers.parse_path(text, '.ipynb')
+        }
+        
+    
+    # DOC: Notebook cells compiled once (see tools.notebook_template), {params} are filled per request
+    notebook_template: ClassVar[NotebookTemplate] = NotebookTemplate([
+        CellTemplate("""
+            # Section "Dependencies"
 
-                # Call API
-                root_url = 'NGROK-URL' # 'https://i-cisk.dev.52north.org/ingest'
-                icisk_api_response = requests.post(
-                    url = f'{{root_url}}/processes/ingestor-cds-process/execution',
-                    json = icisk_api_payload
-                )
+            %%capture
 
-                # Display response
-                pprint.pprint({{
-                    'response': icisk_api_response.json(),
-                    'status_code': icisk_api_response.status_code,
-                }})
-            """),
-            nbf.v4.new_code_cell("""
-                # Section "Get data from I-Cisk collection"
+            import os
+            import json
+            import datetime
+            import requests
+            import getpass
+            import pprint
 
-                living_lab = None
-                collection_name = f"seasonal-original-single-levels_{{init_time.strftime('%Y%m')}}_{{living_lab}}_{icisk_varname}_0"
+            import numpy as np
+            import pandas as pd
 
-                # Query collection
-                collection_response = requests.get(
-                    f'{{root_url}}/collections/{{collection_name}}/cube',
-                    params = {{
-                        'bbox': ','.join(map(str, region)),
-                        'f': 'json'
-                    }}
-                )
+            !pip install zarr xarray
+            import xarray as xr
 
-                # Get response
-                if collection_response.status_code == 200:
-                    collection_data = collection_response.json()
-                else:
-                    print(f'Error {{collection_response.status_code}}: {{collection_response.json()}}')
-            """),
-            nbf.v4.new_code_cell("""
-                # Section "Build dataset"
+            from agent import icisk
 
-                # Parse collection output data
-                axes = collection_data['domain']['axes']
-                dims = {{
-                    'model': list(map(int, [p.split('_')[1] for p in params])),
-                    'time': pd.date_range(axes['time']['start'], axes['time']['stop'], axes['time']['num']),
-                    'lon': np.linspace(axes['x']['start'], axes['x']['stop'], axes['x']['num'], endpoint=True),
-                    'lat': np.linspace(axes['y']['start'], axes['y']['stop'], axes['y']['num'], endpoint=True)
-                }}
+            !pip install s3fs
+            import s3fs
 
-                params = collection_data['parameters']
-                ranges = collection_data['ranges']
-                vars = {{
-                    '{icisk_varname}': (tuple(dims.keys()), np.stack([ np.array(ranges[name]['values']).reshape((len(dims['time']), len(dims['lon']), len(dims['lat']))) for name in params ]) )
+            !pip install "cdsapi>=0.7.4"
+            import cdsapi
+            
+            !pip install cartopy
+            import cartopy.crs as ccrs
+            import cartopy.feature as cfeature
+        """),
+        CellTemplate("""
+            # Section "Define constant"
+
+            # Forcast variables
+            forecast_variables = {forecast_variables}
+            
+            # Bouning box of interest in format [min_lon, min_lat, max_lon, max_lat]
+            region = {area}
+
+            # init forecast datetime
+            init_time = datetime.datetime.strptime('{init_time}', "%Y-%m-%d").replace(day=1)
+
+            # lead forecast datetime
+            lead_time = datetime.datetime.strptime('{lead_time}', "%Y-%m-%d").replace(day=1)
+
+            # ingested data ouput zarr file
+            zarr_output = '{zarr_output}'
+        """),
+        CellTemplate("""
+            # Section "Call I-Cisk cds-ingestor-process API"
+
+            # Prepare payload
+            icisk_api_payload = {{
+                "inputs": {{
+                    "dataset": "seasonal-original-single-levels",
+                    "file_out": f"/tmp/{{zarr_output.replace('.zarr', '')}}.nc",
+                    "query": {{
+                        "originating_centre": "ecmwf",
+                        "system": "51",
+                        "variable": forecast_variables,
+                        "year": [f"{{init_time.year}}"],
+                        "month": [f"{{init_time.month:02d}}"],
+                        "day": ["01"],
+                        "leadtime_hour": [str(h) for h in range(24, int((lead_time - init_time).total_seconds() // 3600), 24)],
+                        "area": [
+                            region[3],
+                            region[0],
+                            region[1],
+                            region[2]
+                        ],
+                        "data_format": "netcdf",
+                    }},
+                    "token": "YOUR-ICISK-API-TOKEN",
+                    "zarr_out": f"s3://saferplaces.co/test/icisk/ai-agent/{{zarr_output}}",
                 }}
-
-                # Build xarray dataset
-                dataset = xr.Dataset(
-                    data_vars = vars,
-                    coords = dims
-                )
-            """),
-            nbf.v4.new_code_cell("""
-                # Section "Describe dataset"
-
-                \"\"\"
-                Object "dataset" is a xarray.Dataset
-                It has  three dimensions named:
-                - 'model': list of model ids 
-                - 'lat': list of latitudes, 
-                - 'lon': list of longitudes,
-                - 'time': forecast timesteps
-                It has 1 variables named {icisk_varname} representing the {cds_varname} forecast data. It has a shape of [model, time, lat, lon].
-                \"\"\"
-
-                # Use this dataset variable to do next analysis or plots
-
-                display(dataset)
-            """)
-        ])
+            }}
+
+            print(); print('-------------------------------------------------------------------'); print();
+
+            pprint.pprint(icisk_api_payload)
+
+            print(); print('-------------------------------------------------------------------'); print();
+
+            icisk_api_token = 'token' # getpass.getpass("YOUR ICISK-API-TOKEN: ")
+
+            icisk_api_payload['inputs']['token'] = icisk_api_token
+
+            # Call API → the job is submitted async and polled until the ingestion ends, so the collection exists when it is queried
+            root_url = 'NGROK-URL' # 'https://i-cisk.dev.52north.org/ingest'
+            icisk_session = icisk.new_session(pool_size=8)     # INFO: Pooled connections shared by the processes and the collections clients
+            icisk_processes = icisk.ProcessesClient(root_url, session=icisk_session)
+            icisk_api_results = icisk_processes.execute('ingestor-cds-process', icisk_api_payload['inputs'])
+
+            # Display response
+            pprint.pprint({{
+                'results': icisk_api_results,
+                'stats': icisk_processes.stats,
+            }})
+        """),
+        CellTemplate("""
+            # Section "Get data from I-Cisk collection"
+
+            living_lab = None
+            collection_name = f"seasonal-original-single-levels_{{init_time.strftime('%Y%m')}}_{{living_lab}}_{icisk_varname}_0"
+
+            # Query collection → the region is split in tiles fetched in parallel (pooled connections, retried on errors), each tile is decoded while it streams
+            cube_client = icisk.CubeClient(root_url, max_workers=8, session=icisk_session)
+            dataset = cube_client.cube(
+                collection_name,
+                bbox = region,
+                tile_size = (5.0, 5.0),
+                variable = '{icisk_varname}',     # INFO: ensemble members (parameters named <variable>_<member>) are stacked along 'model'
+                member_dim = 'model'
+            )
+            print(f'Collection data fetched → {{cube_client.stats}}')
+        """),
+        CellTemplate("""
+            # Section "Describe dataset"
+
+            \"\"\"
+            Object "dataset" is a xarray.Dataset
+            It has  three dimensions named:
+            - 'model': list of model ids 
+            - 'lat': list of latitudes, 
+            - 'lon': list of longitudes,
+            - 'time': forecast timesteps
+            It has 1 variables named {icisk_varname} representing the {cds_varname} forecast data. It has a shape of [model, time, lat, lon].
+            \"\"\"
+
+            # Use this dataset variable to do next analysis or plots
+
+            display(dataset)
+        """),
+        CellTemplate("""
+            # Section "Write dataset to zarr"
+
+            # Local forecast store of the variable over the region → every init month is a slice along 'init_time' (lead times are relative to it), a monthly refresh appends only its slice (an already written month is replaced in place)
+            # Chunks hold every member and lead time of a (lat, lon) tile → time series and maps are both read from a few chunks. Blosc zstd compression, consolidated metadata
+            os.makedirs('tmpdir', exist_ok=True)
+            forecast_zarr = os.path.join('tmpdir', f"icisk-ai_cds-forecast_{icisk_varname}__{{'_'.join(map(str, region))}}.zarr")
+            forecast_writer = icisk.ForecastZarrWriter(forecast_zarr, codec='zstd', level=3)
+            print(f'{{forecast_zarr}} → {{forecast_writer.write(dataset, init_time=init_time)}}')
+        """)
+    ])
     
     
     # DOC: Execute the tool → Build notebook, write it to a file and return the path to the notebook and the zarr output file
@@ -427,7 +454,6 @@ class CDSForecastNotebookTool(BaseAgentTool):
         zarr_output: str,
         jupyter_notebook: str
     ): 
-        self.prepare_notebook(jupyter_notebook)    
         nb_values = {
             'forecast_variables': [self.InputForecastVariable(var).as_cds for var in forecast_variables],
             'area': area,
@@ -438,10 +464,10 @@ class CDSForecastNotebookTool(BaseAgentTool):
             'cds_varname': self.InputForecastVariable(forecast_variables[0]).as_cds,
             'icisk_varname': self.InputForecastVariable(forecast_variables[0]).as_icisk,
         }
-        for cell in self.notebook.cells:
-            if cell.cell_type in ("markdown", "code"):
-                cell.source = utils.safe_code_lines(cell.source, format_dict=nb_values if cell.metadata.get("need_format", False) else None)
-        nbf.write(self.notebook, jupyter_notebook) 
+        notebook = self.notebook_template.new_notebook(nb_values, None if self.run_state.get('new_notebook') else jupyter_notebook)     # INFO: Fresh notebook per call, only the cells with params are formatted
+        
+        import nbformat as nbf
+        nbf.write(notebook, jupyter_notebook) 
         
         return {
             "data_source": zarr_output,
@@ -471,4 +497,29 @@ class CDSForecastNotebookTool(BaseAgentTool):
                 "jupyter_notebook": jupyter_notebook,
             },
             run_manager=run_manager
-        )
\ No newline at end of file
+        )
+        
+        
+    # DOC: Async AgentTool run → same controls as _run, awaited inference
+    async def _arun(
+        self, 
+        forecast_variables: list[str],
+        area: str | list[float],
+        init_time: str = None,
+        lead_time: str = None,
+        zarr_output: str = None,
+        jupyter_notebook: str = None,
+        run_manager: None | Optional[AsyncCallbackManagerForToolRun] = None
+    ) -> dict:
+        
+        return await super()._arun(
+            tool_args = {
+                "forecast_variables": forecast_variables,
+                "area": area,
+                "init_time": init_time,
+                "lead_time": lead_time,
+                "zarr_output": zarr_output,
+                "jupyter_notebook": jupyter_notebook,
+            },
+            run_manager=run_manager
+        )
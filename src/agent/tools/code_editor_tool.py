@@ -10,9 +10,8 @@ from langchain_core.callbacks import (
 from agent import utils
 from agent.names import *
 from agent.tools import BaseAgentTool
+from agent.tools import reply_parsers
 
-import nbformat as nbf
-from nbformat.v4 import new_code_cell
 
 
 
@@ -51,7 +50,11 @@ class CodeEditorTool(BaseAgentTool):
             **kwargs
         )
         
-        self.execution_confirmed = True     # INFO: Skip this, there will be output_confirmed:True
+        
+    def _set_run_state_defaults(self):
+        return {
+            'execution_confirmed': True     # INFO: Skip this, there will be output_confirmed:True
+        }
         
     
     def _set_args_validation_rules(self):
@@ -62,65 +65,91 @@ class CodeEditorTool(BaseAgentTool):
             ]
         }
         
+    
+    # DOC: Reply parsers (code_request is free text, it is always left to the LLM)
+    def _set_args_reply_parsers(self):
+        return {
+            'source': lambda text: reply_parsers.parse_path(text, '.ipynb') or reply_parsers.parse_path(text, '.py')
+        }
         
-    def _execute(
-        self, 
-        source: None | str,
-        code_request: None | str | list[str],
-    ):
         
-        def get_source_code():
-            if source.endswith('.ipynb'):
-                nb = nbf.read(source, as_version=4)
-                source_code = [cell.source for cell in nb.cells if cell.cell_type == 'code' and cell.source != '']
-                source_code = '\n'.join(source_code)
-            elif source.endswith('.py'):
-                with open(source, 'r') as f:
-                    source_code = f.read().split('\n')
-            return source_code
-        
-        def add_source_code(source_code):
-            if source.endswith('.ipynb'):
-                nb = nbf.read(source, as_version=4)
-                new_cell = new_code_cell(source = source_code)
-                nb.cells.append(new_cell)
-                nbf.write(nb, source)
-            elif source.endswith('.py'):
-                with open(source, 'a') as f:
-                    f.write('\n')
-                    f.write('# Code from ICisk AI Agent ----------------------------------------------------\n')
-                    f.write(source_code)
-                    f.write('\n')
-                    f.write('-------------------------------------------------------------------------------\n')
-                    
-        if not self.output_confirmed:
-            
-            generated_code = utils.ask_llm(
-                role = 'system',
-                message = f"""
-                    You are a programming assistant who helps users write python code.
-                    Remember that the code is related to an analysis of geospatial data. If map visualizations are requested, use the cartopy library, adding borders, coastlines, lakes and rivers.
+    def _get_source_code(self, source):
+        if source.endswith('.ipynb'):
+            import nbformat as nbf      # INFO: Deferred, notebook libraries are loaded only when a notebook is edited
+            nb = nbf.read(source, as_version=4)
+            source_code = [cell.source for cell in nb.cells if cell.cell_type == 'code' and cell.source != '']
+            source_code = '\n'.join(source_code)
+        elif source.endswith('.py'):
+            with open(source) as f:
+                source_code = f.read().split('\n')
+        return source_code
+    
+    def _add_source_code(self, source, source_code):
+        if source.endswith('.ipynb'):
+            import nbformat as nbf
+            nb = nbf.read(source, as_version=4)
+            new_cell = nbf.v4.new_code_cell(source = source_code)
+            nb.cells.append(new_cell)
+            nbf.write(nb, source)
+        elif source.endswith('.py'):
+            with open(source, 'a') as f:
+                f.write('\n')
+                f.write('# Code from ICisk AI Agent ----------------------------------------------------\n')
+                f.write(source_code)
+                f.write('\n')
+                f.write('-------------------------------------------------------------------------------\n')
+                
+    def _generate_code_prompt(self, source, code_request):
+        return dict(
+            role = 'system',
+            message = f"""
+                You are a programming assistant who helps users write python code.
+                Remember that the code is related to an analysis of geospatial data. If map visualizations are requested, use the cartopy library, adding borders, coastlines, lakes and rivers.
 
-                    You have been asked to write python code that satisfies the following request:
+                You have been asked to write python code that satisfies the following request:
 
-                    {code_request}
+                {code_request}
 
-                    The code produced must be added to this existing code:
+                The code produced must be added to this existing code:
 
-                    {get_source_code()}
+                {self._get_source_code(source)}
 
-                    ------------------------------------------
+                ------------------------------------------
 
-                    Respond only with python code that can be integrated with the existing code. It must use the appropriate variables already defined in the code.
-                    Do not attach any other text.
-                    Do not produce additional code other than that necessary to satisfy the requests declared in the parameter.
-                """,
-                eval_output = False
-            )
-            
+                Respond only with python code that can be integrated with the existing code. It must use the appropriate variables already defined in the code.
+                Do not attach any other text.
+                Do not produce additional code other than that necessary to satisfy the requests declared in the parameter.
+            """,
+            eval_output = False,
+            use_cache = False     # INFO: User may ask to regenerate code with the same request, never serve it from cache
+        )
+        
+        
+    def _execute(
+        self, 
+        source: None | str,
+        code_request: None | str | list[str],
+    ):
+        if not self.run_state['output_confirmed']:
+            generated_code = utils.ask_llm(**self._generate_code_prompt(source, code_request))
+        else:
+            generated_code = self.run_state['output']['generated_code']
+            self._add_source_code(source, generated_code)
+                        
+        return {
+            "generated_code" : generated_code
+        }
+        
+    async def _aexecute(
+        self, 
+        source: None | str,
+        code_request: None | str | list[str],
+    ):
+        if not self.run_state['output_confirmed']:
+            generated_code = await utils.ask_llm_async(**self._generate_code_prompt(source, code_request))
         else:
-            generated_code = self.output['generated_code']
-            add_source_code(generated_code)
+            generated_code = self.run_state['output']['generated_code']
+            self._add_source_code(source, generated_code)
                         
         return {
             "generated_code" : generated_code
@@ -142,4 +171,21 @@ class CodeEditorTool(BaseAgentTool):
                 "code_request": code_request
             },
             run_manager=run_manager
-        )
\ No newline at end of file
+        )
+        
+        
+    # DOC: Async AgentTool run → same controls as _run, awaited code generation
+    async def _arun(
+        self, 
+        source: None | str,
+        code_request: None | str | list[str],
+        run_manager: None | Optional[AsyncCallbackManagerForToolRun] = None
+    ) -> dict:
+        
+        return await super()._arun(
+            tool_args = {
+                "source": source,
+                "code_request": code_request
+            },
+            run_manager=run_manager
+        )
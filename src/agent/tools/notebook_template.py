@@ -0,0 +1,75 @@
+"""Precompiled notebook templates. Cell sources are dedented and parsed once when the tool class is defined: cells without fields are rendered right away, cells with {fields} keep their parsed pieces and are the only ones formatted per request."""
+# DOC: Cell sources use str.format syntax → {param} is replaced, {{ and }} are literal braces. Every request gets a fresh notebook object.
+
+import os
+import string
+import uuid
+
+from agent import utils
+
+_formatter = string.Formatter()
+
+
+class CellTemplate:
+    """CellTemplate - a notebook cell source parsed once, rendered with str.format fields."""
+
+    def __init__(self, source, cell_type = 'code', metadata = None):
+        """__init__ - source is dedented, cells without fields are rendered right away."""
+        self.cell_type = cell_type
+        self.metadata = dict(metadata or dict())
+        self._pieces = list(_formatter.parse(utils.safe_code_lines(source)))    # INFO: [(literal, field_name, format_spec, conversion)]
+        self.fields = { field.split('.')[0].split('[')[0] for _, field, _, _ in self._pieces if field }
+        self._source = None if self.fields else self._render(dict())
+
+    def _render(self, values):
+        parts = []
+        for literal, field, format_spec, conversion in self._pieces:
+            parts.append(literal)
+            if field is not None:
+                value, _ = _formatter.get_field(field, (), values)
+                parts.append(_formatter.format_field(_formatter.convert_field(value, conversion), format_spec or ''))
+        return ''.join(parts)
+
+    def render(self, values):
+        """Render - cell source, static cells are never formatted again."""
+        return self._source if self._source is not None else self._render(values)
+
+    def new_cell(self, values):
+        """new_cell - fresh nbformat v4 cell with the rendered source."""
+        from nbformat import NotebookNode
+        cell = NotebookNode(
+            id = uuid.uuid4().hex[:8],
+            cell_type = self.cell_type,
+            metadata = NotebookNode(self.metadata),
+            source = self.render(values)
+        )
+        if self.cell_type == 'code':
+            cell.execution_count = None
+            cell.outputs = []
+        return cell
+
+
+class NotebookTemplate:
+    """NotebookTemplate - the cells of a tool notebook."""
+
+    def __init__(self, cells):
+        """__init__ - cells are CellTemplate or source strings (code cells)."""
+        self.cells = [cell if isinstance(cell, CellTemplate) else CellTemplate(cell) for cell in cells]
+        self.fields = set().union(*[cell.fields for cell in self.cells])
+
+    def render_cells(self, values):
+        """render_cells - new cells rendered with values, KeyError when a field has no value."""
+        missing = self.fields - set(values)
+        if len(missing) > 0:
+            raise KeyError(f"Missing notebook template values: {sorted(missing)}")
+        return [cell.new_cell(values) for cell in self.cells]
+
+    def new_notebook(self, values, jupyter_notebook = None):
+        """new_notebook - fresh notebook with the rendered cells, appended to the cells of jupyter_notebook when the file already exists."""
+        import nbformat as nbf
+        if jupyter_notebook is not None and os.path.exists(jupyter_notebook):
+            notebook = nbf.read(jupyter_notebook, as_version=4)
+        else:
+            notebook = nbf.v4.new_notebook()
+        notebook.cells.extend(self.render_cells(values))
+        return notebook
@@ -0,0 +1,211 @@
+"""Tool registry → one shared instance per tool, OpenAI tool schemas computed once (and cached on disk keyed by a hash of the tool source) and one bound LLM per tool set. Subgraphs and the chatbot router pull tools and bound LLMs from here."""
+# DOC: Third party tools are discovered through the 'agent.tools' entry point group → name = package.module:ToolClass
+
+import hashlib
+import inspect
+import json
+import os
+import threading
+from importlib import metadata
+
+from agent import utils
+from agent.names import (
+    CDS_FORECAST_NOTEBOOK_TOOL,
+    CDS_FORECAST_SUBGRAPH,
+    CODE_EDITOR_SUBGRAPH,
+    CODE_EDITOR_TOOL,
+    SPI_CALCULATION_NOTEBOOK_TOOL,
+    SPI_CALCULATION_SUBGRAPH,
+)
+
+ENTRY_POINT_GROUP = 'agent.tools'
+
+# DOC: Schema cache file (relocate with ICISK_TOOL_SCHEMA_CACHE)
+TOOL_SCHEMA_CACHE = os.environ.get('ICISK_TOOL_SCHEMA_CACHE', os.path.join(utils._temp_dir, 'tool_schemas.json'))
+
+
+def _source_hash(tool):
+    """_source_hash - sha256 of the source files defining the tool (its class and every agent base class) plus the tool salt."""
+    digest = hashlib.sha256()
+    for cls in type(tool).__mro__:
+        if not cls.__module__.startswith('agent.'):
+            continue
+        source_file = utils.try_default(lambda: inspect.getsourcefile(cls), None)
+        if source_file is not None and os.path.exists(source_file):
+            with open(source_file, 'rb') as f:
+                digest.update(f.read())
+    digest.update(str(tool._schema_cache_salt()).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ToolRegistry:
+    """ToolRegistry - tool classes by name, their shared instances, schemas and bound LLMs."""
+
+    def __init__(self, schema_cache_path = TOOL_SCHEMA_CACHE, discover = True):
+        """__init__ - schemas are cached in schema_cache_path, discover=False skips the entry point tools."""
+        self.schema_cache_path = schema_cache_path
+        self.discover_entry_points = discover
+
+        self._tool_classes = dict()     # INFO: name → tool class, instances are built on first use
+        self._subgraphs = dict()        # INFO: name → subgraph node that runs the tool (chatbot routing)
+        self._tools = dict()
+        self._schemas = dict()
+        self._bound_llms = dict()       # INFO: tuple of names → llm.bind_tools(schemas)
+        self._schema_cache = None
+        self._discovered = False
+        self._lock = threading.RLock()
+        self._stats = { 'schemas_computed': 0, 'schemas_cached': 0 }
+
+
+    # REGION: [Registration]
+
+    def register(self, name, tool_class, subgraph = None):
+        """Register - add (or replace) a tool class and the subgraph that runs it."""
+        with self._lock:
+            self._tool_classes[name] = tool_class
+            if subgraph is not None:
+                self._subgraphs[name] = subgraph
+            self._tools.pop(name, None)
+            self._schemas.pop(name, None)
+            self._bound_llms = { names: llm for names, llm in self._bound_llms.items() if name not in names }
+        return tool_class
+
+    def discover(self):
+        """Discover - register tools exposed by installed packages (entry point group 'agent.tools'), built-in names are never overridden."""
+        with self._lock:
+            if self._discovered:
+                return
+            self._discovered = True
+            for entry_point in metadata.entry_points(group=ENTRY_POINT_GROUP):
+                if entry_point.name in self._tool_classes:
+                    continue
+                tool_class = utils.try_default(entry_point.load, None)
+                if tool_class is not None:
+                    self.register(entry_point.name, tool_class, subgraph=getattr(tool_class, 'subgraph', None))
+
+    def _ensure_discovered(self):
+        if self.discover_entry_points and not self._discovered:
+            self.discover()
+
+    # ENDREGION: [Registration]
+
+
+    # REGION: [Tools]
+
+    def names(self):
+        """Names - registered tool names."""
+        self._ensure_discovered()
+        return list(self._tool_classes.keys())
+
+    def get(self, name):
+        """Get - the shared instance of a tool (tools keep no run data, see BaseAgentTool.run_state)."""
+        if name not in self._tool_classes:
+            self._ensure_discovered()
+        with self._lock:
+            if name not in self._tools:
+                self._tools[name] = self._tool_classes[name]()
+            return self._tools[name]
+
+    def tools(self, names = None):
+        """Tools - shared instances of names (every tool when None)."""
+        return [self.get(name) for name in (names if names is not None else self.names())]
+
+    def tools_dict(self, names = None):
+        """tools_dict - tool name → shared instance."""
+        return { tool.name: tool for tool in self.tools(names) }
+
+    def subgraphs(self):
+        """Subgraphs - tool name → subgraph node, for the tools that have one."""
+        self._ensure_discovered()
+        return dict(self._subgraphs)
+
+    # ENDREGION: [Tools]
+
+
+    # REGION: [Schemas]
+
+    def _load_schema_cache(self):
+        if self._schema_cache is None:
+            self._schema_cache = dict()
+            if self.schema_cache_path is not None and os.path.exists(self.schema_cache_path):
+                try:
+                    with open(self.schema_cache_path, encoding='utf-8') as f:
+                        self._schema_cache = json.load(f)
+                except (OSError, ValueError):
+                    pass    # INFO: Unreadable cache, schemas are recomputed and the file rewritten
+        return self._schema_cache
+
+    def _save_schema_cache(self):
+        if self.schema_cache_path is None:
+            return
+        # INFO: Write and rename, concurrent workers never read a partial file
+        tmp_path = f'{self.schema_cache_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.schema_cache_path)), exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._schema_cache, f)
+            os.replace(tmp_path, self.schema_cache_path)
+        except OSError:
+            utils.try_default(lambda: os.remove(tmp_path))
+
+    def _compute_schema(self, tool):
+        from langchain_core.utils.function_calling import convert_to_openai_tool
+        return convert_to_openai_tool(tool)
+
+    def schema(self, name):
+        """Return the OpenAI tool schema of a tool, computed once per source hash."""
+        with self._lock:
+            if name in self._schemas:
+                return self._schemas[name]
+            tool = self.get(name)
+            source_hash = _source_hash(tool)
+            cached = self._load_schema_cache().get(name)
+            if cached is not None and cached.get('hash') == source_hash:
+                self._stats['schemas_cached'] += 1
+                schema = cached['schema']
+            else:
+                self._stats['schemas_computed'] += 1
+                schema = self._compute_schema(tool)
+                self._schema_cache[name] = { 'hash': source_hash, 'schema': schema }
+                self._save_schema_cache()
+            self._schemas[name] = schema
+            return schema
+
+    def schemas(self, names = None):
+        """Schemas - OpenAI tool schemas of names (every tool when None)."""
+        return [self.schema(name) for name in (names if names is not None else self.names())]
+
+    # ENDREGION: [Schemas]
+
+
+    def bind_tools(self, names = None, llm = None):
+        """bind_tools - base LLM bound to a tool set, built once per set from the cached schemas (no pydantic serialization at bind time)."""
+        names = tuple(names if names is not None else self.names())
+        with self._lock:
+            if llm is not None:
+                return llm.bind_tools(self.schemas(names))
+            if names not in self._bound_llms:
+                self._bound_llms[names] = utils.get_base_llm().bind_tools(self.schemas(names))
+            return self._bound_llms[names]
+
+    @property
+    def stats(self):
+        """Stats - schema cache counters, tool instances and bound LLMs."""
+        with self._lock:
+            return { **self._stats, 'tools': len(self._tools), 'bound_llms': len(self._bound_llms) }
+
+
+def _default_registry():
+    from agent.tools import (
+        CDSForecastNotebookTool,
+        CodeEditorTool,
+        SPICalculationNotebookTool,
+    )
+    registry = ToolRegistry()
+    registry.register(CDS_FORECAST_NOTEBOOK_TOOL, CDSForecastNotebookTool, subgraph=CDS_FORECAST_SUBGRAPH)
+    registry.register(SPI_CALCULATION_NOTEBOOK_TOOL, SPICalculationNotebookTool, subgraph=SPI_CALCULATION_SUBGRAPH)
+    registry.register(CODE_EDITOR_TOOL, CodeEditorTool, subgraph=CODE_EDITOR_SUBGRAPH)
+    return registry
+
+# DOC: Shared registry with the built-in tools
+tool_registry = _default_registry()
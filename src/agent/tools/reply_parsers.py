@@ -0,0 +1,231 @@
+"""Deterministic parsers for user replies to tool interrupts. Trivial replies ("yes", "cancel", "no, use 2024-03", a bbox, "1991-2020") are understood locally, the LLM is asked only when the reply is ambiguous."""
+# DOC: Parsers take the reply text and return (value, matched_text) or None. Tools map them to their args in _set_args_reply_parsers().
+
+import datetime
+import re
+import threading
+from collections import Counter
+
+CONFIRM_WORDS = { 'yes', 'y', 'yep', 'yeah', 'ok', 'okay', 'k', 'sure', 'go', 'proceed', 'confirm', 'confirmed', 'correct', 'right', 'fine', 'perfect', 'good', 'great', 'continue', 'agree', 'si', 'sì' }
+EXIT_WORDS = { 'cancel', 'stop', 'exit', 'abort', 'quit', 'nevermind', 'forget' }
+REJECT_WORDS = { 'no', 'nope', 'not', 'wrong', 'instead', 'change' }
+FILLER_WORDS = { 'please', 'pls', 'thanks', 'thank', 'you', 'use', 'with', 'set', 'it', 'to', 'the', 'a', 'an', 'and', 'is', 'as', 'for', 'of', 'in', 'do', 'ahead', 'looks', 'sounds', 'all', 'that', 'this', 'just', 'let', 's', 'lets', 'me', 'i', 'want', 'would', 'like', 'be', 'should', 'mind', 'then', 'now', 'period', 'from', 'until', 'through', 'but', 'rather' }
+
+_WORD = re.compile(r"[^\W_]+(?:'[^\W_]+)?", re.UNICODE)
+
+
+def words(text):
+    """Words - casefolded words of a text."""
+    return [word.casefold() for word in _WORD.findall(str(text))]
+
+def strip_chunk(text):
+    """strip_chunk - core of a text chunk without leading / trailing filler or intent words (i.e. "no, use Spain please" → "Spain")."""
+    ignored = FILLER_WORDS | CONFIRM_WORDS | EXIT_WORDS | REJECT_WORDS
+    matches = [m for m in _WORD.finditer(text) if m.group(0).casefold() not in ignored]
+    if len(matches) == 0:
+        return ''
+    return text[matches[0].start():matches[-1].end()]
+
+
+# REGION: [Parsers]
+
+_NUMBER = r'[-+]?\d+(?:\.\d+)?'
+_BBOX = re.compile(rf'\[?\(?\s*({_NUMBER})\s*[,;]\s*({_NUMBER})\s*[,;]\s*({_NUMBER})\s*[,;]\s*({_NUMBER})\s*\)?\]?')
+
+def parse_bbox(text):
+    """parse_bbox - [min_x, min_y, max_x, max_y] in EPSG:4326."""
+    match = _BBOX.search(text)
+    if match is None:
+        return None
+    min_x, min_y, max_x, max_y = [float(v) for v in match.groups()]
+    if not (-180 <= min_x < max_x <= 180 and -90 <= min_y < max_y <= 90):
+        return None
+    return [min_x, min_y, max_x, max_y], match.group(0).strip()
+
+def parse_place(text):
+    """parse_place - area name with an exact gazetteer match (the tool resolves it to a bbox later)."""
+    from agent import gazetteer
+    name = strip_chunk(text)
+    if name == '' or len(name) > 64:
+        return None
+    match = gazetteer.lookup(name)
+    if match is None or match.method != 'exact':
+        return None
+    return name, name
+
+def parse_area(text):
+    """parse_area - bbox or place name."""
+    return parse_bbox(text) or parse_place(text)
+
+
+_YEAR = r'(?:1[89]\d{2}|2[01]\d{2})'
+_YEAR_RANGE = re.compile(rf'\b({_YEAR})\s*(?:-|–|to|until|through|and)\s*({_YEAR})\b', re.IGNORECASE)
+
+def parse_year_range(text):
+    """parse_year_range - (start_year, end_year) i.e. for a SPI reference period."""
+    matches = list(_YEAR_RANGE.finditer(text))
+    if len(matches) != 1:
+        return None
+    start, end = sorted(int(y) for y in matches[0].groups())
+    if start == end:
+        return None
+    return (start, end), matches[0].group(0)
+
+
+_ISO_DAY = r'\b(\d{4})-(\d{1,2})-(\d{1,2})\b'
+_ISO_MONTH = r'\b(\d{4})-(\d{1,2})\b(?!-\d)'
+_RELATIVE_MONTHS = { 'last month': -1, 'previous month': -1, 'past month': -1, 'this month': 0, 'current month': 0, 'next month': 1, 'coming month': 1 }
+_RELATIVE_DAYS = { 'today': 0, 'yesterday': -1, 'tomorrow': 1 }
+
+def _add_months(date, months):
+    years, month = divmod(date.month - 1 + months, 12)
+    return datetime.date(date.year + years, month + 1, 1)
+
+# DOC: Every date mention in the text → [(start, end, date, is_month)]
+def _date_mentions(text, today):
+    mentions = []
+    for match in re.finditer(_ISO_DAY, text):
+        try:
+            mentions.append((match.start(), match.end(), datetime.date(*map(int, match.groups())), False))
+        except ValueError:
+            pass
+    for match in re.finditer(_ISO_MONTH, text):
+        year, month = map(int, match.groups())
+        if 1 <= month <= 12:
+            mentions.append((match.start(), match.end(), datetime.date(year, month, 1), True))
+    lower_text = text.casefold()
+    for phrase, months in _RELATIVE_MONTHS.items():
+        for match in re.finditer(rf'\b{phrase}\b', lower_text):
+            mentions.append((match.start(), match.end(), _add_months(today, months), True))
+    for phrase, days in _RELATIVE_DAYS.items():
+        for match in re.finditer(rf'\b{phrase}\b', lower_text):
+            mentions.append((match.start(), match.end(), today + datetime.timedelta(days=days), False))
+    return sorted(mentions)
+
+def parse_date(text, today=None):
+    """parse_date - single ISO (YYYY-MM-DD, YYYY-MM) or relative ("last month", "today") date → 'YYYY-MM-DD'."""
+    mentions = _date_mentions(text, today or datetime.date.today())
+    if len(mentions) != 1:
+        return None
+    start, end, date, _ = mentions[0]
+    return date.strftime('%Y-%m-%d'), text[start:end]
+
+def parse_month(text, today=None):
+    """parse_month - single month mention → 'YYYY-MM'."""
+    mentions = _date_mentions(text, today or datetime.date.today())
+    if len(mentions) != 1:
+        return None
+    start, end, date, _ = mentions[0]
+    return date.strftime('%Y-%m'), text[start:end]
+
+def parse_month_range(text, today=None):
+    """parse_month_range - two month mentions → ('YYYY-MM', 'YYYY-MM')."""
+    mentions = _date_mentions(text, today or datetime.date.today())
+    if len(mentions) != 2:
+        return None
+    (start, _, first, _), (_, end, second, _) = mentions
+    first, second = sorted([first, second])
+    return (first.strftime('%Y-%m'), second.strftime('%Y-%m')), text[start:end]
+
+
+_TIMESCALE = re.compile(r'\bspi[-\s]?(\d{1,2})\b', re.IGNORECASE)
+_TIMESCALE_LIST = re.compile(r'\b(\d{1,2}(?:\s*(?:,|&|\band\b)\s*\d{1,2})*)[-\s]*months?\b', re.IGNORECASE)
+
+def parse_timescales(text):
+    """parse_timescales - SPI accumulation periods ('SPI-3 and SPI-12', '1, 3 and 6 months') → sorted list of months."""
+    matches = list(_TIMESCALE.finditer(text))
+    if len(matches) > 0:
+        return sorted({ int(m.group(1)) for m in matches }), [m.group(0) for m in matches]
+    matches = list(_TIMESCALE_LIST.finditer(text))
+    if len(matches) != 1:
+        return None
+    return sorted({ int(n) for n in re.findall(r'\d+', matches[0].group(1)) }), matches[0].group(0)
+
+
+def parse_path(text, suffix):
+    """parse_path - single local or remote path with the given suffix (i.e. '.ipynb')."""
+    matches = re.findall(rf'[^\s\'"]+{re.escape(suffix)}\b', text, re.IGNORECASE)
+    if len(matches) != 1:
+        return None
+    return matches[0], matches[0]
+
+def parse_aliases(text, from_alias):
+    """parse_aliases - comma / 'and' separated aliases mapped by from_alias (i.e. InputForecastVariable.from_str) → list of values."""
+    values, spans = [], []
+    for chunk in re.split(r',|;|&|\band\b', text):
+        core = strip_chunk(chunk)
+        if core == '' or len(core.split()) > 3:
+            continue
+        value = from_alias('_'.join(words(core)))
+        if value is not None:
+            values.append(value.value if hasattr(value, 'value') else value)
+            spans.append(core)
+    if len(values) == 0:
+        return None
+    return values, spans
+
+# ENDREGION: [Parsers]
+
+
+# REGION: [Reply]
+
+def fast_parse_reply(response, arg_parsers, candidate_args=None):
+    """fast_parse_reply - (intent, args) from the reply, None when the LLM is needed (unknown words, several args matching the same text, conflicting intents)."""
+    text = ' '.join(str(response).split())
+    if text == '':
+        return None
+
+    parsed = {}
+    for arg, parser in arg_parsers.items():
+        if candidate_args is not None and arg not in candidate_args:
+            continue
+        result = parser(text)
+        if result is not None:
+            parsed[arg] = result
+
+    matched_spans = [span for _, spans in parsed.values() for span in (spans if isinstance(spans, list) else [spans])]
+    if len(matched_spans) != len(set(matched_spans)):
+        return None     # INFO: i.e. "2024-03" fits both init_time and lead_time
+
+    remainder = text
+    for span in sorted(matched_spans, key=len, reverse=True):
+        remainder = remainder.replace(span, ' ')
+    reply_words = set(words(remainder))
+    if len(reply_words - FILLER_WORDS - CONFIRM_WORDS - EXIT_WORDS - REJECT_WORDS) > 0:
+        return None
+
+    is_confirm = len(reply_words & CONFIRM_WORDS) > 0
+    is_exit = len(reply_words & EXIT_WORDS) > 0
+    is_reject = len(reply_words & REJECT_WORDS) > 0
+    if len(parsed) > 0:
+        return None if is_exit else ('update', { arg: value for arg, (value, _) in parsed.items() })
+    if is_exit and not is_confirm:
+        return ('exit', dict())
+    if is_confirm and not is_reject:
+        return ('confirm', dict())
+    return None
+
+
+_metrics = Counter()
+_metrics_lock = threading.Lock()
+
+def record(path, detail):
+    """Record - count which path handled a reply, path is 'fast' or 'llm'."""
+    with _metrics_lock:
+        _metrics[f'{path}:{detail}'] += 1
+        _metrics[path] += 1
+
+def metrics():
+    """Metrics - fast / LLM parsed replies so far and the fast ratio."""
+    with _metrics_lock:
+        snapshot = dict(_metrics)
+    total = snapshot.get('fast', 0) + snapshot.get('llm', 0)
+    snapshot['fast_ratio'] = snapshot.get('fast', 0) / total if total > 0 else 0.0
+    return snapshot
+
+def reset_metrics():
+    """reset_metrics - counters back to 0."""
+    with _metrics_lock:
+        _metrics.clear()
+
+# ENDREGION: [Reply]
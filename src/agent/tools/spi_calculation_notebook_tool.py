@@ -1,10 +1,9 @@
 import os
 import datetime
-import dateutil.relativedelta
 
 from enum import Enum
 
-from typing import Optional
+from typing import Optional, ClassVar
 from pydantic import BaseModel, Field
 from langchain_core.callbacks import (
     AsyncCallbackManagerForToolRun,
@@ -14,8 +13,9 @@ from langchain_core.callbacks import (
 from agent import utils
 from agent.names import *
 from agent.tools import BaseAgentTool
+from agent.tools import reply_parsers
+from agent.tools.notebook_template import NotebookTemplate, CellTemplate
 
-import nbformat as nbf
 
 
 # DOC: This is a tool that exploits I-Cisk API to calculate SPI (Standard Precipitation Index) for a given location in a give time period.
@@ -54,14 +54,26 @@ class SPICalculationNotebookTool(BaseAgentTool):
         )
         period_of_interest: None | tuple = Field(
             title = "Period of Interest",
-            description = f"Tuple of two elements representing the start and end month in YYYY-MM format of the period of interest for which SPI has to be calculated. Default is form previous to current month { tuple( [ (datetime.datetime.now()-dateutil.relativedelta.relativedelta(months=1)).strftime('%Y-%m'), datetime.datetime.now().strftime('%Y-%m') ] ) }",
+            description = f"Tuple of two elements representing the start and end month in YYYY-MM format of the period of interest for which SPI has to be calculated. Default is form previous to current month { tuple( [ (datetime.datetime.now().replace(day=1)-datetime.timedelta(days=1)).strftime('%Y-%m'), datetime.datetime.now().strftime('%Y-%m') ] ) }",
             examples = [
                 None,
                 ("2025-01", "2025-02"),
                 ("2024-12", "2025-01"),
                 ("2024-03", "2025-03"),
             ],
-            default = tuple( [ (datetime.datetime.now()-dateutil.relativedelta.relativedelta(months=1)).strftime('%Y-%m'), datetime.datetime.now().strftime('%Y-%m') ] )
+            default = tuple( [ (datetime.datetime.now().replace(day=1)-datetime.timedelta(days=1)).strftime('%Y-%m'), datetime.datetime.now().strftime('%Y-%m') ] )
+        )
+        spi_timescales: None | list[int] = Field(
+            title = "SPI Timescales",
+            description = "List of accumulation periods in months for which SPI is computed together (i.e.: [1, 3, 6, 12] for SPI-1, SPI-3, SPI-6 and SPI-12). Default is [1].",
+            examples = [
+                None,
+                [1],
+                [3],
+                [1, 3, 6, 12],
+                [1, 3, 6, 12, 24],
+            ],
+            default = [1]
         )
         jupyter_notebook: None | str = Field(
             title = "Jupyter Notebook",
@@ -76,8 +88,6 @@ class SPICalculationNotebookTool(BaseAgentTool):
         )
         
     
-    # DOC: Additional tool args
-    notebook: nbf.NotebookNode = nbf.v4.new_notebook()
 
 
     # DOC: Initialize the tool with a name, description and args_schema
@@ -90,11 +100,23 @@ class SPICalculationNotebookTool(BaseAgentTool):
             args_schema = SPICalculationNotebookTool.InputSchema,
             **kwargs
         )
-        self.output_confirmed = True    # INFO: There is already the execution_confirmed:True
+        
+    
+    # DOC: Default period_of_interest in the description follows the current month
+    def _schema_cache_salt(self):
+        return datetime.datetime.now().strftime('%Y-%m')
+        
+    
+    # DOC: Notebook tools do not ask for output confirmation
+    def _set_run_state_defaults(self):
+        return {
+            'output_confirmed': True    # INFO: There is already the execution_confirmed:True
+        }
         
         
     # DOC: Validation rules ( i.e.: valid init and lead time ... ) 
     def _set_args_validation_rules(self) -> dict:
+        import dateutil.relativedelta
         
         return {
             'area': [
@@ -119,6 +141,10 @@ class SPICalculationNotebookTool(BaseAgentTool):
                 lambda **ka: f"Invalid period_of_interest: {ka['period_of_interest']}. It can't be mor than six months in the future."
                     if datetime.datetime.strptime(ka['period_of_interest'][1], "%Y-%m") > (datetime.datetime.now() + dateutil.relativedelta.relativedelta(months=6)) else None,
             ],
+            'spi_timescales': [
+                lambda **ka: f"Invalid spi_timescales: {ka['spi_timescales']}. It should be a list of accumulation periods in months, integers between 1 and 48."
+                    if ka['spi_timescales'] is not None and any(type(ts) is not int or not 1 <= ts <= 48 for ts in (ka['spi_timescales'] if isinstance(ka['spi_timescales'], (list, tuple)) else [ka['spi_timescales']])) else None
+            ],
             'jupyter_notebook': [
                 lambda **ka: f"Invalid notebook path: {ka['jupyter_notebook']}. It should be a valid jupyter notebook file path."
                     if ka['jupyter_notebook'] is not None and not ka['jupyter_notebook'].lower().endswith('.ipynb') else None
@@ -130,280 +156,174 @@ class SPICalculationNotebookTool(BaseAgentTool):
     def _set_args_inference_rules(self) -> dict:
         
         def infer_area(**ka):
-            def bounding_box_from_location_name(area):
-                if type(area) is str:
-                    area = utils.ask_llm(
-                        role = 'system',
-                        message = f"""Please provide the bounding box coordinates for the area: {area} with format [min_x, min_y, max_x, max_y] in EPSG:4326 Coordinate Reference System. 
-                        Provide only the coordinates list without any additional text or explanation.""",
-                        eval_output = True
-                    )
-                    self.execution_confirmed = False
-                return area
-            return bounding_box_from_location_name(ka['area'])
+            area, needs_confirmation = utils.bbox_from_area_name(ka['area'])
+            if area is None:
+                self.invalid_args_interrupt({ 'area': f"Could not find the bounding box of {ka['area']}. Please provide it as [min_x, min_y, max_x, max_y] or another area name." })
+            if needs_confirmation and not self.run_state['execution_confirmed']:
+                self.run_state['execution_confirmed'] = False    # INFO: Fuzzy gazetteer match or LLM guess, let the user check it (once, the confirmed bbox is kept)
+            return area
+        
+        def infer_spi_timescales(**ka):
+            if ka['spi_timescales'] is None:
+                return [1]
+            if not isinstance(ka['spi_timescales'], (list, tuple)):
+                return [ka['spi_timescales']]
+            return sorted(set(ka['spi_timescales']))
         
         def infer_jupyter_notebook(**ka):
+            self.run_state['new_notebook'] = ka['jupyter_notebook'] is None    # INFO: Generated name → the notebook is written from scratch, a user given one gets the cells appended
             if ka['jupyter_notebook'] is None:
-                return f"icisk-ai_spi-calculation_{datetime.datetime.now().isoformat(timespec='seconds').replace(':','-')}.ipynb"
+                return f"icisk-ai_spi-calculation_{self.artifact_name(ka)}.ipynb"     # INFO: Content addressed, the same request gets the same notebook (see agent.artifact_store)
             return ka['jupyter_notebook']
         
         return {
             'area': infer_area,
+            'spi_timescales': infer_spi_timescales,
             'jupyter_notebook': infer_jupyter_notebook
         }
         
     
-     # DOC: Preapre notebook cell code template
-    def prepare_notebook(self, jupyter_notebook):
-        if os.path.exists(jupyter_notebook):
-            self.notebook = nbf.read(jupyter_notebook, as_version=4)
-            
-        self.notebook.cells.extend([
-            nbf.v4.new_code_cell("""
-                # Section "Dependencies"
-
-                %%capture
-
-                import os
-                import math
-                import datetime
-                from dateutil.relativedelta import relativedelta
-                import getpass
-
-                import numpy as np
-                import pandas as pd
-                import xarray as xr
-
-                import scipy.stats as stats
-                from scipy.special import gammainc, gamma
-                
-                import matplotlib.pyplot as plt
-
-                !pip install "cdsapi>=0.7.4"
-                import cdsapi
-                
-                !pip install cartopy
-                import cartopy.crs as ccrs
-                import cartopy.feature as cfeature
-            """),
-            nbf.v4.new_code_cell("""
-                # Section "Parameters"
-
-                spi_ts = 1
-
-                area = {area} # min_lon, min_lat, max_lon, max_lat
-
-                reference_period = {reference_period} # start_year, end_year
-
-                period_of_interest = {period_of_interest} # start_month, end_month
-
-                cds_client = cdsapi.Client(url='https://cds.climate.copernicus.eu/api', key=getpass.getpass("YOUR CDS-API-KEY")) # CDS client
-            """, metadata={"need_format": True}),
-            nbf.v4.new_code_cell("""
-                filename = f'era5_land__total_precipitation__{{"_".join([str(c) for c in area])}}__monthly__{{reference_period[0]}}_{{reference_period[1]:02d}}.nc'
-
-                out_dir = 'tmpdir'
-                os.makedirs(out_dir, exist_ok=True)
-
-                cds_out_filename = os.path.join(out_dir, filename)
-
-                if not os.path.exists(cds_out_filename):
-                    cds_dataset = 'reanalysis-era5-land-monthly-means'
-                    cds_query =  {{
-                        'product_type': 'monthly_averaged_reanalysis',
-                        'variable': 'total_precipitation',
-                        'year': [str(year) for year in range(*reference_period)],
-                        'month': [f'{{month:02d}}' for month in range(1, 13)],
-                        'time': '00:00',
-                        'area': [
-                            area[3],  # N
-                            area[0],  # W
-                            area[1],  # S
-                            area[2]   # E
-                        ],
-                        "data_format": "netcdf",
-                        "download_format": "unarchived"
-                    }}
-
-                    cds_client.retrieve(cds_dataset, cds_query, cds_out_filename)
-
-                cds_ref_data = xr.open_dataset(cds_out_filename)
-            """),
-            nbf.v4.new_code_cell("""
-                # Get (Years, Years-Months) couple for the CDS api query. (We can query just one month at time)
-                period_of_interest = (datetime.datetime.strptime(period_of_interest[0], "%Y-%m"), datetime.datetime.strptime(period_of_interest[1], "%Y-%m"))
-                spi_start_date = period_of_interest[0] - relativedelta(months=spi_ts-1)
-                spi_years_range = list(range(spi_start_date.year, period_of_interest[1].year+1))
-                spi_month_range = []
-                for iy,year in enumerate(range(spi_years_range[0], spi_years_range[-1]+1)):
-                    if iy==0 and len(spi_years_range)==1:
-                        spi_month_range.append([month for month in range(spi_start_date.month, period_of_interest[1].month+1)])
-                    elif iy==0 and len(spi_years_range)>1:
-                        spi_month_range.append([month for month in range(spi_start_date.month, 13)])
-                    elif iy>0 and iy==len(spi_years_range)-1:
-                        spi_month_range.append([month for month in range(1, period_of_interest[1].month+1)])
-                    else:
-                        spi_month_range.append([month for month in range(1, 13)])
-
-                def build_cds_hourly_data_filepath(year, month):
-                    dataset_part = 'reanalysis_era5_land__total_precipitation__hourly'
-                    time_part = f'{{year}}-{{month[0]:02d}}_{{year}}-{{month[-1]:02d}}'
-                    filename = f'{{dataset_part}}__{{"_".join([str(c) for c in area])}}__{{time_part}}.nc'
-                    filedir = os.path.join(out_dir, dataset_part)
-                    if not os.path.exists(filedir):
-                        os.makedirs(filedir, exist_ok=True)
-                    filepath = os.path.join(filedir, filename)
-                    return filepath
-
-                def floor_decimals(number, decimals=0):
-                    factor = 10 ** decimals
-                    return math.floor(number * factor) / factor
-
-                def ceil_decimals(number, decimals=0):
-                    factor = 10 ** decimals
-                    return math.ceil(number * factor) / factor
-
-                # CDS API query
-                cds_poi_data_filepaths = []
-                for q_idx, (year,year_months) in enumerate(zip(spi_years_range, spi_month_range)):
-                    for ym in year_months:
-                        cds_poi_data_filepath = build_cds_hourly_data_filepath(year, [ym])
-                        if not os.path.exists(cds_poi_data_filepath):
-                            cds_dataset = 'reanalysis-era5-land'
-                            cds_query =  {{
-                                'variable': 'total_precipitation',
-                                'year': [str(year)],
-                                'month': [f'{{month:02d}}' for month in year_months],
-                                'day': [f'{{day:02d}}' for day in range(1, 32)],
-                                'time': [f'{{hour:02d}}:00' for hour in range(0, 24)],
-                                'area': [
-                                    ceil_decimals(area[3], 1),    # N
-                                    floor_decimals(area[0], 1),   # W
-                                    floor_decimals(area[1], 1),   # S
-                                    ceil_decimals(area[2], 1),    # E
-                                ],
-                                "data_format": "netcdf",
-                                "download_format": "unarchived"
-                            }}
-                            cds_client.retrieve(cds_dataset, cds_query, cds_poi_data_filepath)
-
-                    print(f'{{q_idx+1}}/{{len(year_months)}}/{{len(spi_years_range)}} - CDS API query completed')
-                    cds_poi_data_filepaths.append(cds_poi_data_filepath)
-
-                cds_poi_data = [xr.open_dataset(fp) for fp in cds_poi_data_filepaths]
-                cds_poi_data = xr.concat(cds_poi_data, dim='valid_time')
-                cds_poi_data = cds_poi_data.sel(valid_time=(cds_poi_data.valid_time.dt.date>=period_of_interest[0].date()) & (cds_poi_data.valid_time.dt.date<=period_of_interest[1].date()))
-            """),
-            nbf.v4.new_code_cell("""
-                # Preprocess reference dataset
-                cds_ref_data = cds_ref_data.drop_vars(['number', 'expver'])
-                cds_ref_data = cds_ref_data.rename({{'valid_time': 'time', 'latitude': 'lat', 'longitude': 'lon'}})
-                cds_ref_data = cds_ref_data * cds_ref_data['time'].dt.days_in_month
-                cds_ref_data = cds_ref_data.assign_coords(
-                    lat=np.round(cds_ref_data.lat.values, 6),
-                    lon=np.round(cds_ref_data.lon.values, 6),
-                )
-                cds_ref_data = cds_ref_data.sortby(['time', 'lat', 'lon'])
-
-                # Preprocess period-of-interest dataset
-                cds_poi_data = cds_poi_data.drop_vars(['number', 'expver'])
-                cds_poi_data = cds_poi_data.rename({{'valid_time': 'time', 'latitude': 'lat', 'longitude': 'lon'}})
-                cds_poi_data = cds_poi_data.resample(time='1ME').sum()                                   # Resample to monthly total data
-                cds_poi_data = cds_poi_data.assign_coords(time=cds_poi_data.time.dt.strftime('%Y-%m-01'))  # Set month day to 01
-                cds_poi_data = cds_poi_data.assign_coords(time=pd.to_datetime(cds_poi_data.time))
-                cds_poi_data['tp'] = cds_poi_data['tp'] / 12                                              # Convert total precipitation to monthly average precipitation
-                cds_poi_data = cds_poi_data.assign_coords(
-                    lat=np.round(cds_poi_data.lat.values, 6),
-                    lon=np.round(cds_poi_data.lon.values, 6),
-                )
-                cds_poi_data = cds_poi_data.sortby(['time', 'lat', 'lon'])
-
-                # Get whole dataset
-                ts_dataset = xr.concat([cds_ref_data, cds_poi_data], dim='time')
-                ts_dataset = ts_dataset.drop_duplicates(dim='time').sortby(['time', 'lat', 'lon'])
-            """),
-            nbf.v4.new_code_cell("""
-                # Compute SPI function
-                def compute_timeseries_spi(monthly_data, spi_ts, nt_return=1):
-                    # Compute SPI index for a time series of monthly data
-                    # REF: https://drought.emergency.copernicus.eu/data/factsheets/factsheet_spi.pdf
-                    # REF: https://mountainscholar.org/items/842b69e8-a465-4aeb-b7ec-021703baa6af [ page 18 to 24 ]
-                    
-                    # SPI calculation needs finite-values and non-zero values
-                    if all([md<=0 for md in monthly_data]):
-                        return 0
-                    if all([np.isnan(md) or md==0 for md in monthly_data]):
-                        return np.nan
-                    
-                    df = pd.DataFrame({{'monthly_data': monthly_data}})
-
-                    # Totalled data over t_scale rolling windows
-                    if spi_ts > 1:
-                        t_scaled_monthly_data = df.rolling(spi_ts).sum().monthly_data.iloc[spi_ts:]
-                    else:
-                        t_scaled_monthly_data = df.monthly_data
-
-                    # Gamma fitted params
-                    a, _, b = stats.gamma.fit(t_scaled_monthly_data, floc=0)
-
-                    # Cumulative probability distribution
-                    G = lambda x: stats.gamma.cdf(x, a=a, loc=0, scale=b)
-
-                    m = (t_scaled_monthly_data==0).sum()
-                    n = len(t_scaled_monthly_data)
-                    q = m / n # zero prob
-
-                    H = lambda x: q + (1-q) * G(x) # zero correction
-
-                    t = lambda Hx: math.sqrt(
-                        math.log(1 /
-                        (math.pow(Hx, 2) if 0<Hx<=0.5 else math.pow(1-Hx, 2))
-                    ))
-
-                    c0, c1, c2 = 2.515517, 0.802853, 0.010328
-                    d1, d2, d3 = 1.432788, 0.189269, 0.001308
-
-                    Hxs = t_scaled_monthly_data[-spi_ts:].apply(H)
-                    txs = Hxs.apply(t)
-
-                    Z = lambda Hx, tx: ( tx - ((c0 + c1*tx + c2*math.pow(tx,2)) / (1 + d1*tx + d2*math.pow(tx,2) + d3*math.pow(tx,3) )) ) * (-1 if 0<Hx<=0.5 else 1)
-
-                    spi_t_indexes = pd.DataFrame(zip(Hxs, txs), columns=['H','t']).apply(lambda x: Z(x.H, x.t), axis=1).to_list()
+    # DOC: Async inference rules (only the ones that may ask the LLM)
+    def _set_args_async_inference_rules(self) -> dict:
+        
+        async def infer_area(**ka):
+            area, needs_confirmation = await utils.abbox_from_area_name(ka['area'])
+            if area is None:
+                self.invalid_args_interrupt({ 'area': f"Could not find the bounding box of {ka['area']}. Please provide it as [min_x, min_y, max_x, max_y] or another area name." })
+            if needs_confirmation and not self.run_state['execution_confirmed']:
+                self.run_state['execution_confirmed'] = False
+            return area
+        
+        return {
+            'area': infer_area
+        }
+        
+    
+    # DOC: The bbox the user confirmed goes back in the tool args, the rerun does not resolve (and ask for) the area name again
+    def _set_args_kept_on_confirmation(self) -> list:
+        return ['area']
+        
+    
+    # DOC: Identical requests reuse the notebook built the first time
+    def _set_artifact_outputs(self) -> dict:
+        return {
+            'jupyter_notebook': True
+        }
+        
+    
+    # DOC: Reply parsers ( i.e.: "1991-2020" → reference_period, "2024-03 to 2025-03" → period_of_interest, "SPI-3 and SPI-12" → spi_timescales ... )
+    def _set_args_reply_parsers(self) -> dict:
+        
+        return {
+            'area': reply_parsers.parse_area,
+            'reference_period': reply_parsers.parse_year_range,
+            'period_of_interest': reply_parsers.parse_month_range,
+            'spi_timescales': reply_parsers.parse_timescales,
+            'jupyter_notebook': lambda text: reply_parsers.parse_path(text, '.ipynb')
+        }
+        
+    
+    # DOC: Notebook cells compiled once (see tools.notebook_template), {params} are filled per request
+    notebook_template: ClassVar[NotebookTemplate] = NotebookTemplate([
+        CellTemplate("""
+            # Section "Dependencies"
 
-                    return np.array(spi_t_indexes[-nt_return]) if nt_return==1 else np.array(spi_t_indexes[-nt_return:])
+            %%capture
 
-                # Compute SPI over each cell
-                month_spi_coverages = []
-                for month in cds_poi_data.time:
-                    month_spi_coverage = xr.apply_ufunc(
-                        lambda tile_timeseries: compute_timeseries_spi(tile_timeseries, spi_ts=spi_ts, nt_return=1),
-                        ts_dataset.sel(time=ts_dataset.time<=month).tp.sortby('time'),
-                        input_core_dims = [['time']],
-                        vectorize = True
-                    )
-                    month_spi_coverages.append((
-                        month.dt.date.item(),
-                        month_spi_coverage
-                    ))
+            import os
+            import math
+            import datetime
+            from dateutil.relativedelta import relativedelta
+            import getpass
 
-                # Create SPI dataset
-                spi_times = [msc[0] for msc in month_spi_coverages]
-                spi_grids = [msc[1] for msc in month_spi_coverages]
+            import numpy as np
+            import pandas as pd
+            !pip install zarr
+            import xarray as xr
 
-                spi_dataset = xr.concat(spi_grids, dim='time').to_dataset()
-                spi_dataset = spi_dataset.assign_coords({{'time': spi_times}})
-                spi_dataset = spi_dataset.rename_vars({{'tp': 'spi'}})
+            import matplotlib.pyplot as plt
 
-                spi_values = spi_dataset.spi.values
-            """),
-            nbf.v4.new_code_cell("""
-                # variable "spi_dataset" is a xarray.Dataset with three dimensions ('time', 'lat', 'lon') and a 'spi' var related to those dimensions
-                display(spi_dataset)
+            from agent import spi   # vectorized whole-grid SPI engine
+            from agent import cds   # cached, concurrent CDS downloads
 
-                # variable "spi_values" is a numpy.array with shape (time, lat, lon) and it is representig numerical values of spi index over each time for each lat-lon cell
-                display(spi_values) 
-            """)
-        ])
+            !pip install "cdsapi>=0.7.4"
+            import cdsapi
+            
+            !pip install cartopy
+            import cartopy.crs as ccrs
+            import cartopy.feature as cfeature
+        """),
+        CellTemplate("""
+            # Section "Parameters"
+
+            spi_ts = {spi_timescales} # accumulation periods in months (SPI-1, SPI-3, ...)
+
+            area = {area} # min_lon, min_lat, max_lon, max_lat
+
+            reference_period = {reference_period} # start_year, end_year
+
+            period_of_interest = {period_of_interest} # start_month, end_month
+
+            cds_client = cdsapi.Client(url='https://cds.climate.copernicus.eu/api', key=getpass.getpass("YOUR CDS-API-KEY")) # CDS client
+        """),
+        CellTemplate("""
+            out_dir = 'tmpdir'
+            os.makedirs(out_dir, exist_ok=True)
+
+            # Local tile cache shared by every area → the bbox is snapped to the ERA5-Land grid and split in 1° tiles, only the tiles (and months) not downloaded yet are requested
+            cds_planner = cds.DownloadPlanner(cds_client, cache_dir=os.path.join(out_dir, 'era5_land__total_precipitation'), tile_size=1.0)
+
+            # Reference period monthly totals (monthly product)
+            cds_ref_data = cds.monthly_totals(cds_planner, area, cds.month_range(f'{{reference_period[0]}}-01', f'{{reference_period[1]}}-12'), dataset='reanalysis-era5-land', variable='total_precipitation', short_name='tp')
+        """),
+        CellTemplate("""
+            # Months to download (the longest SPI timescale needs the previous months too)
+            period_of_interest = (datetime.datetime.strptime(period_of_interest[0], "%Y-%m"), datetime.datetime.strptime(period_of_interest[1], "%Y-%m"))
+            spi_start_date = period_of_interest[0] - relativedelta(months=max(spi_ts)-1)
+
+            # CDS API queries → months already in the local cache are reused, the missing ones are grouped by year and requested concurrently
+            # Published months come from the monthly product, the recent ones are reduced from the hourly data file by file while the other files download
+            cds_poi_data = cds.monthly_totals(cds_planner, area, cds.month_range(spi_start_date, period_of_interest[1]), dataset='reanalysis-era5-land', variable='total_precipitation', short_name='tp')
+            print(f'CDS API queries completed → {{cds_planner.stats}}')
+        """),
+        CellTemplate("""
+            # Reference and period-of-interest datasets are already monthly totals on the same (time, lat, lon) grid
+            poi_months = cds_poi_data.time.values[cds_poi_data.time.values >= np.datetime64(period_of_interest[0])]
+
+            # Get whole dataset
+            ts_dataset = xr.concat([cds_ref_data, cds_poi_data], dim='time')
+            ts_dataset = ts_dataset.drop_duplicates(dim='time').sortby(['time', 'lat', 'lon'])
+
+            # Written to a zarr store chunked like the SPI tiles and reopened lazily → the SPI step reads one tile window at a time instead of keeping the whole cube in memory
+            ts_dataset = spi.open_tiled_source(ts_dataset, os.path.join(out_dir, spi.output_name('tp', area)), tile_size=(64, 64))
+            del cds_ref_data, cds_poi_data
+        """),
+        CellTemplate("""
+            # Compute SPI over the whole grid at once, every timescale from the same accumulation pass. Gamma params are fitted once per calendar month on the reference period and stored, next runs for the same area only transform the new months
+            # REF: https://drought.emergency.copernicus.eu/data/factsheets/factsheet_spi.pdf
+            # The grid is split in (lat, lon) tiles computed on a local process pool, each tile is written straight into its chunk of the output zarr store
+            spi_dataset = spi.spi_tiled(
+                ts_dataset.tp,
+                months = poi_months,
+                reference_period = reference_period,
+                spi_ts = spi_ts,
+                tile_size = (64, 64),
+                output = os.path.join(out_dir, spi.output_name('spi', area)),
+                fit_store = spi.GammaFitStore(),
+                area = area,
+                dataset = 'reanalysis-era5-land'
+            )
+
+            spi_values = spi_dataset.spi.values
+        """),
+        CellTemplate("""
+            # variable "spi_dataset" is a xarray.Dataset with four dimensions ('scale', 'time', 'lat', 'lon') and a 'spi' var related to those dimensions, 'scale' is the accumulation period in months (i.e.: spi_dataset.spi.sel(scale=3) is SPI-3)
+            display(spi_dataset)
+
+            # variable "spi_values" is a numpy.array with shape (scale, time, lat, lon) and it is representig numerical values of spi index for each timescale over each time for each lat-lon cell
+            display(spi_values) 
+        """)
+    ])
         
         
     # DOC: Execute the tool → Build notebook, write it to a file and return the path to the notebook and the zarr output file
@@ -411,20 +331,20 @@ class SPICalculationNotebookTool(BaseAgentTool):
         self,
         area: str | list[float],
         reference_period: tuple = (1981, 2010),
-        period_of_interest: tuple = ((datetime.datetime.now()-dateutil.relativedelta.relativedelta(months=1)).strftime('%Y-%m'), datetime.datetime.now().strftime('%Y-%m')),
+        period_of_interest: tuple = ((datetime.datetime.now().replace(day=1)-datetime.timedelta(days=1)).strftime('%Y-%m'), datetime.datetime.now().strftime('%Y-%m')),
+        spi_timescales: list[int] = None,
         jupyter_notebook: str = None,
     ): 
-        self.prepare_notebook(jupyter_notebook)    
         nb_values = {
             'area': area,
             'reference_period': reference_period,
             'period_of_interest': period_of_interest,
+            'spi_timescales': spi_timescales,
         }
-        for cell in self.notebook.cells:
-            if cell.cell_type in ("markdown", "code"):
-                cell.source = utils.safe_code_lines(cell.source, format_dict=nb_values if cell.metadata.get("need_format", False) else None)
+        notebook = self.notebook_template.new_notebook(nb_values, None if self.run_state.get('new_notebook') else jupyter_notebook)     # INFO: Fresh notebook per call, only the cells with params are formatted
         
-        nbf.write(self.notebook, jupyter_notebook) 
+        import nbformat as nbf
+        nbf.write(notebook, jupyter_notebook) 
         
         return {
             "notebook": jupyter_notebook
@@ -436,7 +356,8 @@ class SPICalculationNotebookTool(BaseAgentTool):
         self, 
         area: str | list[float],
         reference_period: tuple = (1981, 2010),
-        period_of_interest: tuple = ((datetime.datetime.now()-dateutil.relativedelta.relativedelta(months=1)).strftime('%Y-%m'), datetime.datetime.now().strftime('%Y-%m')),
+        period_of_interest: tuple = ((datetime.datetime.now().replace(day=1)-datetime.timedelta(days=1)).strftime('%Y-%m'), datetime.datetime.now().strftime('%Y-%m')),
+        spi_timescales: list[int] = None,
         jupyter_notebook: str = None,
         run_manager: None | Optional[CallbackManagerForToolRun] = None
     ) -> dict:
@@ -446,7 +367,31 @@ class SPICalculationNotebookTool(BaseAgentTool):
                 "area": area,
                 "reference_period": reference_period,
                 "period_of_interest": period_of_interest,
+                "spi_timescales": spi_timescales,
+                "jupyter_notebook": jupyter_notebook
+            },
+            run_manager=run_manager
+        )
+        
+        
+    # DOC: Async AgentTool run → same controls as _run, awaited inference
+    async def _arun(
+        self, 
+        area: str | list[float],
+        reference_period: tuple = (1981, 2010),
+        period_of_interest: tuple = ((datetime.datetime.now().replace(day=1)-datetime.timedelta(days=1)).strftime('%Y-%m'), datetime.datetime.now().strftime('%Y-%m')),
+        spi_timescales: list[int] = None,
+        jupyter_notebook: str = None,
+        run_manager: None | Optional[AsyncCallbackManagerForToolRun] = None
+    ) -> dict:
+        
+        return await super()._arun(
+            tool_args = {
+                "area": area,
+                "reference_period": reference_period,
+                "period_of_interest": period_of_interest,
+                "spi_timescales": spi_timescales,
                 "jupyter_notebook": jupyter_notebook
             },
             run_manager=run_manager
-        )
\ No newline at end of file
+        )
@@ -39,7 +39,7 @@ class ToolInterrupt(Exception):
     def as_dict(self):
         return {
             "tool": self.tool,
-            "type": self.type,
+            "type": ToolInterrupt.ToolInterruptType(self.type).value,     # INFO: Plain str, as_dict is stored in (serialized) graph state
             "reason": self.reason,
             "data": self.data,
         }
\ No newline at end of file
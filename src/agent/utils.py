@@ -4,13 +4,21 @@ import os
 import sys
 import re
 import ast
+import json
 import uuid
+import hashlib
 import tempfile
+import functools
+import threading
+from typing import Optional
 
-from langchain_openai import ChatOpenAI
+from pydantic import BaseModel, Field, create_model, field_validator
 
 from langchain_core.messages import RemoveMessage, AIMessage
 
+from agent.llm_cache import LLMResponseCache
+from agent.artifact_store import ArtifactStore
+
 
 
 
@@ -94,6 +102,34 @@ def safe_code_lines(code, format_dict=None):
         lines = [f'{line}\n' if idx!=len(lines)-1 else f'{line}' for idx,line in enumerate(lines)]
     code = ''.join(lines)
     return code
+
+
+# DOC: Sync / async code paths written once → a step generator holds the shared logic and yields the calls that are awaited in async code, run_steps / arun_steps perform them (an exception of a step is thrown back into the generator) and return its value
+def run_steps(steps, call):
+    """run_steps - value of the step generator, every yielded step is performed with call(step)."""
+    response, error = None, None
+    while True:
+        try:
+            step = steps.throw(error) if error is not None else steps.send(response)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            response, error = call(step), None
+        except Exception as exc:
+            response, error = None, exc
+
+async def arun_steps(steps, call):
+    """arun_steps - run_steps counterpart for async code, call(step) is awaited."""
+    response, error = None, None
+    while True:
+        try:
+            step = steps.throw(error) if error is not None else steps.send(response)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            response, error = await call(step), None
+        except Exception as exc:
+            response, error = None, exc
     
 
 # ENDREGION: [Generic utils]
@@ -102,19 +138,206 @@ def safe_code_lines(code, format_dict=None):
 
 # REGION: [LLM and Tools]
 
-_base_llm = ChatOpenAI(model="gpt-4o-mini")
-
-def ask_llm(role, message, llm=_base_llm, eval_output=False):
-    llm_out = llm.invoke([{"role": role, "content": message}])
-    if eval_output:
-        try: 
-            content = llm_out.content
-            if type(content) is str and content.startswith('```python'):
-                content = content.split('```python')[1].split('```')[0]
-            return ast.literal_eval(content)
-        except: 
-            pass
-    return llm_out.content
+# DOC: Shared LLM client, built on first use → importing agent neither loads the OpenAI SDK nor needs OPENAI_API_KEY
+_llm = None
+_llm_lock = threading.Lock()
+
+def get_base_llm():
+    """get_base_llm - shared ChatOpenAI client built on first use."""
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                from langchain_openai import ChatOpenAI
+                _llm = ChatOpenAI(model="gpt-4o-mini")
+    return _llm
+
+def __getattr__(name):
+    # INFO: utils._base_llm is still available, it is just built on first access
+    if name == '_base_llm':
+        return get_base_llm()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# DOC: Shared store of the artifacts built by tools (disable with ICISK_ARTIFACT_STORE=0, relocate with ICISK_ARTIFACT_STORE_PATH)
+artifact_store = ArtifactStore(
+    db_path = os.environ.get('ICISK_ARTIFACT_STORE_PATH', os.path.join(_temp_dir, 'artifacts.sqlite')),
+    enabled = os.environ.get('ICISK_ARTIFACT_STORE', '1').lower() not in ('0', 'false', 'no')
+)
+
+# DOC: Shared LLM response cache (disable with ICISK_LLM_CACHE=0, relocate with ICISK_LLM_CACHE_PATH)
+llm_cache = LLMResponseCache(
+    db_path = os.environ.get('ICISK_LLM_CACHE_PATH', os.path.join(_temp_dir, 'llm_cache.sqlite')),
+    enabled = os.environ.get('ICISK_LLM_CACHE', '1').lower() not in ('0', 'false', 'no')
+)
+
+def _llm_cache_key(llm, role, message, use_cache):
+    return LLMResponseCache.make_key(LLMResponseCache.model_identity(llm), role, message) if use_cache else None
+
+# DOC: Legacy free text parsing, prefer output_schema (validated) over eval_output
+def _eval_llm_output(content):
+    try: 
+        eval_content = content
+        if type(eval_content) is str and eval_content.startswith('```python'):
+            eval_content = eval_content.split('```python')[1].split('```')[0]
+        return ast.literal_eval(eval_content)
+    except: 
+        return content
+
+def ask_llm(role, message, llm=None, eval_output=False, output_schema=None, retries=None, use_cache=True, cache_ttl=None):
+    """ask_llm - single-message LLM call, answers are cached by (model, role, normalized prompt) unless use_cache is False. With output_schema the answer is a validated instance of it (see ask_llm_structured)."""
+    llm = llm if llm is not None else get_base_llm()
+    if output_schema is not None:
+        return ask_llm_structured(role, message, output_schema, llm=llm, retries=retries, use_cache=use_cache, cache_ttl=cache_ttl)
+    cache_key = _llm_cache_key(llm, role, message, use_cache)
+    content = llm_cache.get(cache_key) if use_cache else None
+    if content is None:
+        llm_out = llm.invoke([{"role": role, "content": message}])
+        content = llm_out.content
+        if use_cache and content:
+            llm_cache.set(cache_key, content, ttl=cache_ttl)
+    return _eval_llm_output(content) if eval_output else content
+
+async def ask_llm_async(role, message, llm=None, eval_output=False, output_schema=None, retries=None, use_cache=True, cache_ttl=None):
+    """ask_llm_async - ask_llm counterpart for async nodes, it awaits the model instead of blocking a worker thread."""
+    llm = llm if llm is not None else get_base_llm()
+    if output_schema is not None:
+        return await ask_llm_structured_async(role, message, output_schema, llm=llm, retries=retries, use_cache=use_cache, cache_ttl=cache_ttl)
+    cache_key = _llm_cache_key(llm, role, message, use_cache)
+    content = llm_cache.get(cache_key) if use_cache else None
+    if content is None:
+        llm_out = await llm.ainvoke([{"role": role, "content": message}])
+        content = llm_out.content
+        if use_cache and content:
+            llm_cache.set(cache_key, content, ttl=cache_ttl)
+    return _eval_llm_output(content) if eval_output else content
+
+
+# DOC: Structured output → the model fills a pydantic schema (function calling), the answer is validated and the call retried with the validation error until it fits
+
+# DOC: Extra attempts after the first invalid answer (override with ICISK_LLM_OUTPUT_RETRIES)
+STRUCTURED_OUTPUT_RETRIES = int(os.environ.get('ICISK_LLM_OUTPUT_RETRIES', 2))
+
+class LLMOutputError(ValueError):
+    """LLMOutputError - the LLM answer did not validate against output_schema after all retries."""
+    
+    def __init__(self, output_schema, errors):
+        """__init__ - output_schema and the validation error of every attempt."""
+        self.output_schema = output_schema
+        self.errors = errors
+        super().__init__(f"LLM output does not match {output_schema.__name__} after {len(errors)} attempts: {errors[-1]}")
+
+
+@functools.cache
+def partial_model(schema):
+    """partial_model - copy of a pydantic model where every field is optional and defaults to None (i.e. args the user may or may not provide)."""
+    fields = {
+        name: (Optional[field.annotation], Field(default=None, title=field.title, description=field.description))
+        for name, field in schema.model_fields.items()
+    }
+    return create_model(f'Partial{schema.__name__}', **fields)
+
+def _structured_messages(role, message, errors):
+    messages = [{"role": role, "content": message}]
+    if len(errors) > 0:
+        messages.append({"role": "system", "content": f"Your previous answer was not valid: {errors[-1]}\nAnswer again, strictly following the output schema."})
+    return messages
+
+# DOC: (instance, error) from a with_structured_output(include_raw=True) result
+def _validated_output(llm_out, output_schema):
+    if llm_out['parsing_error'] is not None:
+        return None, str(llm_out['parsing_error'])
+    if llm_out['parsed'] is None:
+        return None, f"no {output_schema.__name__} was returned."
+    return llm_out['parsed'], None
+
+# DOC: Schemas are keyed by their JSON schema, not by name → models sharing a name (i.e. created per tool) never read each other's answers
+@functools.cache
+def _schema_hash(output_schema):
+    return hashlib.sha256(json.dumps(output_schema.model_json_schema(), sort_keys=True).encode('utf-8')).hexdigest()
+
+def _structured_cache_key(llm, role, message, output_schema, use_cache):
+    return _llm_cache_key(llm, role, f'{message}\n[output_schema: {_schema_hash(output_schema)}]', use_cache)
+
+def _cached_output(cache_key, output_schema):
+    content = llm_cache.get(cache_key) if cache_key is not None else None
+    return try_default(lambda: output_schema.model_validate_json(content), None) if content is not None else None
+
+# DOC: Cache lookup, validation retries and cache write of ask_llm_structured(_async) → yields the messages of each attempt and gets back the raw structured response
+def _ask_llm_structured_steps(llm, role, message, output_schema, retries, use_cache, cache_ttl):
+    cache_key = _structured_cache_key(llm, role, message, output_schema, use_cache)
+    output = _cached_output(cache_key, output_schema)
+    if output is not None:
+        return output
+    errors = []
+    for _ in range(1 + (STRUCTURED_OUTPUT_RETRIES if retries is None else retries)):
+        output, error = _validated_output((yield _structured_messages(role, message, errors)), output_schema)
+        if output is not None:
+            if cache_key is not None:
+                llm_cache.set(cache_key, output.model_dump_json(), ttl=cache_ttl)
+            return output
+        errors.append(error)
+    raise LLMOutputError(output_schema, errors)
+
+def ask_llm_structured(role, message, output_schema, llm=None, retries=None, use_cache=True, cache_ttl=None):
+    """ask_llm_structured - single-message LLM call answered as a validated instance of output_schema, raises LLMOutputError when every attempt is invalid."""
+    llm = llm if llm is not None else get_base_llm()
+    structured_llm = llm.with_structured_output(output_schema, method='function_calling', include_raw=True)
+    return run_steps(_ask_llm_structured_steps(llm, role, message, output_schema, retries, use_cache, cache_ttl), structured_llm.invoke)
+
+async def ask_llm_structured_async(role, message, output_schema, llm=None, retries=None, use_cache=True, cache_ttl=None):
+    """ask_llm_structured_async - ask_llm_structured counterpart for async nodes."""
+    llm = llm if llm is not None else get_base_llm()
+    structured_llm = llm.with_structured_output(output_schema, method='function_calling', include_raw=True)
+    return await arun_steps(_ask_llm_structured_steps(llm, role, message, output_schema, retries, use_cache, cache_ttl), structured_llm.ainvoke)
+
+
+# DOC: Area name → bbox. Gazetteer first, LLM only on misses. Returns (area, needs_confirmation)
+
+class AreaBoundingBox(BaseModel):
+    """AreaBoundingBox - LLM answer to the bbox of an area."""
+    bbox: list[float] = Field(min_length=4, max_length=4, description="Bounding box [min_x, min_y, max_x, max_y] in EPSG:4326 Coordinate Reference System, min_x > max_x when the area crosses the antimeridian (longitude ±180)")
+    
+    @field_validator('bbox')
+    @classmethod
+    def check_bbox(cls, bbox):
+        """check_bbox - ordered [min_x, min_y, max_x, max_y] within EPSG:4326 bounds, min_x > max_x is a bbox wrapped around ±180 (as the gazetteer stores it)."""
+        min_x, min_y, max_x, max_y = bbox
+        if not (-180 <= min_x <= 180 and -180 <= max_x <= 180 and min_x != max_x and -90 <= min_y < max_y <= 90):
+            raise ValueError(f"{bbox} is not a valid [min_x, min_y, max_x, max_y] bounding box in EPSG:4326")
+        return bbox
+
+def _area_bbox_prompt(area):
+    return dict(
+        role = 'system',
+        message = f"""Please provide the bounding box coordinates for the area: {area} with format [min_x, min_y, max_x, max_y] in EPSG:4326 Coordinate Reference System. If the area crosses the antimeridian (longitude ±180) min_x is its western bound and is greater than max_x.""",
+        output_schema = AreaBoundingBox
+    )
+
+def bbox_from_area_name(area):
+    """bbox_from_area_name - area name → (bbox, needs_confirmation). Gazetteer first, LLM only on misses, bbox is None when the area could not be resolved."""
+    if type(area) is not str:
+        return area, False
+    from agent import gazetteer
+    match = gazetteer.lookup(area)
+    if match is not None:
+        return match.bbox, match.method == 'fuzzy' or match.crosses_antimeridian      # INFO: Name was only approximately matched or bbox wraps around ±180 (min_x > max_x), let the user check it
+    try:
+        return ask_llm(**_area_bbox_prompt(area)).bbox, True
+    except LLMOutputError:
+        return None, True       # INFO: Unresolved → the tool asks the user for a bbox
+
+async def abbox_from_area_name(area):
+    """Async version of bbox_from_area_name."""
+    if type(area) is not str:
+        return area, False
+    from agent import gazetteer
+    match = gazetteer.lookup(area)
+    if match is not None:
+        return match.bbox, match.method == 'fuzzy' or match.crosses_antimeridian
+    try:
+        return (await ask_llm_async(**_area_bbox_prompt(area))).bbox, True
+    except LLMOutputError:
+        return None, True
 
 # ENDREGION: [LLM and Tools]
 
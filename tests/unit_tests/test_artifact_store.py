@@ -0,0 +1,58 @@
+import nbformat
+
+from agent import utils
+from agent.artifact_store import ArtifactStore
+from agent.tools import SPICalculationNotebookTool
+
+
+def test_key_is_canonical_and_refcounts_are_kept(tmp_path) -> None:
+    store = ArtifactStore(db_path=str(tmp_path / "artifacts.sqlite"))
+    key = store.make_key("tool", {"area": [6.6, 35.5, 18.5, 47.1], "period": ("2025-01", "2025-02")})
+    assert key == store.make_key("tool", {"period": ["2025-01", "2025-02"], "area": [6.6000000001, 35.5, 18.5, 47.1]})
+    assert key != store.make_key("other_tool", {"area": [6.6, 35.5, 18.5, 47.1], "period": ("2025-01", "2025-02")})
+
+    assert store.acquire(key) is None
+    store.put(key, "tool", {"out": "a.ipynb"}, {"notebook": "a.ipynb"})
+    assert store.acquire(key, args={"out": "b.ipynb"}) is None    # built with other outputs
+    record = store.acquire(key, args={"out": "a.ipynb"})
+    assert record["outputs"] == {"notebook": "a.ipynb"} and record["refcount"] == 2
+
+    assert store.release(key) == 1 and store.release(key) == 0
+    assert [r["key"] for r in store.prune()] == [key]
+    assert store.get(key) is None
+
+    # deleted local files make the record stale
+    store.put(key, "tool", {}, {"notebook": "a.ipynb"})
+    assert store.acquire(key, local_files=[str(tmp_path / "missing.ipynb")]) is None
+    assert store.get(key) is None and store.stats["stale"] == 1
+
+
+def test_repeated_request_reuses_the_notebook(tmp_path, monkeypatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    store = ArtifactStore(db_path=str(tmp_path / "artifacts.sqlite"))
+    monkeypatch.setattr(utils, "artifact_store", store)
+    tool = SPICalculationNotebookTool()
+    executions = []
+    monkeypatch.setattr(tool, "_execute", lambda **ka: executions.append(ka) or SPICalculationNotebookTool._execute(tool, **ka), raising=False)
+
+    def run(**tool_args):
+        with tool.run_context({**tool.new_run_state(), "execution_confirmed": True}):
+            return tool._run(**tool_args)
+
+    first = run(area=[6.6, 35.5, 18.5, 47.1], reference_period=(1991, 2020), period_of_interest=("2025-01", "2025-02"))
+    second = run(area=[6.6, 35.5, 18.5, 47.1], reference_period=[1991, 2020], period_of_interest=["2025-01", "2025-02"])
+    assert first == second and len(executions) == 1
+    assert len(nbformat.read(first["notebook"], as_version=4).cells) == len(tool.notebook_template.cells)    # not rebuilt, no appended cells
+    assert store.get(tool.artifact_key(executions[0]))["refcount"] == 2
+
+    third = run(area=[6.6, 35.5, 18.5, 47.1], reference_period=(1981, 2010), period_of_interest=("2025-01", "2025-02"))
+    assert third["notebook"] != first["notebook"] and len(executions) == 2
+
+    # a pruned record rebuilds the content addressed notebook from scratch, a user given notebook gets the cells appended
+    store.delete(tool.artifact_key(executions[0]))
+    assert run(area=[6.6, 35.5, 18.5, 47.1], reference_period=(1991, 2020), period_of_interest=("2025-01", "2025-02"))["notebook"] == first["notebook"]
+    assert len(nbformat.read(first["notebook"], as_version=4).cells) == len(tool.notebook_template.cells)
+    for _ in range(2):
+        own = run(area=[6.6, 35.5, 18.5, 47.1], period_of_interest=("2025-01", "2025-02"), jupyter_notebook="own.ipynb")
+        store.delete(tool.artifact_key(executions[-1]))
+    assert len(nbformat.read(own["notebook"], as_version=4).cells) == 2 * len(tool.notebook_template.cells)
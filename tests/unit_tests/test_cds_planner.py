@@ -0,0 +1,150 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+from agent import cds
+
+
+class FakeCDS:
+    """ Local stand-in for the CDS API: retrieve() registers a job, its result is served over HTTP (with Range support) """
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.requests = []
+        self.ranges = []
+        self.results = dict()
+        self.lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in fake.results:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = fake.results[self.path]
+                start = 0
+                if "Range" in self.headers:
+                    start = int(self.headers["Range"].split("=")[1].split("-")[0])
+                    fake.ranges.append(start)
+                self.send_response(206 if start > 0 else 200)
+                self.send_header("Content-Length", str(len(body) - start))
+                self.end_headers()
+                self.wfile.write(body[start:])
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def retrieve(self, dataset, request):
+        time.sleep(self.delay)
+        with self.lock:
+            self.requests.append((dataset, request))
+            path = f"/results/{len(self.requests)}.nc"
+        self.results[path] = json.dumps(request).encode("utf-8")
+        return SimpleNamespace(location=f"http://127.0.0.1:{self.server.server_port}{path}")
+
+    def close(self):
+        self.server.shutdown()
+
+
+@pytest.fixture
+def fake_cds():
+    fake = FakeCDS()
+    yield fake
+    fake.close()
+
+
+def test_months_are_coalesced_per_year_and_cached(tmp_path, fake_cds) -> None:
+    planner = cds.DownloadPlanner(fake_cds, cache_dir=str(tmp_path))
+    months = cds.month_range("2023-11", "2024-03")
+
+    files = planner.download("reanalysis-era5-land", "total_precipitation", [6.62, 35.49, 18.51, 47.09], months)
+    assert sorted(files) == months
+    assert len(fake_cds.requests) == 2    # 2023-11..12 and 2024-01..03
+    queries = sorted((request for _, request in fake_cds.requests), key=lambda request: request["year"])
+    assert [(q["year"], q["month"]) for q in queries] == [(["2023"], ["11", "12"]), (["2024"], ["01", "02", "03"])]
+    assert queries[0]["area"] == [47.9, 6.0, 35.0, 18.9]    # 1° tiles covering the bbox
+    assert json.loads(open(files[(2024, 2)][0]).read())["month"] == ["01", "02", "03"]
+
+    # a close bbox snaps to the same tiles → only the new month is requested
+    files = planner.download("reanalysis-era5-land", "total_precipitation", [6.61, 35.45, 18.55, 47.05], cds.month_range("2024-01", "2024-04"))
+    assert len(fake_cds.requests) == 3 and fake_cds.requests[-1][1]["month"] == ["04"]
+    assert planner.stats == {"cached_tile_months": 13 * 13 * 3, "missing_tile_months": 13 * 13 * 6, "requests": 3}
+
+
+def test_overlapping_areas_only_request_the_missing_tiles(tmp_path, fake_cds) -> None:
+    grid = cds.TileGrid(tile_size=1.0)
+    assert grid.tiles([9.95, 45.0, 10.05, 45.3]) == [(9, 45), (10, 45)]
+    assert grid.tile_area((-1, 45)) == (-1.0, 45.0, -0.1, 45.9)
+
+    planner = cds.DownloadPlanner(fake_cds, cache_dir=str(tmp_path))
+    planner.download("reanalysis-era5-land", "total_precipitation", [6.6, 43.5, 13.8, 47.1], [(2024, 1)])     # "Northern Italy"
+    assert len(fake_cds.requests) == 1
+
+    # a smaller area inside it is served by the cache
+    files = planner.download("reanalysis-era5-land", "total_precipitation", [7.3, 44.8, 9.2, 45.9], [(2024, 1)])
+    assert len(fake_cds.requests) == 1 and len(files[(2024, 1)]) == 1
+
+    # a larger one only requests the tiles south of it
+    cached, [request] = planner.plan("reanalysis-era5-land", "total_precipitation", [6.6, 41.2, 13.8, 47.1], [(2024, 1)])
+    assert sum(len(tiles) for _, _, tiles in cached) == 8 * 5
+    assert request.area == (6.0, 41.0, 13.9, 42.9) and len(request.tiles) == 8 * 2
+
+
+def test_areas_across_the_antimeridian_are_split(tmp_path, fake_cds) -> None:
+    fiji = [177.2, -19.2, -179.8, -16.1]
+    assert cds.split_antimeridian(fiji) == [(177.2, -19.2, 179.9, -16.1), (-180.0, -19.2, -179.8, -16.1)]
+    assert cds.TileGrid(tile_size=1.0).tiles(fiji)[:2] == [(177, -20), (178, -20)] and (-180, -20) in cds.TileGrid(tile_size=1.0).tiles(fiji)
+
+    planner = cds.DownloadPlanner(fake_cds, cache_dir=str(tmp_path))
+    _, requests = planner.plan("reanalysis-era5-land", "total_precipitation", fiji, [(2024, 1)])
+    assert sorted(request.area for request in requests) == [(-180.0, -20.0, -179.1, -16.1), (177.0, -20.0, 179.9, -16.1)]
+def test_requests_run_concurrently(tmp_path) -> None:
+    fake = FakeCDS(delay=0.2)
+    try:
+        planner = cds.DownloadPlanner(fake, cache_dir=str(tmp_path), max_workers=4, max_months_per_request=3)
+        start = time.perf_counter()
+        planner.download("reanalysis-era5-land", "total_precipitation", [0, 0, 1, 1], cds.month_range("2024-01", "2024-12"))
+        assert len(fake.requests) == 4
+        assert time.perf_counter() - start < 0.6    # ~ the slowest request, not the sum of 4
+    finally:
+        fake.close()
+
+
+def test_interrupted_download_resumes_without_a_new_request(tmp_path, fake_cds) -> None:
+    planner = cds.DownloadPlanner(fake_cds, cache_dir=str(tmp_path))
+    _, [request] = planner.plan("reanalysis-era5-land", "total_precipitation", [0, 0, 1, 1], [(2024, 1)])
+    body = json.dumps(request.query()).encode("utf-8")
+    fake_cds.results["/results/job.nc"] = body
+
+    target = tmp_path / request.filename
+    (tmp_path / f"{request.filename}.location").write_text(f"http://127.0.0.1:{fake_cds.server.server_port}/results/job.nc")
+    (tmp_path / f"{request.filename}.part").write_bytes(body[:10])
+
+    files = planner.download("reanalysis-era5-land", "total_precipitation", [0, 0, 1, 1], [(2024, 1)])
+    assert files[(2024, 1)] == [str(target)] and target.read_bytes() == body
+    assert fake_cds.requests == [] and fake_cds.ranges == [10]
+    assert not (tmp_path / f"{request.filename}.location").exists()
+
+
+def test_expired_location_is_submitted_again(tmp_path, fake_cds) -> None:
+    planner = cds.DownloadPlanner(fake_cds, cache_dir=str(tmp_path))
+    _, [request] = planner.plan("reanalysis-era5-land", "total_precipitation", [0, 0, 1, 1], [(2024, 1)])
+
+    target = tmp_path / request.filename
+    (tmp_path / f"{request.filename}.location").write_text(f"http://127.0.0.1:{fake_cds.server.server_port}/results/expired.nc")
+    (tmp_path / f"{request.filename}.part").write_bytes(b"stale bytes")
+
+    files = planner.download("reanalysis-era5-land", "total_precipitation", [0, 0, 1, 1], [(2024, 1)])
+    assert files[(2024, 1)] == [str(target)]
+    assert len(fake_cds.requests) == 1 and fake_cds.ranges == []  # stale .part not resumed
+    assert target.read_bytes() == json.dumps(request.query()).encode("utf-8")
+    assert not (tmp_path / f"{request.filename}.location").exists()
+    assert not (tmp_path / f"{request.filename}.part").exists()
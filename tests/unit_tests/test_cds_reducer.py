@@ -0,0 +1,104 @@
+import datetime
+import urllib.error
+
+import numpy as np
+import pytest
+
+pd = pytest.importorskip("pandas")
+xr = pytest.importorskip("xarray")
+pytest.importorskip("scipy")
+
+from agent import cds  # noqa: E402
+
+LAT, LON = np.array([45.1, 45.0]), np.array([9.0, 9.1, 9.2])
+
+
+def hourly_file(path, start, end, value=1.0, lat=LAT, lon=LON):
+    times = pd.date_range(start, end, freq="h", inclusive="left")
+    data = np.full((len(times), len(lat), len(lon)), value, dtype=float)
+    dataset = xr.Dataset({"tp": (("valid_time", "latitude", "longitude"), data)}, coords={"valid_time": times, "latitude": lat, "longitude": lon})
+    dataset.to_netcdf(path, engine="scipy")
+    return str(path)
+
+
+class FakePlanner:
+    """ iter_downloads stand-in serving prepared files, records the (dataset, months) asked """
+
+    resolution = cds.ERA5_LAND_RESOLUTION
+
+    def __init__(self, files, failing=(), error=None):
+        self.files = files
+        self.failing = failing
+        self.error = error or urllib.error.HTTPError("https://cds.example/api", 404, "Not Found", None, None)
+        self.calls = []
+
+    def iter_downloads(self, dataset, variable, area, months):
+        self.calls.append((dataset, list(months)))
+        if dataset in self.failing:
+            raise self.error
+        for file_months, path in self.files[dataset]:
+            if any(month in months for month in file_months):
+                yield file_months, path, None
+
+
+def test_hourly_files_are_folded_month_by_month(tmp_path) -> None:
+    accumulator = cds.MonthlyAccumulator("tp", months=[(2024, 1), (2024, 2)])
+    accumulator.add_file(hourly_file(tmp_path / "a.nc", "2024-01-01", "2024-02-10"))
+    accumulator.add_file(hourly_file(tmp_path / "b.nc", "2024-02-10", "2024-03-05"))   # 2024-03 is not requested
+    assert accumulator.steps == {(2024, 1): 31 * 24, (2024, 2): 29 * 24}
+
+    dataset = accumulator.to_dataset(scale=1 / 12)
+    assert dataset.tp.dims == ("time", "lat", "lon") and list(dataset.lat.values) == [45.0, 45.1]
+    assert list(dataset.time.values) == list(pd.to_datetime(["2024-01-01", "2024-02-01"]).values)
+    np.testing.assert_allclose(dataset.tp.values[:, 0, 0], [31 * 2, 29 * 2])
+
+
+def test_window_is_assembled_from_the_tiles_of_each_file(tmp_path) -> None:
+    grid = cds.TileGrid(tile_size=1.0)
+    west, east = grid.tile_area((9, 45)), grid.tile_area((10, 45))
+    # both files overlap the two tiles, each one is taken only for the tile the cache index points to it
+    a = hourly_file(tmp_path / "a.nc", "2024-01-01", "2024-01-02", value=1.0, lon=np.round(np.arange(9.5, 10.35, 0.1), 1))
+    b = hourly_file(tmp_path / "b.nc", "2024-01-01", "2024-01-02", value=2.0, lon=np.round(np.arange(9.9, 10.55, 0.1), 1))
+
+    accumulator = cds.MonthlyAccumulator("tp", area=[9.8, 45.0, 10.2, 45.1])
+    accumulator.add_file(a, months=[(2024, 1)], tiles=[west])
+    accumulator.add_file(b, months=[(2024, 1)], tiles=[east])
+    dataset = accumulator.to_dataset()
+    assert list(dataset.lon.values) == [9.8, 9.9, 10.0, 10.1, 10.2] and list(dataset.lat.values) == [45.0, 45.1]
+    np.testing.assert_allclose(dataset.tp.values[0, 0], [24, 24, 48, 48, 48])
+
+
+def test_window_across_the_antimeridian(tmp_path) -> None:
+    east = hourly_file(tmp_path / "east.nc", "2024-01-01", "2024-01-02", value=1.0, lon=np.array([179.8, 179.9]))
+    west = hourly_file(tmp_path / "west.nc", "2024-01-01", "2024-01-02", value=2.0, lon=np.array([-180.0, -179.9]))
+
+    accumulator = cds.MonthlyAccumulator("tp", area=[179.8, 45.0, -179.9, 45.1])
+    accumulator.add_file(east)
+    accumulator.add_file(west)
+    dataset = accumulator.to_dataset()
+    assert list(dataset.lon.values) == [-180.0, -179.9, 179.8, 179.9]
+    np.testing.assert_allclose(dataset.tp.values[0, 0], [48, 48, 24, 24])
+def test_published_months_come_from_the_monthly_product(tmp_path) -> None:
+    times = pd.to_datetime(["2024-01-01", "2024-02-01"])
+    product = xr.Dataset({"tp": (("valid_time", "latitude", "longitude"), np.full((2, 2, 3), 0.5))}, coords={"valid_time": times, "latitude": LAT, "longitude": LON})
+    product.to_netcdf(tmp_path / "monthly.nc", engine="scipy")
+    planner = FakePlanner({
+        "reanalysis-era5-land-monthly-means": [(((2024, 1), (2024, 2)), str(tmp_path / "monthly.nc"))],
+        "reanalysis-era5-land": [(((2024, 3),), hourly_file(tmp_path / "march.nc", "2024-03-01", "2024-04-01", value=0.5))],
+    })
+
+    months = cds.month_range("2024-01", "2024-03")
+    dataset = cds.monthly_totals(planner, [9, 45, 9.2, 45.1], months, today=datetime.date(2024, 4, 15))
+    assert planner.calls == [("reanalysis-era5-land-monthly-means", [(2024, 1), (2024, 2)]), ("reanalysis-era5-land", [(2024, 3)])]
+    np.testing.assert_allclose(dataset.tp.values[:, 1, 2], [0.5 * 31, 0.5 * 29, 0.5 * 31 * 24 / 12])
+
+    # monthly product unavailable → every month from the hourly data
+    planner = FakePlanner({"reanalysis-era5-land": [(((2024, 3),), str(tmp_path / "march.nc"))]}, failing={"reanalysis-era5-land-monthly-means"})
+    with pytest.warns(RuntimeWarning, match="not available"):
+        dataset = cds.monthly_totals(planner, [9, 45, 9.2, 45.1], [(2024, 3)], today=datetime.date(2024, 12, 1))
+    assert planner.calls[-1] == ("reanalysis-era5-land", [(2024, 3)]) and dataset.tp.shape == (1, 2, 3)
+
+    # other errors are not a missing product → raised
+    planner = FakePlanner({}, failing={"reanalysis-era5-land-monthly-means"}, error=KeyError("tp"))
+    with pytest.raises(KeyError):
+        cds.monthly_totals(planner, [9, 45, 9.2, 45.1], [(2024, 3)], today=datetime.date(2024, 12, 1))
@@ -0,0 +1,171 @@
+import asyncio
+import operator
+import sqlite3
+from typing import Annotated
+
+from langgraph.graph import END, START, StateGraph
+from langgraph.types import Command, Send, interrupt
+from typing_extensions import TypedDict
+
+from agent.checkpointer import SQLiteCheckpointSaver
+
+
+class CounterState(TypedDict):
+    total: Annotated[int, operator.add]
+    answer: str
+
+
+def build_graph(checkpointer):
+    def add(state):
+        return {"total": 1}
+
+    def ask(state):
+        return {"answer": interrupt("confirm?")}
+
+    builder = StateGraph(CounterState)
+    builder.add_node("add", add)
+    builder.add_node("ask", ask)
+    builder.add_edge(START, "add")
+    builder.add_edge("add", "ask")
+    builder.add_edge("ask", END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+def test_interrupted_run_survives_restart(tmp_path) -> None:
+    db_path = str(tmp_path / "checkpoints.sqlite")
+    config = {"configurable": {"thread_id": "t1"}}
+
+    saver = SQLiteCheckpointSaver(db_path, flush_interval=0)
+    result = build_graph(saver).invoke({"total": 0}, config)
+    assert result["__interrupt__"][0].value == "confirm?"
+    assert saver.stats["pending_rows"] == 0  # interrupt writes are flushed right away
+    saver.close()
+
+    restarted = SQLiteCheckpointSaver(db_path, flush_interval=0)
+    result = build_graph(restarted).invoke(Command(resume="yes"), config)
+    assert result == {"total": 1, "answer": "yes"}
+    restarted.close()
+
+
+def test_keeps_last_checkpoints_and_pages_out_threads(tmp_path) -> None:
+    db_path = str(tmp_path / "checkpoints.sqlite")
+    saver = SQLiteCheckpointSaver(db_path, keep_last=3, max_memory_threads=2, flush_interval=0)
+    graph = build_graph(saver)
+
+    for thread in range(5):
+        config = {"configurable": {"thread_id": f"t{thread}"}}
+        for _ in range(4):
+            graph.invoke({"total": 0}, config)
+            graph.invoke(Command(resume="ok"), config)
+
+    assert saver.stats["memory_threads"] == 2
+    saver.flush()
+    for thread in range(5):
+        config = {"configurable": {"thread_id": f"t{thread}"}}
+        assert len(list(saver.list(config))) == 3
+        assert graph.get_state(config).values == {"total": 4, "answer": "ok"}
+
+    rows = saver._connection().execute("SELECT thread_id, COUNT(*) FROM checkpoints GROUP BY thread_id").fetchall()
+    assert sorted(rows) == [(f"t{thread}", 3) for thread in range(5)]
+    saver.close()
+
+
+class FanOutState(TypedDict):
+    items: Annotated[list, operator.add]
+
+
+class BranchState(FanOutState):
+    item: str
+
+
+def build_fan_out_graph(checkpointer):
+    # parent → Send one subgraph branch per item, every branch is interrupted inside the subgraph
+    def ask(state):
+        return {"items": [f"{state['item']}:{interrupt(state['item'])}"]}
+
+    sub_builder = StateGraph(BranchState)
+    sub_builder.add_node("ask", ask)
+    sub_builder.add_edge(START, "ask")
+    subgraph = sub_builder.compile()
+
+    def fan_out(state):
+        return [Send("branch", {"item": item, "items": []}) for item in ("a", "b", "c")]
+
+    def join(state):
+        return {"items": ["joined"]}
+
+    builder = StateGraph(FanOutState)
+    builder.add_node("branch", subgraph)
+    builder.add_node("join", join)
+    builder.add_conditional_edges(START, fan_out, ["branch"])
+    builder.add_edge("branch", "join")
+    builder.add_edge("join", END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+def test_send_fan_out_into_subgraphs_resumes_after_restart(tmp_path) -> None:
+    db_path = str(tmp_path / "checkpoints.sqlite")
+    config = {"configurable": {"thread_id": "fan-out"}}
+
+    saver = SQLiteCheckpointSaver(db_path, flush_interval=0)
+    result = build_fan_out_graph(saver).invoke({"items": []}, config)
+    assert sorted(i.value for i in result["__interrupt__"]) == ["a", "b", "c"]
+    subgraph_ns = {ns for (ns,) in saver._connection().execute("SELECT DISTINCT checkpoint_ns FROM checkpoints").fetchall()}
+    assert len([ns for ns in subgraph_ns if ns.startswith("branch:")]) == 3  # one namespace per branch
+    saver.close()
+
+    restarted = SQLiteCheckpointSaver(db_path, flush_interval=0)
+    graph = build_fan_out_graph(restarted)
+    interrupts = graph.get_state(config).interrupts
+    result = graph.invoke(Command(resume={i.id: i.value.upper() for i in interrupts}), config)
+    assert sorted(result["items"]) == ["a:A", "b:B", "c:C", "joined"]
+    restarted.close()
+
+
+def test_async_put_and_get_tuple(tmp_path) -> None:
+    db_path = str(tmp_path / "checkpoints.sqlite")
+    config = {"configurable": {"thread_id": "async"}}
+
+    async def run():
+        saver = SQLiteCheckpointSaver(db_path, flush_interval=0)
+        graph = build_graph(saver)
+        result = await graph.ainvoke({"total": 0}, config)
+        assert result["__interrupt__"][0].value == "confirm?"
+        checkpoint_tuple = await saver.aget_tuple(config)
+        assert checkpoint_tuple.checkpoint["channel_values"]["total"] == 1
+        assert [w[1] for w in checkpoint_tuple.pending_writes] == ["__interrupt__"]
+        saver.close()
+
+        restarted = SQLiteCheckpointSaver(db_path, flush_interval=0)
+        result = await build_graph(restarted).ainvoke(Command(resume="yes"), config)
+        assert result == {"total": 1, "answer": "yes"}
+        assert len([c async for c in restarted.alist(config)]) >= 3
+        restarted.close()
+
+    asyncio.run(run())
+
+
+def test_durability_window(tmp_path) -> None:
+    config = {"configurable": {"thread_id": "t1"}}
+
+    def file_rows(db_path):
+        with sqlite3.connect(db_path) as conn:
+            return conn.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+
+    # write-through → every checkpoint is in the file when put returns
+    saver = SQLiteCheckpointSaver(str(tmp_path / "through.sqlite"), flush_interval=0)
+    graph = build_graph(saver)
+    graph.invoke({"total": 0}, config)
+    graph.invoke(Command(resume="yes"), config)
+    assert saver.stats["pending_rows"] == 0 and file_rows(str(tmp_path / "through.sqlite")) == len(list(saver.list(config)))
+    saver.close()
+
+    # batched → rows wait for the flusher (a crash before it runs loses them), close() writes them
+    saver = SQLiteCheckpointSaver(str(tmp_path / "batched.sqlite"), flush_interval=60)
+    graph = build_graph(saver)
+    graph.invoke({"total": 0}, config)
+    pending = saver.stats["pending_rows"]
+    graph.invoke(Command(resume="yes"), config)
+    assert saver.stats["pending_rows"] > 0 and pending == 0  # the interrupt forced a flush, the final steps are pending
+    saver.close()
+    assert file_rows(str(tmp_path / "batched.sqlite")) == 4
@@ -0,0 +1,279 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import START, StateGraph
+from langgraph.types import Command
+from pydantic import BaseModel, Field
+
+from agent.nodes import (
+    BaseToolHandlerNode,
+    BaseToolInterruptArgsConfirmationHandler,
+    BaseToolInterruptNode,
+    BaseToolInterruptOutputConfirmationHandler,
+)
+from agent.nodes.base_tool_interrupt_node import interrupt_reply_model
+from agent.nodes.chatbot import dispatch_tool_calls
+from agent.states.state import State
+from agent.tools import BaseAgentTool, ToolInterrupt
+
+N_THREADS = 32
+
+
+class EchoTool(BaseAgentTool):
+
+    class InputSchema(BaseModel):
+        value: str = Field(title="Value", description="The value to echo")
+
+    def __init__(self, **kwargs):
+        super().__init__(name="echo_tool", description="Echo a value", args_schema=EchoTool.InputSchema, **kwargs)
+
+    def _execute(self, value):
+        time.sleep(0.001)  # let other runs interleave between confirmation and execution
+        return {"value": value}
+
+    async def _aexecute(self, value):
+        await asyncio.sleep(0.001)
+        return {"value": value}
+
+    def _run(self, value, run_manager=None):
+        return super()._run(tool_args={"value": value}, run_manager=run_manager)
+
+    async def _arun(self, value, run_manager=None):
+        return await super()._arun(tool_args={"value": value}, run_manager=run_manager)
+
+
+# The user confirmation comes from the resume payload, no LLM involved
+class AutoArgsConfirmationHandler(BaseToolInterruptArgsConfirmationHandler):
+
+    def _generate_interrupt_message(self):
+        return "Confirm?"
+
+    async def _agenerate_interrupt_message(self):
+        return "Confirm?"
+
+    def _generate_provided_args(self, response):
+        return dict()
+
+    async def _agenerate_provided_args(self, response):
+        return dict()
+
+    def _parse_reply(self, interrupt_message, response):
+        return SimpleNamespace(intent="confirm", args=None)
+
+    async def _aparse_reply(self, interrupt_message, response):
+        return SimpleNamespace(intent="confirm", args=None)
+
+
+class AutoOutputConfirmationHandler(BaseToolInterruptOutputConfirmationHandler):
+
+    def _generate_interrupt_message(self):
+        return "Confirm output?"
+
+    async def _agenerate_interrupt_message(self):
+        return "Confirm output?"
+
+    def _classify_output_confirmation(self, response):
+        return True
+
+    async def _aclassify_output_confirmation(self, response):
+        return True
+
+    def _parse_reply(self, interrupt_message, response):
+        return SimpleNamespace(intent="confirm", args=None)
+
+    async def _aparse_reply(self, interrupt_message, response):
+        return SimpleNamespace(intent="confirm", args=None)
+
+
+# The reply replaces the value (i.e.: "use run-0-edited instead"), a later "yes" confirms it
+class UpdateArgsConfirmationHandler(AutoArgsConfirmationHandler):
+
+    def _parse_reply(self, interrupt_message, response):
+        if response == "yes":
+            return SimpleNamespace(intent="confirm", args=None)
+        return interrupt_reply_model(EchoTool.InputSchema)(intent="update", args={"value": response})
+
+    async def _aparse_reply(self, interrupt_message, response):
+        return self._parse_reply(interrupt_message, response)
+
+
+class EchoState(State):
+    nodes_params: dict
+    tool_call_id: str
+
+
+def build_graph(is_async, checkpointer=True, args_confirmation_handler=AutoArgsConfirmationHandler):
+    tools = {"echo_tool": EchoTool()}
+    builder = StateGraph(EchoState)
+    builder.add_node("echo_handler", BaseToolHandlerNode(
+        state=EchoState,
+        tool_handler_node_name="echo_handler",
+        tool_interrupt_node_name="echo_interrupt",
+        tools=tools,
+        additional_ouput_state={"nodes_params": dict()},
+        is_async=is_async,
+    ))
+    builder.add_node("echo_interrupt", BaseToolInterruptNode(
+        state=EchoState,
+        tool_handler_node_name="echo_handler",
+        tool_interrupt_node_name="echo_interrupt",
+        tools=tools,
+        custom_tool_interupt_handlers={
+            ToolInterrupt.ToolInterruptType.CONFIRM_ARGS: args_confirmation_handler,
+            ToolInterrupt.ToolInterruptType.CONFIRM_OUTPUT: AutoOutputConfirmationHandler,
+        },
+        is_async=is_async,
+    ))
+    builder.add_edge(START, "echo_handler")
+    return builder.compile(checkpointer=MemorySaver() if checkpointer else None)
+
+
+def tool_call_input(i):
+    return {"messages": [AIMessage(content="", tool_calls=[{"name": "echo_tool", "args": {"value": f"run-{i}"}, "id": f"call-{i}"}])]}
+
+
+def interrupt_types(result):
+    return [i.value["interrupt_type"] for i in result.get("__interrupt__", [])]
+
+
+def check_run(i, results):
+    (first, second, final) = results
+    assert interrupt_types(first) == ["CONFIRM_ARGS"]
+    assert interrupt_types(second) == ["CONFIRM_OUTPUT"]
+    tool_message = final["messages"][-1]
+    assert tool_message.tool_call_id == f"call-{i}"
+    assert f"run-{i}" in str(tool_message.content)
+    assert final["nodes_params"] == dict()
+
+
+def test_parallel_threads_do_not_share_tool_state() -> None:
+    graph = build_graph(is_async=False)
+
+    def run(i):
+        config = {"configurable": {"thread_id": f"thread-{i}"}}
+        return (
+            graph.invoke(tool_call_input(i), config),
+            graph.invoke(Command(resume={"response": "yes"}), config),
+            graph.invoke(Command(resume={"response": "yes"}), config),
+        )
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(run, range(N_THREADS)))
+
+    for i, run_results in enumerate(results):
+        check_run(i, run_results)
+
+
+def test_parallel_async_runs_do_not_share_tool_state() -> None:
+    graph = build_graph(is_async=True)
+
+    async def run(i):
+        config = {"configurable": {"thread_id": f"thread-{i}"}}
+        return (
+            await graph.ainvoke(tool_call_input(i), config),
+            await graph.ainvoke(Command(resume={"response": "yes"}), config),
+            await graph.ainvoke(Command(resume={"response": "yes"}), config),
+        )
+
+    async def run_all():
+        return await asyncio.gather(*[run(i) for i in range(N_THREADS)])
+
+    for i, run_results in enumerate(asyncio.run(run_all())):
+        check_run(i, run_results)
+
+
+def test_direct_tool_call_gets_fresh_run_state() -> None:
+    tool = EchoTool()
+    for _ in range(2):
+        try:
+            tool.invoke({"value": "x"})
+            raise AssertionError("execution should wait for confirmation")
+        except ToolInterrupt as tool_interrupt:
+            assert tool_interrupt.type == ToolInterrupt.ToolInterruptType.CONFIRM_ARGS
+
+
+def test_chatbot_fan_out_runs_all_tool_calls_and_joins() -> None:
+    chatbot_calls = []
+
+    async def chatbot(state):
+        chatbot_calls.append(len(state["messages"]))
+        if len(chatbot_calls) == 1:
+            ai_message = AIMessage(content="", id="ai-1", tool_calls=[
+                {"name": "echo_tool", "args": {"value": f"run-{i}"}, "id": f"call-{i}"} for i in range(3)
+            ])
+            return dispatch_tool_calls(state, ai_message, {"echo_tool": "echo_subgraph"})
+        return {"messages": [AIMessage(content="done")]}
+
+    builder = StateGraph(State)
+    builder.add_node("chatbot", chatbot)
+    builder.add_node("echo_subgraph", build_graph(is_async=True, checkpointer=False))
+    builder.add_edge(START, "chatbot")
+    builder.add_edge("echo_subgraph", "chatbot")
+    graph = builder.compile(checkpointer=MemorySaver())
+    config = {"configurable": {"thread_id": "fan-out"}}
+
+    async def run():
+        result = await graph.ainvoke({"messages": [{"role": "user", "content": "echo three values"}]}, config)
+        for expected in ("CONFIRM_ARGS", "CONFIRM_OUTPUT"):
+            # every branch is interrupted in the same step and resumed together
+            assert sorted(interrupt_types(result)) == [expected] * 3
+            assert sorted(i.value["tool_call_id"] for i in result["__interrupt__"]) == ["call-0", "call-1", "call-2"]
+            resume = {i.id: {"response": "yes"} for i in result["__interrupt__"]}
+            result = await graph.ainvoke(Command(resume=resume), config)
+        return result
+
+    result = asyncio.run(run())
+
+    tool_messages = {m.tool_call_id: m for m in result["messages"] if m.type == "tool"}
+    assert sorted(tool_messages) == ["call-0", "call-1", "call-2"]
+    for i in range(3):
+        assert f"run-{i}" in str(tool_messages[f"call-{i}"].content)
+    assert len(chatbot_calls) == 2  # one routing call, then one answer after the join
+    assert result["messages"][-1].content == "done"
+
+
+def test_parallel_interrupted_calls_keep_their_own_arg_updates(monkeypatch) -> None:
+    monkeypatch.setattr(UpdateArgsConfirmationHandler, "interrupt_mode", "structured")
+
+    async def chatbot(state):
+        if not any(m.type == "tool" for m in state["messages"]):
+            ai_message = AIMessage(content="", id="ai-1", tool_calls=[
+                {"name": "echo_tool", "args": {"value": f"run-{i}"}, "id": f"call-{i}"} for i in range(2)
+            ])
+            return dispatch_tool_calls(state, ai_message, {"echo_tool": "echo_subgraph"})
+        return {"messages": [AIMessage(content="done")]}
+
+    builder = StateGraph(State)
+    builder.add_node("chatbot", chatbot)
+    builder.add_node("echo_subgraph", build_graph(is_async=True, checkpointer=False, args_confirmation_handler=UpdateArgsConfirmationHandler))
+    builder.add_edge(START, "chatbot")
+    builder.add_edge("echo_subgraph", "chatbot")
+    graph = builder.compile(checkpointer=MemorySaver())
+    config = {"configurable": {"thread_id": "parallel-updates"}}
+
+    async def run():
+        result = await graph.ainvoke({"messages": [{"role": "user", "content": "echo two values"}]}, config)
+        # both branches are interrupted together and both replies change the value of their own call
+        assert sorted(interrupt_types(result)) == ["CONFIRM_ARGS"] * 2
+        resume = {i.id: {"response": f"{i.value['tool_call_id']}-edited"} for i in result["__interrupt__"]}
+        result = await graph.ainvoke(Command(resume=resume), config)
+        for _ in range(4):
+            if not result.get("__interrupt__"):
+                break
+            result = await graph.ainvoke(Command(resume={i.id: {"response": "yes"} for i in result["__interrupt__"]}), config)
+        return result
+
+    result = asyncio.run(run())
+
+    tool_messages = {m.tool_call_id: m for m in result["messages"] if m.type == "tool"}
+    assert sorted(tool_messages) == ["call-0", "call-1"]
+    for i in range(2):
+        assert f"call-{i}-edited" in str(tool_messages[f"call-{i}"].content)
+    ai_messages = [m for m in result["messages"] if m.id == "ai-1"]
+    assert len(ai_messages) == 1
+    # no branch wrote back its own copy of the shared AI message (the last one would overwrite the others)
+    assert [tool_call["args"]["value"] for tool_call in ai_messages[0].tool_calls] == ["run-0", "run-1"]
@@ -0,0 +1,53 @@
+from agent import gazetteer
+
+
+def test_lookup_exact_prefix_fuzzy_and_miss() -> None:
+    italy = gazetteer.lookup("italy")
+    assert italy.method == "exact" and italy.kind == "country"
+    min_x, min_y, max_x, max_y = italy.bbox
+    assert min_x < 12.5 < max_x and min_y < 41.9 < max_y  # Rome
+    assert min_y < 37.5  # Sicily is part of the country bbox
+
+    assert gazetteer.lookup("Ital").method == "prefix"
+    assert gazetteer.lookup("Itlay").name == "Italy"
+    assert gazetteer.lookup("Itlay").method == "fuzzy"
+    assert gazetteer.lookup("USA").name == "United States"
+    assert gazetteer.lookup("Southern Europe").kind == "region"
+    assert gazetteer.lookup("Xyzzy Land") is None
+
+
+def test_subunit_names_resolve_to_their_region() -> None:
+    uk = gazetteer.lookup("United Kingdom")
+    england = gazetteer.lookup("England")
+    assert england.kind == "region" and england.country == "United Kingdom"
+    assert england.bbox != uk.bbox
+    assert gazetteer.lookup("Brussels").name == "Brussels Capital Region"
+    for name, country in [("Honshu", "Japan"), ("Hainan", "China"), ("North Island", "New Zealand")]:
+        match = gazetteer.lookup(name)
+        assert match.kind == "region" and match.country == country
+
+    assert gazetteer.lookup("UK").name == "United Kingdom"
+    assert gazetteer.lookup("UK").method == "exact"
+
+
+def test_antimeridian_countries_are_wrapped() -> None:
+    for name in ("Russia", "Fiji", "Kiribati"):
+        match = gazetteer.lookup(name)
+        min_x, _, max_x, _ = match.bbox
+        assert match.crosses_antimeridian and min_x > max_x
+        assert (max_x + 360 - min_x) < 360
+    assert not gazetteer.lookup("Italy").crosses_antimeridian
+
+
+def test_cities_and_geographic_features() -> None:
+    paris = gazetteer.lookup("Paris")
+    assert paris.kind == "place" and paris.method == "exact" and paris.country == "France"
+    min_x, min_y, max_x, max_y = paris.bbox
+    assert min_x < 2.35 < max_x and min_y < 48.86 < max_y
+    assert max_x - min_x < 1 and max_y - min_y < 1
+
+    alps = gazetteer.lookup("Alps")
+    assert alps.kind == "region" and alps.bbox[0] < 7.66 < alps.bbox[2]  # Mont Blanc / Matterhorn longitudes
+    mainland = gazetteer.lookup("Continental Spain")
+    assert mainland.name == "Mainland Spain" and mainland.bbox[2] < 4  # Balearic Islands left out
+    assert gazetteer.lookup("Luxembourg").kind == "country"  # a city never takes the name of a country
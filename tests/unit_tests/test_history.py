@@ -0,0 +1,54 @@
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from agent import history
+
+
+def make_turn(i):
+    return [
+        HumanMessage(content=f"request {i}", id=f"h{i}"),
+        AIMessage(content="", id=f"a{i}", tool_calls=[{"name": "code_editor_tool", "args": {"code_request": f"plot {i}"}, "id": f"call-{i}"}]),
+        ToolMessage(content=f"generated code {i}\n" + "x = 1\n" * 800, tool_call_id=f"call-{i}", id=f"t{i}"),
+        AIMessage(content=f"done {i}", id=f"r{i}"),
+    ]
+
+
+class FakeSummarizer:
+
+    def __init__(self):
+        self.prompts = []
+
+    def __call__(self, prompt):
+        self.prompts.append(prompt["message"])
+        return f"summary {len(self.prompts)}"
+
+
+def test_short_history_is_sent_as_is() -> None:
+    messages = make_turn(0)[:1]
+    summarizer = FakeSummarizer()
+    prompt, summary, until = history.compact_history(messages, summarizer=summarizer)
+    assert prompt == messages and summary is None and until is None
+    assert summarizer.prompts == []
+
+
+def test_long_history_is_bounded_and_summarized_incrementally() -> None:
+    messages = [m for i in range(30) for m in make_turn(i)]
+    summarizer = FakeSummarizer()
+    budget = 3000
+
+    prompt, summary, until = history.compact_history(messages, token_budget=budget, window=8, summarizer=summarizer)
+
+    assert history.count_tokens(prompt) <= budget
+    assert isinstance(prompt[0], SystemMessage) and "summary 1" in prompt[0].content
+    assert isinstance(prompt[1], HumanMessage)  # the window never starts with a dangling tool response
+    assert prompt[-1] is messages[-1]  # the latest turn is sent verbatim
+    assert "chars collapsed" in [m for m in prompt if isinstance(m, ToolMessage)][0].content
+    assert until == messages[messages.index(prompt[1]) - 1].id
+
+    messages += make_turn(30)
+    prompt, summary, until = history.compact_history(messages, summary=summary, summary_until=until, token_budget=budget, window=8, summarizer=summarizer)
+
+    assert len(summarizer.prompts) == 2
+    assert "summary 1" in summarizer.prompts[1]  # the cached summary is extended...
+    assert "request 0" not in summarizer.prompts[1]  # ...not rebuilt from the whole thread
+    assert history.count_tokens(prompt) <= budget
+    assert prompt[-1].content == "done 30"
@@ -0,0 +1,61 @@
+import io
+import json
+
+import numpy as np
+import pytest
+
+xr = pytest.importorskip("xarray")
+pytest.importorskip("pandas")
+
+from agent import icisk  # noqa: E402
+
+
+def cube_document(members=(1, 2, 3), shape=(4, 3, 2)):
+    size = int(np.prod(shape))
+    return {
+        "type": "Coverage",
+        "domain": {
+            "type": "Domain",
+            "axes": {
+                "x": {"start": 9.0, "stop": 9.2, "num": shape[1]},
+                "y": {"values": [45.0, 45.5]},
+                "time": {"start": "2025-01-01", "stop": "2025-01-04", "num": shape[0]},
+            },
+        },
+        "parameters": {f"tp_{m}": {"description": {"en": 'a "quoted" [text], {"values": [1, 2]}'}} for m in members},
+        "ranges": {
+            f"tp_{m}": {"type": "NdArray", "axisNames": ["time", "x", "y"], "shape": list(shape), "values": [None if i % 7 == 0 else i * 0.25 + m for i in range(size)]}
+            for m in members
+        },
+    }
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 64, 1 << 20])
+def test_streamed_values_match_json(chunk_size) -> None:
+    document = cube_document()
+    coverage = icisk.decode_coveragejson(io.BytesIO(json.dumps(document, indent=1).encode("utf-8")), chunk_size=chunk_size)
+
+    assert coverage["domain"] == document["domain"] and coverage["parameters"] == document["parameters"]
+    for name, expected in document["ranges"].items():
+        values = coverage["ranges"][name]["values"]
+        assert values.dtype == np.float32 and values.shape == (4, 3, 2)
+        np.testing.assert_array_equal(values, np.array(expected["values"], dtype=float).reshape(4, 3, 2).astype(np.float32))
+
+
+def test_dataset_stacks_members_without_copies() -> None:
+    coverage = icisk.decode_coveragejson(json.dumps(cube_document()).encode("utf-8"), dtype="float64")
+    dataset = icisk.coveragejson_to_dataset(coverage, variable="tp")
+
+    assert dataset.tp.dims == ("model", "time", "lon", "lat") and list(dataset.model.values) == [1, 2, 3]
+    assert dataset.tp.dtype == np.float64 and str(dataset.time.values[-1])[:10] == "2025-01-04"
+    np.testing.assert_allclose(dataset.lon.values, [9.0, 9.1, 9.2])
+    assert np.shares_memory(dataset.tp.values, coverage["ranges"]["tp_1"]["values"])
+
+    per_parameter = icisk.coveragejson_to_dataset(coverage)
+    np.testing.assert_array_equal(per_parameter.tp_2.values, dataset.tp.sel(model=2).values)
+
+
+def test_truncated_body_is_an_error() -> None:
+    body = json.dumps(cube_document()).encode("utf-8")
+    with pytest.raises(ValueError):
+        icisk.decode_coveragejson(body[: len(body) // 2])
@@ -0,0 +1,107 @@
+import datetime
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pytest
+
+xr = pytest.importorskip("xarray")
+pd = pytest.importorskip("pandas")
+pytest.importorskip("requests")
+
+from agent import icisk  # noqa: E402
+
+STEP, DAYS = 0.5, pd.date_range("2025-01-01", "2025-01-10", freq="D")
+
+
+def cell_value(member, day, lon, lat):
+    return member * 1000 + day * 100 + lon + lat * 10
+
+
+class StubCubeServer:
+    """ Local I-CISK cube endpoint: 0.5° grid, 10 daily steps, 2 members. fail_first → the first query gets a 503 """
+
+    def __init__(self, delay=0.0, fail_first=False):
+        self.delay = delay
+        self.fail_first = fail_first
+        self.queries = []
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                query = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+                with stub.lock:
+                    stub.queries.append(query)
+                    failing = stub.fail_first and len(stub.queries) == 1
+                time.sleep(stub.delay)
+                body = b'{"error": "busy"}' if failing else json.dumps(stub.coverage(query)).encode("utf-8")
+                self.send_response(503 if failing else 200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @staticmethod
+    def coverage(query):
+        min_x, min_y, max_x, max_y = map(float, query["bbox"].split(","))
+        lons = np.round(np.arange(np.ceil(min_x / STEP) * STEP, max_x + 1e-9, STEP), 6)
+        lats = np.round(np.arange(np.ceil(min_y / STEP) * STEP, max_y + 1e-9, STEP), 6)
+        days = np.arange(len(DAYS))
+        if "datetime" in query:
+            start, end = [pd.Timestamp(v) for v in query["datetime"].split("/")]
+            days = days[(DAYS >= start) & (DAYS <= end)]
+        ranges = dict()
+        for member in (0, 1):
+            values = cell_value(member, days[:, None, None], lons[None, :, None], lats[None, None, :])
+            ranges[f"tp_{member}"] = {"type": "NdArray", "axisNames": ["time", "x", "y"], "shape": list(values.shape), "values": values.ravel().tolist()}
+        axes = {"x": {"values": lons.tolist()}, "y": {"values": lats.tolist()}, "time": {"values": [str(DAYS[d].date()) for d in days]}}
+        return {"type": "Coverage", "domain": {"type": "Domain", "axes": axes}, "ranges": ranges}
+
+    def close(self):
+        self.server.shutdown()
+
+
+@pytest.fixture
+def stub():
+    server = StubCubeServer(delay=0.2, fail_first=True)
+    yield server
+    server.close()
+
+
+def test_tiles_are_fetched_concurrently_and_stitched(stub) -> None:
+    client = icisk.CubeClient(stub.url, max_workers=8, backoff=0.01)
+    assert len(icisk.split_bbox([6.0, 36.0, 18.0, 47.0], (4.0, 4.0))) == 9
+
+    start = time.perf_counter()
+    dataset = client.cube("forecast", [6.0, 36.0, 18.0, 47.0], period=("2025-01-01", "2025-01-10"), tile_size=(4.0, 4.0), chunk_days=5, variable="tp")
+    elapsed = time.perf_counter() - start
+    assert client.stats == {"tiles": 18, "retries": 1}
+    assert elapsed < 1.0    # 18 tiles of 0.2s each on 8 workers + 1 retry, not 18 * 0.2s
+
+    assert dataset.tp.dims == ("model", "time", "lon", "lat") and dataset.tp.dtype == np.float32
+    assert dataset.sizes == {"model": 2, "time": 10, "lon": 25, "lat": 23}
+    expected = cell_value(dataset.model.values[:, None, None, None], np.arange(10)[None, :, None, None], dataset.lon.values[None, None, :, None], dataset.lat.values[None, None, None, :])
+    np.testing.assert_allclose(dataset.tp.values, expected, rtol=1e-6)
+
+    single = client.cube("forecast", [6.0, 36.0, 18.0, 47.0], tile_size=(100.0, 100.0), variable="tp")
+    xr.testing.assert_allclose(single.tp, dataset.tp)
+
+
+def test_failing_tiles_raise_after_the_retries(stub) -> None:
+    client = icisk.CubeClient(stub.url, retries=0)
+    with pytest.raises(icisk.CubeRequestError) as error:
+        client.fetch("forecast", [6.0, 36.0, 7.0, 37.0], period=(datetime.date(2025, 1, 1), datetime.date(2025, 1, 2)))
+    assert error.value.status_code == 503 and stub.queries[0]["datetime"] == "2025-01-01/2025-01-02"
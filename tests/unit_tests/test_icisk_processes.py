@@ -0,0 +1,135 @@
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+
+from agent import icisk  # noqa: E402
+
+
+class StubProcessesServer:
+    """ Local OGC API Processes endpoint: async jobs run for `duration` seconds, inputs with "fail" end as failed jobs """
+
+    def __init__(self, duration=0.3, busy_submissions=0, busy_polls=0, submit_delay=0.0):
+        self.duration = duration
+        self.busy_submissions = busy_submissions
+        self.busy_polls = busy_polls
+        self.submit_delay = submit_delay
+        self.jobs = dict()
+        self.prefer = []
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def reply(self, status, body=None, headers=None):
+                payload = json.dumps(body).encode("utf-8") if body is not None else b""
+                self.send_response(status)
+                for key, value in (headers or dict()).items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                inputs = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["inputs"]
+                time.sleep(stub.submit_delay)
+                with stub.lock:
+                    stub.prefer.append(self.headers.get("Prefer"))
+                    if stub.busy_submissions > 0:
+                        stub.busy_submissions -= 1
+                        return self.reply(503, {"error": "busy"})
+                    job_id = f"job-{len(stub.jobs)}"
+                    stub.jobs[job_id] = {"inputs": inputs, "started": time.monotonic(), "polls": 0}
+                self.reply(201, {"jobID": job_id, "status": "accepted"}, {"Location": f"/jobs/{job_id}"})
+
+            def do_GET(self):
+                with stub.lock:
+                    if stub.busy_polls > 0:
+                        stub.busy_polls -= 1
+                        return self.reply(503, {"error": "busy"})
+                parts = self.path.split("?")[0].strip("/").split("/")
+                job = stub.jobs[parts[1]]
+                done = time.monotonic() - job["started"] >= stub.duration
+                if len(parts) == 3:
+                    return self.reply(200, {"id": parts[1], "echo": job["inputs"]})
+                job["polls"] += 1
+                status = "running" if not done else ("failed" if "fail" in job["inputs"] else "successful")
+                self.reply(200, {"jobID": parts[1], "status": status, "message": "boom" if status == "failed" else ""})
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+
+
+@pytest.fixture
+def stub():
+    server = StubProcessesServer(busy_polls=1)
+    yield server
+    server.close()
+
+
+def test_jobs_are_submitted_async_and_polled_concurrently(stub) -> None:
+    client = icisk.ProcessesClient(stub.url, max_workers=4, backoff=0.01, poll_interval=0.05)
+    start = time.perf_counter()
+    results = client.execute_many("ingestor-cds-process", [{"variable": v} for v in ("tp", "t2m", "tmin", "tmax")])
+    assert time.perf_counter() - start < 0.9    # ~ one job duration, not four
+
+    assert [r["echo"]["variable"] for r in results] == ["tp", "t2m", "tmin", "tmax"]
+    assert set(stub.prefer) == {"respond-async"}
+    assert client.stats["submitted"] == 4 and client.stats["retries"] == 1
+    assert all(1 < job["polls"] < 10 for job in stub.jobs.values())     # growing interval, not a busy loop
+
+
+def test_failed_and_slow_jobs_raise(stub) -> None:
+    client = icisk.ProcessesClient(stub.url, backoff=0.01, poll_interval=0.05)
+    with pytest.raises(icisk.ProcessJobError) as error:
+        client.execute("ingestor-cds-process", {"fail": True})
+    assert error.value.status == "failed" and "boom" in str(error.value)
+
+    job = client.submit("ingestor-cds-process", {"variable": "tp"})
+    assert job.startswith(stub.url + "/jobs/")
+    with pytest.raises(icisk.ProcessJobError):
+        client.wait(job, max_wait=0.1)
+    assert client.wait(job)["status"] == "successful"
+
+
+def test_execution_is_not_retried_once_sent() -> None:
+    requests = pytest.importorskip("requests")
+    busy = StubProcessesServer(busy_submissions=1)
+    slow = StubProcessesServer(submit_delay=0.5)
+    try:
+        # a 5xx may come after the job was created → no second POST
+        client = icisk.ProcessesClient(busy.url, backoff=0.01)
+        with pytest.raises(icisk.ProcessJobError) as error:
+            client.submit("ingestor-cds-process", {"variable": "tp"})
+        assert error.value.status == 503 and len(busy.prefer) == 1 and client.stats["retries"] == 0
+
+        # same for a read timeout, the server may still be creating the job
+        client = icisk.ProcessesClient(slow.url, backoff=0.01, timeout=0.1)
+        with pytest.raises(requests.Timeout):
+            client.submit("ingestor-cds-process", {"variable": "tp"})
+        assert client.stats["retries"] == 0
+    finally:
+        busy.close()
+        slow.close()
+
+    # connection refused → never sent, retried
+    with socket.socket() as closed:
+        closed.bind(("127.0.0.1", 0))
+        port = closed.getsockname()[1]
+    client = icisk.ProcessesClient(f"http://127.0.0.1:{port}", retries=2, backoff=0.01)
+    with pytest.raises(requests.ConnectionError):
+        client.submit("ingestor-cds-process", {"variable": "tp"})
+    assert client.stats["retries"] == 2
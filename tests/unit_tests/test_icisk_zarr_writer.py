@@ -0,0 +1,68 @@
+import os
+
+import numpy as np
+import pytest
+
+xr = pytest.importorskip("xarray")
+pd = pytest.importorskip("pandas")
+pytest.importorskip("zarr")
+
+from agent import icisk  # noqa: E402
+
+
+def forecast(init_time, lead_days=30, value=None, seed=0):
+    times = pd.date_range(init_time, periods=lead_days, freq="D") + pd.Timedelta(days=1)
+    values = np.random.default_rng(seed).random((3, lead_days, 20, 10)).astype(np.float32) if value is None else np.full((3, lead_days, 20, 10), value, dtype=np.float32)
+    return xr.Dataset(
+        {"tp": (("model", "time", "lon", "lat"), values)},
+        coords={"model": [0, 1, 2], "time": times, "lon": np.round(np.arange(20) * 0.5, 1), "lat": np.round(40 + np.arange(10) * 0.5, 1)},
+    )
+
+
+def chunk_files(store):
+    # data chunks only, the array metadata is updated by every append
+    return {os.path.join(root, f): os.stat(os.path.join(root, f)).st_mtime_ns for root, _, files in os.walk(os.path.join(store, "tp")) for f in files if not f.startswith((".z", "zarr.json"))}
+
+
+def test_chunk_layout_keeps_whole_series_per_tile() -> None:
+    sizes = {"init_time": 1, "model": 51, "lead_time": 215, "lat": 400, "lon": 600}
+    chunks = icisk.chunk_layout(sizes, tuple(sizes), itemsize=4, target_chunk_bytes=4 << 20)
+    assert chunks[:3] == (1, 51, 215) and chunks[3] == chunks[4] == 9
+    assert icisk.chunk_layout({"lat": 5, "lon": 5}, ("lat", "lon")) == (5, 5)
+
+
+@pytest.mark.filterwarnings("ignore::UserWarning")
+def test_new_init_months_are_appended_without_rewriting(tmp_path) -> None:
+    store = str(tmp_path / "forecast.zarr")
+    writer = icisk.ForecastZarrWriter(store, target_chunk_bytes=3 * 30 * 4 * 25)
+
+    assert writer.write(forecast("2025-01-01"), init_time="2025-01-01") == ["created"]
+    first_chunks = chunk_files(store)
+    assert len(first_chunks) == 8
+    assert writer.write(forecast("2025-02-01", lead_days=35, seed=1), init_time="2025-02-01") == ["appended"]
+    assert all(chunk_files(store)[path] == mtime for path, mtime in first_chunks.items())
+
+    dataset = xr.open_zarr(store, consolidated=True)
+    assert dataset.tp.dims == ("init_time", "model", "lead_time", "lon", "lat") and dataset.sizes["init_time"] == 2
+    assert dataset.tp.encoding["chunks"] == (1, 3, 30, 5, 5)
+    assert dataset.tp.encoding["compressors"][0].cname.value == "zstd"
+    np.testing.assert_array_equal(dataset.tp.isel(init_time=1).values, forecast("2025-02-01", lead_days=35, seed=1).tp.values[:, :30])    # aligned to the stored lead times
+
+    # a refreshed month is replaced in place
+    assert writer.write(forecast("2025-01-01", value=7.0), init_time="2025-01-01") == ["replaced"]
+    dataset = xr.open_zarr(store, consolidated=True)
+    assert dataset.sizes["init_time"] == 2 and float(dataset.tp.isel(init_time=0).min()) == 7.0
+
+    with pytest.raises(ValueError):
+        writer.write(forecast("2025-03-01").assign_coords(lon=np.arange(20) + 100.0), init_time="2025-03-01")
+
+    # a backfilled older month would break the init_time order → rejected, the store is untouched
+    with pytest.raises(ValueError, match="earlier"):
+        writer.write(forecast("2024-12-01"), init_time="2024-12-01")
+    dataset = xr.open_zarr(store, consolidated=True)
+    assert dataset.sizes["init_time"] == 2 and dataset.indexes["init_time"].is_monotonic_increasing
+
+    # several months at once are written in init_time order, whatever the order they come in
+    months = xr.concat([icisk.to_lead_time(forecast(month), month) for month in ("2025-04-01", "2025-01-01", "2025-03-01")], dim="init_time")
+    assert writer.write(months.isel(lead_time=slice(0, 30))) == ["replaced", "appended", "appended"]
+    assert list(xr.open_zarr(store, consolidated=True).init_time.dt.month.values) == [1, 2, 3, 4]
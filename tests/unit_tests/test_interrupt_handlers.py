@@ -0,0 +1,131 @@
+import pytest
+from langchain_core.messages import AIMessage
+
+from agent import utils
+from agent.nodes import (
+    BaseToolInterruptArgsConfirmationHandler,
+    BaseToolInterruptInvalidArgsHandler,
+    BaseToolInterruptOutputConfirmationHandler,
+    BaseToolInterruptProvideArgsHandler,
+    base_tool_interrupt_node,
+)
+from agent.nodes.base_tool_interrupt_node import interrupt_reply_model
+from agent.tools import SPICalculationNotebookTool, ToolInterrupt
+
+
+# 'structured' is opt-in (ICISK_INTERRUPT_MODE), the default is the LLM phrased question and reply
+@pytest.fixture(autouse=True)
+def structured_interrupt_mode(monkeypatch):
+    monkeypatch.setattr(base_tool_interrupt_node.BaseToolInterruptHandler, "interrupt_mode", "structured")
+
+
+def interrupt_data(tool, interrupt_type, data):
+    tool_message = AIMessage(content="", id="ai-1", tool_calls=[{"name": tool.name, "args": {"area": None, "jupyter_notebook": None}, "id": "call-1"}])
+    tool_interrupt = ToolInterrupt(interrupt_tool=tool.name, interrupt_type=interrupt_type, interrupt_reason="reason", interrupt_data=data)
+    return {
+        "tool_message": tool_message,
+        "tool_interrupt": tool_interrupt.as_dict,
+        "tool_handler_node": "handler",
+        "tool_call_id": "call-1",
+        "run_state": tool.new_run_state(),
+    }
+
+
+def test_structured_mode_asks_from_template_and_parses_reply_in_one_call(monkeypatch) -> None:
+    tool = SPICalculationNotebookTool()
+    questions, llm_calls = [], []
+
+    def fake_interrupt(payload):
+        questions.append(payload)
+        return {"response": "the country where Madrid is"}
+
+    def fake_ask_llm_structured(role, message, output_schema):
+        llm_calls.append(message)
+        return output_schema(intent="update", args={"area": "Spain"})
+
+    monkeypatch.setattr(base_tool_interrupt_node, "interrupt", fake_interrupt)
+    monkeypatch.setattr(utils, "ask_llm_structured", fake_ask_llm_structured)
+    monkeypatch.setattr(utils, "ask_llm", lambda *a, **ka: (_ for _ in ()).throw(AssertionError("no free text LLM call expected")))
+
+    data = interrupt_data(tool, ToolInterrupt.ToolInterruptType.PROVIDE_ARGS, {"missing_args": ["area"], "args_schema": tool.args_schema_description()})
+    command = BaseToolInterruptProvideArgsHandler().handle(tool, data)
+
+    assert "Area" in questions[0]["content"] and questions[0]["interrupt_type"] == "PROVIDE_ARGS"
+    assert len(llm_calls) == 1 and "the country where Madrid is" in llm_calls[0]
+    assert command["goto"] == "handler"
+    assert command["update"]["nodes_params"]["handler"]["tool_args"]["area"] == "Spain"
+    assert "messages" not in command["update"]  # parallel branches must not return copies of the shared AI message
+    assert data["tool_message"].tool_calls[0]["args"]["area"] is None  # the shared message is not mutated
+
+
+def test_structured_output_confirmation_intents(monkeypatch) -> None:
+    tool = SPICalculationNotebookTool()
+    monkeypatch.setattr(base_tool_interrupt_node, "interrupt", lambda payload: {"response": "..."})
+    data = interrupt_data(tool, ToolInterrupt.ToolInterruptType.CONFIRM_OUTPUT, {"args": {}, "output": {"notebook": "spi.ipynb"}})
+    reply_model = interrupt_reply_model(tool.args_schema)
+
+    for intent, goto in (("confirm", "handler"), ("exit", "__end__")):
+        monkeypatch.setattr(utils, "ask_llm_structured", lambda role, message, output_schema: reply_model(intent=intent))
+        command = BaseToolInterruptOutputConfirmationHandler().handle(tool, data)
+        assert command["goto"] == goto
+        if intent == "confirm":
+            assert command["update"]["nodes_params"]["handler"]["run_state"]["output_confirmed"] is True
+
+
+@pytest.mark.parametrize("area", ["Itlay", "Fiji"])
+def test_confirmed_area_is_not_asked_again(monkeypatch, area) -> None:
+    tool = SPICalculationNotebookTool()
+    monkeypatch.setattr(base_tool_interrupt_node, "interrupt", lambda payload: {"response": "yes"})
+    monkeypatch.setattr(tool, "_execute", lambda **ka: {"notebook": ka["jupyter_notebook"], "area": ka["area"]}, raising=False)
+    monkeypatch.setattr(tool, "_set_artifact_outputs", lambda: dict(), raising=False)
+    tool_args, run_state = {"area": area, "period_of_interest": ("2025-01", "2025-02")}, None
+
+    for _ in range(2):
+        with tool.run_context(run_state) as run_state:
+            try:
+                result = tool._run(**tool_args)
+                break
+            except ToolInterrupt as tool_interrupt:
+                assert tool_interrupt.type == ToolInterrupt.ToolInterruptType.CONFIRM_ARGS
+                data = {**interrupt_data(tool, tool_interrupt.type, tool_interrupt.data), "tool_args": tool_args, "run_state": run_state}
+        command = BaseToolInterruptArgsConfirmationHandler().handle(tool, data)
+        tool_args, run_state = command["update"]["nodes_params"]["handler"]["tool_args"], command["update"]["nodes_params"]["handler"]["run_state"]
+        assert isinstance(tool_args["area"], list)    # the bbox the user confirmed
+    else:
+        pytest.fail("the area confirmation was asked again")
+    assert result["area"] == utils.bbox_from_area_name(area)[0]
+
+
+def test_llm_mode_parses_trivial_replies_without_the_llm(monkeypatch) -> None:
+    tool = SPICalculationNotebookTool()
+    monkeypatch.setattr(base_tool_interrupt_node.BaseToolInterruptHandler, "interrupt_mode", "llm")
+    monkeypatch.setattr(utils, "ask_llm", lambda role, message, output_schema=None: "Shall I proceed?" if output_schema is None else pytest.fail("reply parsed by the LLM"))
+    data = interrupt_data(tool, ToolInterrupt.ToolInterruptType.CONFIRM_ARGS, {"args": {"area": [6.6, 35.5, 18.5, 47.1]}, "args_schema": tool.args_schema_description()})
+
+    monkeypatch.setattr(base_tool_interrupt_node, "interrupt", lambda payload: {"response": "yes"})
+    command = BaseToolInterruptArgsConfirmationHandler().handle(tool, data)
+    assert command["goto"] == "handler" and command["update"]["nodes_params"]["handler"]["run_state"]["execution_confirmed"] is True
+
+    monkeypatch.setattr(base_tool_interrupt_node, "interrupt", lambda payload: {"response": "cancel"})
+    assert BaseToolInterruptArgsConfirmationHandler().handle(tool, data)["goto"] == "__end__"
+
+
+def test_unparsable_llm_answers_ask_the_user_again(monkeypatch) -> None:
+    tool = SPICalculationNotebookTool()
+
+    def invalid_output(role, message, output_schema=None):
+        if output_schema is None:
+            return "Which area?"
+        raise utils.LLMOutputError(output_schema, ["invalid"])
+
+    monkeypatch.setattr(utils, "ask_llm", invalid_output)
+    with tool.run_context():
+        with pytest.raises(ToolInterrupt) as tool_interrupt:
+            tool._run(area="Xyzzy Land", period_of_interest=("2025-01", "2025-02"))
+    assert tool_interrupt.value.type == ToolInterrupt.ToolInterruptType.INVALID_ARGS and "area" in tool_interrupt.value.data["invalid_args"]
+
+    monkeypatch.setattr(base_tool_interrupt_node.BaseToolInterruptHandler, "interrupt_mode", "llm")
+    monkeypatch.setattr(base_tool_interrupt_node, "interrupt", lambda payload: {"response": "somewhere near the big lake"})
+    data = interrupt_data(tool, tool_interrupt.value.type, tool_interrupt.value.data)
+    command = BaseToolInterruptInvalidArgsHandler().handle(tool, data)
+    assert command["goto"] == "handler" and command["update"]["nodes_params"]["handler"]["tool_args"] == {"area": None, "jupyter_notebook": None}
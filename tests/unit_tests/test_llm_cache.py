@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+from agent import utils
+from agent.llm_cache import LLMResponseCache
+
+
+class FakeLLM:
+    model_name = "fake-model"
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        return SimpleNamespace(content=self.answer)
+
+
+def test_ask_llm_serves_repeated_prompts_from_cache(tmp_path, monkeypatch) -> None:
+    cache = LLMResponseCache(db_path=str(tmp_path / "cache.sqlite"))
+    monkeypatch.setattr(utils, "llm_cache", cache)
+    llm = FakeLLM("[6.6, 35.5, 18.5, 47.1]")
+
+    first = utils.ask_llm(role="system", message="bounding box for Italy", llm=llm, eval_output=True)
+    second = utils.ask_llm(role="system", message="  bounding box for Italy\n\n", llm=llm, eval_output=True)
+
+    assert first == second == [6.6, 35.5, 18.5, 47.1]
+    assert llm.calls == 1
+    assert cache.stats["memory_hits"] == 1 and cache.stats["misses"] == 1
+
+
+def test_ask_llm_cache_opt_out(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(utils, "llm_cache", LLMResponseCache(db_path=str(tmp_path / "cache.sqlite")))
+    llm = FakeLLM("some code")
+
+    utils.ask_llm(role="system", message="write code", llm=llm, use_cache=False)
+    utils.ask_llm(role="system", message="write code", llm=llm, use_cache=False)
+
+    assert llm.calls == 2
+
+
+def test_disk_tier_and_ttl(tmp_path) -> None:
+    db_path = str(tmp_path / "cache.sqlite")
+    key = LLMResponseCache.make_key(["fake-model", None], "system", "hello")
+
+    LLMResponseCache(db_path=db_path).set(key, "world")
+    LLMResponseCache(db_path=db_path).set("expired", "value", ttl=-1)
+
+    cache = LLMResponseCache(db_path=db_path)
+    assert cache.get(key) == "world"
+    assert cache.get("expired") is None
+    assert cache.stats["disk_hits"] == 1 and cache.stats["misses"] == 1
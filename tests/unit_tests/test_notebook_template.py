@@ -0,0 +1,52 @@
+import ast
+
+import nbformat
+
+from agent.tools import CDSForecastNotebookTool, SPICalculationNotebookTool
+from agent.tools.notebook_template import CellTemplate, NotebookTemplate
+
+CDS_VALUES = {
+    "forecast_variables": ["2m_temperature"], "area": [6.6, 35.5, 18.5, 47.1], "init_time": "2025-01-01", "lead_time": "2025-03-01",
+    "zarr_output": "out.zarr", "cds_varname": "2m_temperature", "icisk_varname": "t2m",
+}
+SPI_VALUES = {"area": [6.6, 35.5, 18.5, 47.1], "reference_period": (1981, 2010), "period_of_interest": ("2025-01", "2025-02"), "spi_timescales": [1, 3]}
+
+
+def python_source(cell):
+    # notebook magics and shell escapes are not python
+    return "\n".join(line for line in cell.source.split("\n") if not line.lstrip().startswith(("%", "!")))
+
+
+def test_static_cells_are_compiled_once_and_params_rendered_per_call() -> None:
+    template = NotebookTemplate([
+        CellTemplate("""
+            import os
+            data = {{'a': 1}}
+        """),
+        CellTemplate("""
+            area = {area}
+            start = '{period[0]}'
+        """),
+    ])
+    assert template.fields == {"area", "period"}
+    assert template.cells[0].render(None).rstrip() == "import os\ndata = {'a': 1}"
+
+    first = template.new_notebook({"area": [1, 2, 3, 4], "period": ("2025-01", "2025-02")})
+    second = template.new_notebook({"area": None, "period": ("2024-01", "2024-02")})
+    assert first is not second and first.cells[0] is not second.cells[0]
+    assert first.cells[1].source.rstrip() == "area = [1, 2, 3, 4]\nstart = '2025-01'"
+    nbformat.validate(first)
+
+
+def test_tool_notebooks_render_to_valid_python(tmp_path) -> None:
+    for tool, values in ((CDSForecastNotebookTool, CDS_VALUES), (SPICalculationNotebookTool, SPI_VALUES)):
+        notebook = tool.notebook_template.new_notebook(values)
+        nbformat.validate(notebook)
+        for cell in notebook.cells:
+            ast.parse(python_source(cell))  # no leftover {{ }} or unformatted {params}
+
+    # an existing notebook keeps its cells and only gets the new ones appended
+    path = str(tmp_path / "spi.ipynb")
+    nbformat.write(SPICalculationNotebookTool.notebook_template.new_notebook(SPI_VALUES), path)
+    appended = SPICalculationNotebookTool.notebook_template.new_notebook(SPI_VALUES, path)
+    assert len(appended.cells) == 2 * len(SPICalculationNotebookTool.notebook_template.cells)
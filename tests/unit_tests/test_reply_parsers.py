@@ -0,0 +1,66 @@
+import datetime
+
+from agent.nodes import (
+    BaseToolInterruptArgsConfirmationHandler,
+    BaseToolInterruptProvideArgsHandler,
+    base_tool_interrupt_node,
+)
+from agent.tools import (
+    CDSForecastNotebookTool,
+    SPICalculationNotebookTool,
+    ToolInterrupt,
+    reply_parsers,
+)
+
+from .test_interrupt_handlers import interrupt_data, structured_interrupt_mode  # noqa: F401
+
+TODAY = datetime.date(2025, 3, 14)
+
+
+def test_value_parsers() -> None:
+    assert reply_parsers.parse_bbox("use [12, 52, 14.5, 53]")[0] == [12.0, 52.0, 14.5, 53.0]
+    assert reply_parsers.parse_bbox("52, 12, 14, 53") is None  # min_y > max_y
+    assert reply_parsers.parse_year_range("from 1991 to 2020")[0] == (1991, 2020)
+    assert reply_parsers.parse_date("no, last month", today=TODAY) == ("2025-02-01", "last month")
+    assert reply_parsers.parse_date("2024-11-03")[0] == "2024-11-03"
+    assert reply_parsers.parse_date("2024-03 and 2024-04") is None
+    assert reply_parsers.parse_month_range("2024-03 to last month", today=TODAY)[0] == ("2024-03", "2025-02")
+    assert reply_parsers.parse_timescales("SPI-3 and SPI-12")[0] == [3, 12]
+    assert reply_parsers.parse_timescales("1, 3, 6 and 12 months")[0] == [1, 3, 6, 12]
+    assert reply_parsers.parse_aliases("precipitation, max temperature", CDSForecastNotebookTool.InputForecastVariable.from_str)[0] == ["total_precipitation", "max_temperature"]
+
+
+def test_fast_reply_intents() -> None:
+    parsers = SPICalculationNotebookTool()._set_args_reply_parsers()
+    assert reply_parsers.fast_parse_reply("Yes, go ahead!", parsers) == ("confirm", {})
+    assert reply_parsers.fast_parse_reply("cancel please", parsers) == ("exit", {})
+    assert reply_parsers.fast_parse_reply("no, use 1991-2020", parsers) == ("update", {"reference_period": (1991, 2020)})
+    assert reply_parsers.fast_parse_reply("no", parsers) is None
+    assert reply_parsers.fast_parse_reply("yes but only the wet season", parsers) is None
+    # "2024-03" fits both init_time and lead_time → the LLM decides
+    cds_parsers = CDSForecastNotebookTool()._set_args_reply_parsers()
+    assert reply_parsers.fast_parse_reply("2024-03", cds_parsers) is None
+    assert reply_parsers.fast_parse_reply("2024-03", cds_parsers, candidate_args=["init_time"]) == ("update", {"init_time": "2024-03-01"})
+
+
+def test_handlers_skip_llm_for_trivial_replies(monkeypatch) -> None:
+    tool = SPICalculationNotebookTool()
+    llm_calls = []
+    monkeypatch.setattr(base_tool_interrupt_node.BaseToolInterruptHandler, "_parse_reply", lambda self, *a: llm_calls.append(a))
+    reply_parsers.reset_metrics()
+
+    monkeypatch.setattr(base_tool_interrupt_node, "interrupt", lambda payload: {"response": "ok, but with 1991-2020"})
+    data = interrupt_data(tool, ToolInterrupt.ToolInterruptType.CONFIRM_ARGS, {"args": {}})
+    command = BaseToolInterruptArgsConfirmationHandler().handle(tool, data)
+    assert command["update"]["nodes_params"]["handler"]["tool_args"]["reference_period"] == (1991, 2020)
+
+    # a bare "yes" does not provide the missing area
+    monkeypatch.setattr(base_tool_interrupt_node, "interrupt", lambda payload: {"response": "yes"})
+    data = interrupt_data(tool, ToolInterrupt.ToolInterruptType.PROVIDE_ARGS, {"missing_args": ["area"], "args_schema": tool.args_schema_description()})
+    try:
+        BaseToolInterruptProvideArgsHandler().handle(tool, data)
+    except AttributeError:
+        pass  # the fake LLM returns None
+    assert len(llm_calls) == 1
+
+    assert reply_parsers.metrics() == {"fast": 1, "fast:update": 1, "llm": 1, "llm:PROVIDE_ARGS": 1, "fast_ratio": 0.5}
@@ -0,0 +1,168 @@
+import datetime
+import math
+
+import numpy as np
+import pytest
+
+stats = pytest.importorskip("scipy.stats")
+pd = pytest.importorskip("pandas")
+xr = pytest.importorskip("xarray")
+
+from agent import spi  # noqa: E402
+
+
+def reference_spi(monthly_data):
+    # per-cell SPI-1 of the previous notebook (scipy MLE, pandas row by row)
+    if all(md <= 0 for md in monthly_data):
+        return 0
+    if all(np.isnan(md) or md == 0 for md in monthly_data):
+        return np.nan
+    series = pd.Series(monthly_data)
+    a, _, b = stats.gamma.fit(series, floc=0)
+    q = (series == 0).sum() / len(series)
+    H = q + (1 - q) * stats.gamma.cdf(series.iloc[-1], a=a, loc=0, scale=b)
+    t = math.sqrt(math.log(1 / (H ** 2 if 0 < H <= 0.5 else (1 - H) ** 2)))
+    Z = t - (2.515517 + 0.802853 * t + 0.010328 * t ** 2) / (1 + 1.432788 * t + 0.189269 * t ** 2 + 0.001308 * t ** 3)
+    return -Z if 0 < H <= 0.5 else Z
+
+
+def random_cube(n_time=240, n_lat=6, n_lon=7, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.gamma(rng.uniform(0.5, 5, (1, n_lat, n_lon)), rng.uniform(10, 100, (1, n_lat, n_lon)), size=(n_time, n_lat, n_lon))
+
+
+def test_whole_grid_fit_matches_per_cell_scipy() -> None:
+    values = random_cube()
+    values[:, 0, 0] = 0.0       # dry cell
+    values[:, 0, 1] = np.nan    # sea cell
+
+    expected = np.array([[reference_spi(values[:, i, j]) for j in range(values.shape[2])] for i in range(values.shape[1])])
+    result = spi.compute_spi(values)[-1]
+    np.testing.assert_allclose(result, expected, atol=1e-6, equal_nan=True)
+
+    # Thom estimate alone is close enough for a quick look
+    np.testing.assert_allclose(spi.compute_spi(values, newton_steps=0)[-1], expected, atol=0.05, equal_nan=True)
+
+
+def test_accumulate_is_a_rolling_sum_with_gaps() -> None:
+    values = random_cube(n_time=30, n_lat=2, n_lon=2)
+    values[10, 1, 1] = np.nan
+    expected = pd.DataFrame(values.reshape(30, -1)).rolling(3).sum().values.reshape(values.shape)
+    np.testing.assert_allclose(spi.accumulate(values, 3), expected, equal_nan=True)
+
+
+def test_spi_for_months_fits_on_history_up_to_each_month() -> None:
+    values = random_cube(n_time=120)
+    times = pd.date_range("2015-01-01", periods=120, freq="MS")
+    data = xr.DataArray(values, dims=("time", "lat", "lon"), coords={"time": times, "lat": np.arange(6), "lon": np.arange(7)})
+    months = times[-3:]
+
+    dataset = spi.spi_for_months(data.transpose("lat", "lon", "time"), months=months.values)
+    assert dataset.spi.dims == ("time", "lat", "lon") and list(dataset.time.values) == list(months.values)
+    for k, month in enumerate(months):
+        expected = [[reference_spi(values[:len(times) - 2 + k, i, j]) for j in range(7)] for i in range(6)]
+        np.testing.assert_allclose(dataset.spi.values[k], expected, atol=1e-6)
+
+
+def test_reference_fit_is_stored_once_and_reused(tmp_path) -> None:
+    values = random_cube(n_time=132)
+    times = pd.date_range("2014-01-01", periods=132, freq="MS")
+    data = xr.DataArray(values, dims=("time", "lat", "lon"), coords={"time": times, "lat": np.arange(6), "lon": np.arange(7)})
+    area, reference_period = [6.6, 35.5, 18.5, 47.1], (2014, 2023)
+
+    store = spi.GammaFitStore(root_dir=str(tmp_path))
+    key = store.make_key(area, reference_period, 3)
+    assert key == store.make_key(tuple(area), list(reference_period), 3)
+    first = spi.spi_from_reference(data, months=times[-12:-6].values, reference_period=reference_period, spi_ts=3, fit_store=store, area=area)
+    assert store.stats["writes"] == 1
+
+    # per calendar month fit on the reference years only
+    in_reference = times.year <= 2023
+    params = spi.fit_monthly_gamma(values[in_reference], times.month[in_reference], scale=3)
+    expected = spi.spi(spi.accumulate(values, 3)[-12:-6], spi.select_months(params, times.month[-12:-6]))
+    np.testing.assert_allclose(first.spi.values, expected)
+
+    # a new process gets the params from disk, next months are only transformed
+    other_store = spi.GammaFitStore(root_dir=str(tmp_path))
+    update = spi.spi_from_reference(data, months=times[-6:].values, reference_period=reference_period, spi_ts=3, fit_store=other_store, area=area)
+    assert other_store.stats == {"memory_hits": 0, "disk_hits": 1, "misses": 0, "writes": 0}
+    assert list(update.time.values) == list(times[-6:].values)
+    assert other_store.get(key, grid_shape=(5, 7)) is None    # another grid is fitted again
+
+
+def test_fit_key_has_the_dataset_and_skips_incomplete_periods(tmp_path) -> None:
+    area, today = [6.6, 35.5, 18.5, 47.1], datetime.date(2024, 6, 1)
+    store = spi.GammaFitStore(root_dir=str(tmp_path))
+    key = store.make_key(area, (1991, 2020), 3, today=today)
+    assert key == store.make_key(area, (1991, 2020), 3, dataset=spi.DEFAULT_FIT_DATASET, today=today)
+    assert key != store.make_key(area, (1991, 2020), 3, dataset="reanalysis-era5-single-levels", today=today)
+    assert store.make_key(area, (1995, 2024), 3, today=today) is None
+
+    values = random_cube(n_time=36)
+    times = pd.date_range(f"{datetime.date.today().year - 2}-01-01", periods=36, freq="MS")
+    data = xr.DataArray(values, dims=("time", "lat", "lon"), coords={"time": times, "lat": np.arange(6), "lon": np.arange(7)})
+    spi.spi_from_reference(data, months=times[-3:].values, reference_period=(times.year[0], times.year[-1]), spi_ts=1, fit_store=store, area=area)
+    assert store.stats["writes"] == 0 and list(tmp_path.glob("*.npz")) == []
+
+
+def test_timescales_come_from_one_pass_with_a_scale_dimension() -> None:
+    values = random_cube(n_time=120)
+    times = pd.date_range("2015-01-01", periods=120, freq="MS")
+    data = xr.DataArray(values, dims=("time", "lat", "lon"), coords={"time": times, "lat": np.arange(6), "lon": np.arange(7)})
+
+    scales = [1, 3, 6, 12, 24]
+    np.testing.assert_allclose(spi.accumulate_scales(values, scales), np.stack([spi.accumulate(values, s) for s in scales]), equal_nan=True)
+
+    dataset = spi.spi_from_reference(data, months=times[-6:].values, reference_period=(2015, 2023), spi_ts=scales)
+    assert dataset.spi.dims == ("scale", "time", "lat", "lon") and list(dataset.scale.values) == scales
+    for scale in scales:
+        single = spi.spi_from_reference(data, months=times[-6:].values, reference_period=(2015, 2023), spi_ts=scale)
+        np.testing.assert_allclose(dataset.spi.sel(scale=scale).values, single.spi.values)
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_tiled_execution_matches_the_whole_grid(tmp_path, executor) -> None:
+    values = random_cube(n_time=120, n_lat=10, n_lon=9)
+    times = pd.date_range("2015-01-01", periods=120, freq="MS")
+    data = xr.DataArray(values, dims=("time", "lat", "lon"), coords={"time": times, "lat": np.arange(10.0), "lon": np.arange(9.0)})
+    months, scales = times[-6:].values, [1, 3, 12]
+
+    expected = spi.spi_from_reference(data, months=months, reference_period=(2015, 2023), spi_ts=scales)
+    assert sum(1 for _ in spi.iter_tiles((10, 9), (4, 4))) == 9
+
+    in_memory = spi.spi_tiled(data, months=months, reference_period=(2015, 2023), spi_ts=scales, tile_size=(4, 4), executor=executor, max_workers=2)
+    np.testing.assert_allclose(in_memory.spi.values, expected.spi.values, rtol=1e-5)
+
+    if executor == "thread":
+        pytest.importorskip("zarr")
+        store = spi.GammaFitStore(root_dir=str(tmp_path / "fits"))
+        written = spi.spi_tiled(data, months=months, reference_period=(2015, 2023), spi_ts=scales, tile_size=(4, 4), executor=executor, max_workers=2,
+                                output=str(tmp_path / "spi.zarr"), fit_store=store, area=[0, 0, 8, 9])
+        assert written.spi.dims == ("scale", "time", "lat", "lon") and written.spi.encoding["chunks"] == (3, 6, 4, 4)
+        np.testing.assert_allclose(written.spi.values, expected.spi.values, rtol=1e-5)
+        assert len(list((tmp_path / "fits").glob("*.npz"))) == 9 * len(scales)
+
+
+def test_tiled_source_is_read_lazily_tile_by_tile(tmp_path) -> None:
+    pytest.importorskip("zarr")
+    values = random_cube(n_time=120, n_lat=10, n_lon=9)
+    times = pd.date_range("2015-01-01", periods=120, freq="MS")
+    data = xr.DataArray(values, dims=("time", "lat", "lon"), coords={"time": times, "lat": np.arange(10.0), "lon": np.arange(9.0)}, name="tp")
+    months = times[-6:].values
+
+    source = spi.open_tiled_source(data.isel(time=slice(None, None, -1)), str(tmp_path / "tp.zarr"), tile_size=(4, 4))
+    assert source.name == "tp" and not source.variable._in_memory
+    assert source.encoding["chunks"] == (120, 4, 4)
+
+    expected = spi.spi_from_reference(data, months=months, reference_period=(2015, 2023), spi_ts=3)
+    tiled = spi.spi_tiled(source, months=months, reference_period=(2015, 2023), spi_ts=3, tile_size=(4, 4), executor="thread", max_workers=2)
+    np.testing.assert_allclose(tiled.spi.values, expected.spi.values, rtol=1e-5)
+    assert not source.variable._in_memory
+
+
+def test_output_name_is_filesystem_safe() -> None:
+    for area in ([10.5, 44.0, 12.25, 46.0], "Emilia-Romagna / Italy", ["Po valley", "Lake Garda"]):
+        name = spi.output_name("spi", area)
+        assert name.startswith("spi__") and name.endswith(".zarr")
+        assert all(c.isalnum() or c in "_." for c in name)
+    assert spi.output_name("spi", [10.5, 44.0, 12.25, 46.0]) != spi.output_name("spi", [10.5, 44.0, 12.25, 46.5])
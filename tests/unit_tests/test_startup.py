@@ -0,0 +1,32 @@
+import json
+import os
+import subprocess
+import sys
+
+# Heavy modules that must stay out of `import agent` (LLM client, notebook building)
+DEFERRED_MODULES = ("langchain_openai", "openai", "nbformat", "dateutil")
+
+IMPORT_SCRIPT = """
+import sys, time, json
+start = time.perf_counter()
+import agent
+from agent import utils
+print(json.dumps({
+    "seconds": time.perf_counter() - start,
+    "loaded": [m for m in %r if m in sys.modules],
+    "llm_built": utils._llm is not None,
+}))
+""" % (DEFERRED_MODULES,)
+
+
+def test_cold_import_is_lazy_and_fast(tmp_path) -> None:
+    env = {key: value for key, value in os.environ.items() if key != "OPENAI_API_KEY"}  # no credentials needed to import
+    env["ICISK_CHECKPOINT_PATH"] = str(tmp_path / "checkpoints.sqlite")
+    budget = float(os.environ.get("ICISK_IMPORT_BUDGET_S", 5))
+
+    out = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], env=env, capture_output=True, text=True, check=True)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+
+    assert result["loaded"] == []
+    assert result["llm_built"] is False
+    assert result["seconds"] < budget, f"cold import took {result['seconds']:.2f}s (budget {budget}s)"
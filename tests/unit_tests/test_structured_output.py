@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from agent import utils
+from agent.llm_cache import LLMResponseCache
+
+
+class FakeStructuredLLM:
+    """ Answers with the next tool call args, validated like with_structured_output(include_raw=True) does """
+    model_name = "fake-model"
+
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.calls = []
+
+    def with_structured_output(self, schema, method, include_raw):
+        assert include_raw
+
+        def invoke(messages):
+            self.calls.append(messages)
+            args = self.answers.pop(0)
+            try:
+                return {"raw": args, "parsed": schema.model_validate(args), "parsing_error": None}
+            except Exception as e:
+                return {"raw": args, "parsed": None, "parsing_error": e}
+
+        async def ainvoke(messages):
+            return invoke(messages)
+
+        return type("StructuredLLM", (), {"invoke": staticmethod(invoke), "ainvoke": staticmethod(ainvoke)})
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "llm_cache", LLMResponseCache(db_path=str(tmp_path / "cache.sqlite")))
+
+
+def test_invalid_output_is_retried_with_the_validation_error() -> None:
+    llm = FakeStructuredLLM([{"bbox": [6.6, 47.1, 18.5, 35.5]}, {"bbox": [6.6, 35.5, 18.5, 47.1]}])
+
+    area = utils.ask_llm(role="system", message="bbox for Italy", llm=llm, output_schema=utils.AreaBoundingBox)
+
+    assert area.bbox == [6.6, 35.5, 18.5, 47.1]
+    assert len(llm.calls) == 2
+    assert "not a valid" in llm.calls[1][-1]["content"]
+
+    # valid answers are cached as validated json
+    assert utils.ask_llm(role="system", message="bbox for Italy", llm=llm, output_schema=utils.AreaBoundingBox) == area
+    assert len(llm.calls) == 2
+
+    # a bbox wrapped around ±180 is valid, as the gazetteer stores it
+    assert utils.AreaBoundingBox(bbox=[177.0, -19.2, -178.2, -16.0]).bbox[0] > 0
+    with pytest.raises(ValueError):
+        utils.AreaBoundingBox(bbox=[10.0, 35.5, 10.0, 47.1])
+
+
+def test_output_error_after_retries() -> None:
+    llm = FakeStructuredLLM([{"bbox": [1, 2]}] * 3)
+
+    with pytest.raises(utils.LLMOutputError) as error:
+        utils.ask_llm(role="system", message="bbox for Atlantis", llm=llm, output_schema=utils.AreaBoundingBox, retries=2)
+
+    assert len(llm.calls) == 3 and len(error.value.errors) == 3
+
+
+def test_sync_and_async_share_the_retry_path() -> None:
+    answers = [{"bbox": [6.6, 47.1, 18.5, 35.5]}, {"bbox": [6.6, 35.5, 18.5, 47.1]}]
+    sync_llm, async_llm = FakeStructuredLLM(answers), FakeStructuredLLM(answers)
+
+    sync_area = utils.ask_llm_structured(role="system", message="bbox for Italy", llm=sync_llm, output_schema=utils.AreaBoundingBox, use_cache=False)
+    async_area = asyncio.run(utils.ask_llm_structured_async(role="system", message="bbox for Italy", llm=async_llm, output_schema=utils.AreaBoundingBox, use_cache=False))
+
+    assert sync_area == async_area and sync_llm.calls == async_llm.calls
+
+
+def test_step_errors_are_thrown_back_into_the_generator() -> None:
+    closed = []
+
+    def steps():
+        try:
+            yield "first"
+        finally:
+            closed.append(True)
+
+    def failing(step):
+        raise KeyError(step)
+
+    with pytest.raises(KeyError):
+        utils.run_steps(steps(), failing)
+    assert closed == [True]  # the generator cleanup (i.e.: a run context) ran before the error propagated
+
+
+def test_cached_answers_are_keyed_by_schema_not_name() -> None:
+    from pydantic import Field, create_model
+
+    # same name and fields, another meaning (i.e. models created per tool)
+    days = create_model("Reply", value=(int, Field(description="in days")))
+    months = create_model("Reply", value=(int, Field(description="in months")))
+    llm = FakeStructuredLLM([{"value": 90}, {"value": 3}])
+
+    assert utils.ask_llm(role="system", message="how long?", llm=llm, output_schema=days).value == 90
+    assert utils.ask_llm(role="system", message="how long?", llm=llm, output_schema=months).value == 3
+    assert len(llm.calls) == 2
@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+
+from agent import utils
+from agent.names import CDS_FORECAST_NOTEBOOK_TOOL, SPI_CALCULATION_NOTEBOOK_TOOL
+from agent.tools import (
+    CDSForecastNotebookTool,
+    CodeEditorTool,
+    SPICalculationNotebookTool,
+    registry,
+    tool_registry,
+)
+from agent.tools.registry import ToolRegistry
+
+
+def test_router_and_subgraphs_share_one_instance_per_tool() -> None:
+    from agent.nodes.chatbot import multi_agent_subgraphs, multi_agent_tools
+    from agent.nodes.subgraphs.cds_ingestor import cds_forecast_tools_dict
+
+    assert multi_agent_tools[CDS_FORECAST_NOTEBOOK_TOOL] is cds_forecast_tools_dict[CDS_FORECAST_NOTEBOOK_TOOL]
+    assert multi_agent_tools[CDS_FORECAST_NOTEBOOK_TOOL] is tool_registry.get(CDS_FORECAST_NOTEBOOK_TOOL)
+    assert set(multi_agent_subgraphs) == set(multi_agent_tools)
+
+
+def test_schemas_are_cached_by_source_hash(tmp_path, monkeypatch) -> None:
+    cache_path = str(tmp_path / "tool_schemas.json")
+
+    first = ToolRegistry(schema_cache_path=cache_path, discover=False)
+    first.register(SPI_CALCULATION_NOTEBOOK_TOOL, SPICalculationNotebookTool)
+    schema = first.schema(SPI_CALCULATION_NOTEBOOK_TOOL)
+    assert schema["function"]["name"] == SPI_CALCULATION_NOTEBOOK_TOOL
+    assert first.stats["schemas_computed"] == 1
+
+    restarted = ToolRegistry(schema_cache_path=cache_path, discover=False)
+    restarted.register(SPI_CALCULATION_NOTEBOOK_TOOL, SPICalculationNotebookTool)
+    assert restarted.schema(SPI_CALCULATION_NOTEBOOK_TOOL) == schema
+    assert restarted.stats == {"schemas_computed": 0, "schemas_cached": 1, "tools": 1, "bound_llms": 0}
+
+    # a different salt (i.e. next month default period) invalidates the cached schema
+    monkeypatch.setattr(SPICalculationNotebookTool, "_schema_cache_salt", lambda self: "2099-01")
+    next_month = ToolRegistry(schema_cache_path=cache_path, discover=False)
+    next_month.register(SPI_CALCULATION_NOTEBOOK_TOOL, SPICalculationNotebookTool)
+    next_month.schema(SPI_CALCULATION_NOTEBOOK_TOOL)
+    assert next_month.stats["schemas_computed"] == 1
+
+
+def test_tools_with_dated_descriptions_are_salted_by_month() -> None:
+    assert CDSForecastNotebookTool()._schema_cache_salt() == SPICalculationNotebookTool()._schema_cache_salt() != ""
+
+
+def test_bound_llm_is_built_once_per_tool_set(tmp_path, monkeypatch) -> None:
+    bind_calls = []
+    fake_llm = SimpleNamespace(bind_tools=lambda tools: bind_calls.append(tools) or SimpleNamespace(tools=tools))
+    monkeypatch.setattr(utils, "get_base_llm", lambda: fake_llm)
+
+    tools = ToolRegistry(schema_cache_path=str(tmp_path / "tool_schemas.json"), discover=False)
+    tools.register(SPI_CALCULATION_NOTEBOOK_TOOL, SPICalculationNotebookTool)
+
+    assert tools.bind_tools() is tools.bind_tools([SPI_CALCULATION_NOTEBOOK_TOOL])
+    assert len(bind_calls) == 1 and bind_calls[0][0]["type"] == "function"  # precomputed schemas, not tool objects
+
+
+def test_entry_point_tools_are_discovered(tmp_path, monkeypatch) -> None:
+    entry_point = SimpleNamespace(name="third_party_tool", load=lambda: CodeEditorTool)
+    monkeypatch.setattr(registry.metadata, "entry_points", lambda group: [entry_point] if group == registry.ENTRY_POINT_GROUP else [])
+
+    tools = ToolRegistry(schema_cache_path=str(tmp_path / "tool_schemas.json"))
+    assert tools.names() == ["third_party_tool"]
+    assert isinstance(tools.get("third_party_tool"), CodeEditorTool)